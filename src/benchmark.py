@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of the streaming path, without a physical Oak-D.
+
+A `SimulatedDevice` replays a recorded H.264 byte stream through the real frame pump, `RTSPServer`,
+upload pipeline (appsrc -> shmsink) and receive pipeline (shmsrc -> RTSP), or with `--media-path direct`
+straight into the RTSP media, while separate client processes
+pull the streams over RTSP. Each received frame is matched to the moment it was handed to the server,
+which gives frame-to-client latency, along with client throughput and the server process' CPU usage.
+
+Example:
+    python benchmark.py --recording recording.h264 --streams rgb,mono_left --clients 2 --fps 30
+"""
+
+import argparse
+import multiprocessing
+import resource
+import threading
+import time
+import zlib
+from dataclasses import replace
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst # type: ignore
+
+import settings
+from camera_streams import LOW_RENDITION_SUFFIX, SupportedConfig, AllCameraStreams, is_low_rendition
+from h264 import last_slice
+from simulated_device import SimulatedDevice
+from stream import RTSPServer, remove_existing_sockets, stream_device
+from stream_profiles import load_profiles
+
+
+CLIENT_PIPELINE = "\
+rtspsrc location={} latency=0 protocols={} ! \
+rtph264depay ! \
+h264parse ! \
+video/x-h264,stream-format=byte-stream,alignment=au ! \
+appsink name=sink emit-signals=true sync=false"
+
+
+def frame_key(data: bytes) -> int:
+    return zlib.crc32(last_slice(data))
+
+
+
+class InstrumentedRTSPServer(RTSPServer):
+    # Records when each frame is handed to the server, keyed by the checksum of its picture slice
+    def __init__(self, supported_config: SupportedConfig, access_units: list, push_delay: float = 0.0, **properties):
+        super(InstrumentedRTSPServer, self).__init__(supported_config, mcm_registration=False, **properties)
+
+        # Simulates a slow host, by holding up every frame handed to the server
+        self.push_delay = push_delay
+
+        # Replayed frames are the same arrays every loop, so their keys can be computed up front
+        self.frame_keys = {id(access_unit): frame_key(access_unit.tobytes()) for access_unit in access_units}
+        self.send_times = {}
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+
+    def send_data(self, kind, data):
+        if self.push_delay > 0:
+            time.sleep(self.push_delay)
+        self.send_times[(kind, self.frame_keys.get(id(data)))] = time.monotonic()
+        self.frames_sent += 1
+        self.bytes_sent += data.nbytes
+        super(InstrumentedRTSPServer, self).send_data(kind, data)
+
+
+
+def run_client(stream_id: str, url: str, transport: str, start_delay: float, duration: float, results):
+    # Later clients of a stream may join after a delay, to see how long a viewer of an already playing stream waits
+    time.sleep(start_delay)
+    Gst.init(None)
+    pipeline = Gst.parse_launch(CLIENT_PIPELINE.format(url, transport))
+    received = []
+
+    def on_new_sample(sink):
+        buffer = sink.emit('pull-sample').get_buffer()
+        frame_data = buffer.extract_dup(0, buffer.get_size())
+        received.append((time.monotonic(), frame_key(frame_data), len(frame_data)))
+        return Gst.FlowReturn.OK
+
+    pipeline.get_by_name('sink').connect('new-sample', on_new_sample)
+
+    started = time.monotonic()
+    pipeline.set_state(Gst.State.PLAYING)
+    time.sleep(duration)
+    pipeline.set_state(Gst.State.NULL)
+
+    results.put((stream_id, start_delay > 0, started, received))
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentiles(values: list[float]) -> str:
+    if len(values) == 0:
+        return 'n/a'
+
+    values = sorted(values)
+    picks = {
+        'p50': values[int(0.50 * (len(values) - 1))],
+        'p90': values[int(0.90 * (len(values) - 1))],
+        'p99': values[int(0.99 * (len(values) - 1))],
+        'max': values[-1],
+    }
+    return ', '.join(f'{label} {value * 1000:.1f} ms' for label, value in picks.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end latency benchmark with a simulated Oak-D')
+    parser.add_argument('--recording', required=True, help='Annex-B H.264 recording to replay on every stream')
+    parser.add_argument('--streams', default='rgb', help='Comma-separated stream IDs to serve (default: rgb)')
+    parser.add_argument('--idle-streams', default='', help='Comma-separated stream IDs to also serve, without clients (e.g. rgb_low)')
+    parser.add_argument('--clients', type=int, default=1, help='RTSP clients per stream (default: 1)')
+    parser.add_argument('--fps', type=float, default=15, help='Replay frame rate (default: 15)')
+    parser.add_argument('--duration', type=float, default=20, help='Measurement duration in seconds (default: 20)')
+    parser.add_argument('--join-interval', type=float, default=0, help='Seconds between the clients of a stream joining (default: 0, all at once)')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds to stream before clients connect (default: 2)')
+    parser.add_argument('--port', type=int, default=8554, help='RTSP server port (default: 8554)')
+    parser.add_argument('--transport', choices=('tcp', 'udp', 'udp-mcast'), default='tcp', help='RTP transport of the clients, where udp-mcast enables multicast on the server (default: tcp)')
+    parser.add_argument('--media-path', choices=settings.MEDIA_PATHS, default='shm', help='How frames reach the RTSP server (default: shm)')
+    parser.add_argument('--push-delay', type=float, default=0, help='Milliseconds to hold up every frame, to simulate a slow host (default: 0)')
+    parser.add_argument('--max-latency-ms', type=int, help='Latency budget of every stream (default: from the stream profiles)')
+    parser.add_argument('--on-demand', action=argparse.BooleanOptionalAction, default=False, help='Pause streams on the device while nobody watches (default: off)')
+    parser.add_argument('--keyframe-cache', action=argparse.BooleanOptionalAction, default=True, help='Start new viewers from the cached GOP (default: on)')
+    args = parser.parse_args()
+
+    stream_ids = args.streams.split(',')
+    idle_stream_ids = [stream_id for stream_id in args.idle_streams.split(',') if stream_id]
+    for stream_id in stream_ids + idle_stream_ids:
+        if not AllCameraStreams.is_supported(stream_id):
+            parser.error(f'Unknown stream "{stream_id}"')
+
+    # Low renditions need their camera as well
+    served_ids = {stream_id.removesuffix(LOW_RENDITION_SUFFIX) for stream_id in stream_ids + idle_stream_ids}
+    supported_config = SupportedConfig(
+        rgb = 'rgb' in served_ids,
+        mono_left = 'mono_left' in served_ids or 'depth' in served_ids,
+        mono_right = 'mono_right' in served_ids or 'depth' in served_ids,
+        composite = 'composite' in served_ids,
+        low_renditions = tuple(stream_id.removesuffix(LOW_RENDITION_SUFFIX) for stream_id in stream_ids + idle_stream_ids if is_low_rendition(stream_id)),
+    )
+
+    remove_existing_sockets()
+    device = SimulatedDevice(args.recording, stream_ids + idle_stream_ids, fps=args.fps)
+    rtsp_server = InstrumentedRTSPServer(
+        supported_config,
+        device.access_units,
+        media_path=args.media_path,
+        keyframe_cache=args.keyframe_cache,
+        on_demand=args.on_demand,
+        multicast=args.transport == 'udp-mcast',
+        push_delay=args.push_delay / 1000,
+        service=str(args.port),
+    )
+
+    profiles = load_profiles()
+    if args.max_latency_ms is not None:
+        profiles = {stream_id: replace(profile, max_latency_ms=args.max_latency_ms) for stream_id, profile in profiles.items()}
+
+    device_thread = threading.Thread(
+        target=stream_device,
+        args=(device, supported_config, rtsp_server),
+        kwargs={'profiles': profiles},
+        daemon=True,
+    )
+    device_thread.start()
+    time.sleep(args.warmup)
+
+    # Before any client connects, the device's output only keeps streams running that nobody watches
+    idle_frames, idle_bytes = rtsp_server.frames_sent, rtsp_server.bytes_sent
+
+    # Clients run in their own processes so that their decoding work is not counted as server CPU time
+    mp_context = multiprocessing.get_context('spawn')
+    results = mp_context.Queue()
+    clients = [
+        mp_context.Process(
+            target=run_client,
+            args=(stream_id, f'rtsp://127.0.0.1:{args.port}/{AllCameraStreams.get(stream_id).endpoint}', args.transport, client_index * args.join_interval, args.duration, results),
+        )
+        for stream_id in stream_ids
+        for client_index in range(args.clients)
+    ]
+
+    cpu_start, wall_start = cpu_seconds(), time.monotonic()
+    frames_start, bytes_start = rtsp_server.frames_sent, rtsp_server.bytes_sent
+
+    for client in clients:
+        client.start()
+    client_results = [results.get() for _ in clients]
+    for client in clients:
+        client.join()
+
+    cpu_used, wall_time = cpu_seconds() - cpu_start, time.monotonic() - wall_start
+    frames_sent, bytes_sent = rtsp_server.frames_sent - frames_start, rtsp_server.bytes_sent - bytes_start
+    device.close()
+
+    latencies = []
+    first_frame_times = []
+    late_joiner_first_frame_times = []
+    first_live_frame_times = []
+    client_fps = []
+    client_bitrates = []
+    for stream_id, late_joiner, started, received in client_results:
+        for received_time, key, _ in received:
+            sent_time = rtsp_server.send_times.get((stream_id, key))
+            # Frames replayed from the keyframe cache were sent before the client started, and only count towards its first frame
+            if sent_time is not None and sent_time >= started and 0 <= received_time - sent_time < args.duration:
+                latencies.append(received_time - sent_time)
+
+        if len(received) > 0:
+            (late_joiner_first_frame_times if late_joiner else first_frame_times).append(received[0][0] - started)
+            client_fps.append(len(received) / args.duration)
+            client_bitrates.append(sum(size for _, _, size in received) * 8 / args.duration / 1000)
+
+        # A frame captured after the client started, which for a paused stream is how long it took to resume
+        for received_time, key, _ in received:
+            sent_time = rtsp_server.send_times.get((stream_id, key))
+            if sent_time is not None and sent_time >= started:
+                first_live_frame_times.append(received_time - started)
+                break
+
+    print('\n=== Benchmark results ===')
+    print(
+        f'Streams: {", ".join(stream_ids)} (and {", ".join(idle_stream_ids) or "no"} idle streams) at {args.fps:g} FPS, {args.clients} client(s) each over {args.transport}, {args.duration:g} s, '
+        f'{args.media_path} media path, keyframe cache {"on" if args.keyframe_cache else "off"}, on demand {"on" if args.on_demand else "off"}'
+    )
+    print(f'Frame-to-client latency: {percentiles(latencies)} ({len(latencies)} frames matched)')
+    print(f'Time to first frame: {percentiles(first_frame_times)}')
+    if args.join_interval > 0:
+        print(f'Time to first frame, joining a playing stream: {percentiles(late_joiner_first_frame_times)}')
+    print(f'Time to first live frame: {percentiles(first_live_frame_times)}')
+    if len(client_fps) > 0:
+        print(f'Client throughput: {sum(client_fps) / len(client_fps):.1f} FPS, {sum(client_bitrates) / len(client_bitrates):.0f} kbit/s per client (avg)')
+    print(f'Clients without frames: {len(client_results) - len(client_fps)} of {len(client_results)}')
+    print(f'Server input: {frames_sent / wall_time:.1f} FPS, {bytes_sent * 8 / wall_time / 1000:.0f} kbit/s')
+    print(f'Device output without clients: {idle_frames / args.warmup:.1f} FPS, {idle_bytes * 8 / args.warmup / 1000:.0f} kbit/s')
+    print(f'Late frames dropped: {sum(rtsp_server.metrics.stream(stream_id).late_drops for stream_id in stream_ids)} (including warmup)')
+    print(
+        f'Server CPU: {100 * cpu_used / wall_time:.1f}% of a core, {1000 * cpu_used / max(frames_sent, 1):.2f} ms per frame, '
+        f'{100 * cpu_used / wall_time / len(clients):.1f}% per client'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import threading
+import time
+from dataclasses import dataclass
+
+
+# Frame gate divisors to step through, from full frame rate down to a sixth of it
+DIVISOR_LEVELS = (1, 2, 3, 4, 6)
+
+# A stream is considered congested when any of these are exceeded within an evaluation period
+MAX_FRACTION_LOST = 0.05
+MAX_QUEUE_FILL = 0.5
+
+# How long a stream must stay healthy before its frame rate is stepped back up
+RECOVERY_SECONDS = 10
+
+
+@dataclass
+class StreamCongestion:
+    level: int = 0
+    # Inactive streams (i.e. without viewers) are paused altogether, by closing their frame gate
+    active: bool = True
+    healthy_since: float = 0.0
+    push_failures: int = 0
+    late_drops: int = 0
+    max_queue_fill: float = 0.0
+    max_fraction_lost: float = 0.0
+
+
+
+class AdaptiveBitrateController:
+    # Closed-loop control of each stream's frame rate (and with it, its bitrate) through the device's frame gates.
+    #
+    # Congestion is reported from the hot path (`push-buffer` failures and frames dropped for being late), the upload pipeline (queue fill) and
+    # the RTSP sessions (RTCP receiver reports), and evaluated periodically. A congested stream steps down
+    # a level straight away, while a healthy one only steps back up after a while, to avoid oscillating.
+    # Streams that are set inactive are paused on the device until they are set active again.
+    def __init__(self, stream_ids: list[str], enabled: bool = True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.streams = {stream_id: StreamCongestion(healthy_since=time.monotonic()) for stream_id in stream_ids}
+        self.apply_divisor = None
+        # Streams with a frame gate on the attached device
+        self.gated_streams = set()
+
+
+    def attach(self, apply_divisor, stream_ids: list[str]):
+        # Called once a device is connected, with a callable taking (stream_id, divisor), and the streams in its
+        # pipeline, which are the only ones sent divisors
+        self.gated_streams = set(stream_ids)
+        self.apply_divisor = apply_divisor
+        for stream_id, congestion in self.streams.items():
+            if stream_id in self.gated_streams:
+                apply_divisor(stream_id, self.divisor(congestion))
+
+
+    def detach(self):
+        self.apply_divisor = None
+        self.gated_streams = set()
+
+
+    def divisor(self, congestion: StreamCongestion) -> int:
+        return DIVISOR_LEVELS[congestion.level] if congestion.active else 0
+
+
+    def set_active(self, stream_id: str, active: bool):
+        with self.lock:
+            congestion = self.streams[stream_id]
+            if congestion.active == active:
+                return
+            congestion.active = active
+
+        print(f'{"Resuming" if active else "Pausing"} "{stream_id}" on the device')
+        self.apply(stream_id, self.divisor(congestion))
+
+
+    def apply(self, stream_id: str, divisor: int):
+        apply_divisor = self.apply_divisor
+        if apply_divisor is None or stream_id not in self.gated_streams:
+            return
+
+        try:
+            apply_divisor(stream_id, divisor)
+        except RuntimeError as ex:
+            # The device may have just dropped, in which case its levels are re-applied on reconnect
+            print(f'Unable to apply frame divisor for "{stream_id}": {ex}')
+
+
+    def report_push(self, stream_id: str, success: bool):
+        if not success:
+            with self.lock:
+                self.streams[stream_id].push_failures += 1
+
+
+    def report_late_drop(self, stream_id: str):
+        with self.lock:
+            self.streams[stream_id].late_drops += 1
+
+
+    def report_queue_fill(self, stream_id: str, fill: float):
+        with self.lock:
+            congestion = self.streams[stream_id]
+            congestion.max_queue_fill = max(congestion.max_queue_fill, fill)
+
+
+    def report_fraction_lost(self, stream_id: str, fraction_lost: float):
+        with self.lock:
+            congestion = self.streams[stream_id]
+            congestion.max_fraction_lost = max(congestion.max_fraction_lost, fraction_lost)
+
+
+    def evaluate(self):
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        changes = []
+
+        with self.lock:
+            for stream_id, congestion in self.streams.items():
+                is_congested = (
+                    congestion.push_failures > 0
+                    or congestion.late_drops > 0
+                    or congestion.max_queue_fill > MAX_QUEUE_FILL
+                    or congestion.max_fraction_lost > MAX_FRACTION_LOST
+                )
+
+                if is_congested:
+                    if congestion.level < len(DIVISOR_LEVELS) - 1:
+                        congestion.level += 1
+                        changes.append((stream_id, congestion))
+                    congestion.healthy_since = now
+                elif congestion.level > 0 and now - congestion.healthy_since >= RECOVERY_SECONDS:
+                    congestion.level -= 1
+                    congestion.healthy_since = now
+                    changes.append((stream_id, congestion))
+
+                congestion.push_failures = 0
+                congestion.late_drops = 0
+                congestion.max_queue_fill = 0.0
+                congestion.max_fraction_lost = 0.0
+
+        if self.apply_divisor is None:
+            return
+
+        for stream_id, congestion in changes:
+            if not congestion.active:
+                continue
+            divisor = self.divisor(congestion)
+            print(f'Adaptive bitrate: sending 1 in {divisor} frame(s) of "{stream_id}"')
+            self.apply(stream_id, divisor)
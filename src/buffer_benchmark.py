@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of wrapping encoded frames into GstBuffers for `appsrc` (see `frame_buffers.py`), without an Oak-D.
+
+Frames of each `--frame-sizes` size, as NumPy arrays like those from `getData()`, are wrapped either with
+`Gst.Buffer.new_wrapped(data)`, as older versions did, or with `FrameBufferPool.wrap(data)`, and pushed through
+`appsrc ! fakesink`, so that pooled buffers are released and recycled as they would be in the upload pipeline. For
+each, this reports the time to wrap a frame, the bytes copied into GStreamer memory, and the bytes allocated on the
+Python heap along the way (i.e. for marshalling the array).
+
+Example:
+    python buffer_benchmark.py --frame-sizes 20000,100000,400000 --frames 2000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst # type: ignore
+
+from frame_buffers import FrameBufferPool
+
+
+PUSH_PIPELINE = "appsrc name=source is-live=true format=time ! fakesink sync=false"
+
+
+def measure(wrap, frames: list[np.ndarray], appsrc) -> tuple[list[float], int, int]:
+    # Returns the time to wrap every frame, the bytes copied into GStreamer memory and the peak Python heap allocation
+    wrap_times = []
+    bytes_copied = 0
+    for data in frames:
+        start = time.perf_counter()
+        buffer = wrap(data)
+        wrap_times.append(time.perf_counter() - start)
+
+        bytes_copied += buffer.get_size()
+        appsrc.emit('push-buffer', buffer)
+
+    # Tracing allocations slows everything down, so it gets a separate pass over a few frames
+    tracemalloc.start()
+    for data in frames[:16]:
+        appsrc.emit('push-buffer', wrap(data))
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return wrap_times, bytes_copied, peak_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of Gst.Buffer.new_wrapped against FrameBufferPool.wrap')
+    parser.add_argument('--frame-sizes', default='20000,100000,400000', help='Comma-separated frame sizes in bytes (default: 20000,100000,400000)')
+    parser.add_argument('--frames', type=int, default=2000, help='Frames to wrap per size and method (default: 2000)')
+    args = parser.parse_args()
+
+    Gst.init(None)
+    pipeline = Gst.parse_launch(PUSH_PIPELINE)
+    appsrc = pipeline.get_by_name('source')
+    pipeline.set_state(Gst.State.PLAYING)
+
+    print('\n=== Buffer benchmark results ===')
+    for frame_size in (int(size) for size in args.frame_sizes.split(',')):
+        # A few distinct frames, so that nothing is served from a cache
+        rng = np.random.default_rng(frame_size)
+        frames = [rng.integers(0, 256, frame_size, dtype=np.uint8) for _ in range(8)] * (args.frames // 8)
+
+        # Same pool settings as the RTSP server's, where frames larger than its buffers get a one-off buffer
+        buffer_pool = FrameBufferPool()
+        methods = {
+            'new_wrapped': Gst.Buffer.new_wrapped,
+            'pool.wrap': buffer_pool.wrap,
+        }
+
+        for method, wrap in methods.items():
+            wrap_times, bytes_copied, peak_bytes = measure(wrap, frames, appsrc)
+            times_us = sorted(seconds * 1e6 for seconds in wrap_times)
+            print(
+                f'{frame_size:>8} bytes  {method:<12} p50 {times_us[len(times_us) // 2]:8.1f} us, '
+                f'p99 {times_us[int(0.99 * (len(times_us) - 1))]:8.1f} us per frame, '
+                f'{bytes_copied / len(frames):9.0f} bytes copied per frame, {peak_bytes:10.0f} bytes peak Python heap'
+            )
+        buffer_pool.close()
+
+    pipeline.set_state(Gst.State.NULL)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,26 @@
 from dataclasses import dataclass
 
 
+# Suffix of the IDs of the cameras' low renditions (e.g. 'rgb_low'), which are downscaled, low-bitrate copies of them
+LOW_RENDITION_SUFFIX = '_low'
+
+
+def is_low_rendition(stream_id: str) -> bool:
+    return stream_id.endswith(LOW_RENDITION_SUFFIX)
+
+
+
 @dataclass
 class SupportedConfig:
     rgb: bool
     mono_left: bool
     mono_right: bool
+    # Whether the composite stream is enabled and all of its tiles are available (see `OAKD_COMPOSITE`)
+    composite: bool = False
+    # Streams with a low rendition (see `OAKD_LOW_STREAMS`)
+    low_renditions: tuple[str, ...] = ()
+    # Model of the device's IMU (e.g. 'BNO086' or 'BMI270'), if it has one
+    imu: str | None = None
 
 
     @property
@@ -14,6 +29,10 @@ class SupportedConfig:
 
 
     def check(self, key) -> bool:
+        # A low rendition needs its stream, and to be enabled for it
+        if is_low_rendition(key):
+            stream_id = key.removesuffix(LOW_RENDITION_SUFFIX)
+            return stream_id in self.low_renditions and getattr(self, stream_id)
         return getattr(self, key)
 
 
@@ -25,6 +44,17 @@ class CameraStream:
     socket_path: str
 
 
+    def for_device(self, device_id: str, namespaced: bool = True) -> 'CameraStream':
+        # Every device's worker needs sockets of its own, while its name and endpoint are only namespaced (with the
+        # device's MX ID) when asked to, so that a single device keeps the URLs and names it always had
+        return CameraStream(
+            id = self.id,
+            name = f'{self.name} ({device_id})' if namespaced else self.name,
+            endpoint = f'{device_id}/{self.endpoint}' if namespaced else self.endpoint,
+            socket_path = f'{self.socket_path}_{device_id}',
+        )
+
+
 @dataclass
 class AllCameraStreams:
     rgb = CameraStream(
@@ -55,6 +85,41 @@ class AllCameraStreams:
         socket_path = '/tmp/socketdepth',
     )
 
+    composite = CameraStream(
+        id = 'composite',
+        name = 'Oak-D Composite',
+        endpoint = 'composite',
+        socket_path = '/tmp/socketcomposite',
+    )
+
+    rgb_low = CameraStream(
+        id = 'rgb_low',
+        name = 'Oak-D RGB (Low)',
+        endpoint = 'rgb/low',
+        socket_path = '/tmp/socketrgblow',
+    )
+
+    mono_left_low = CameraStream(
+        id = 'mono_left_low',
+        name = 'Oak-D Mono Left (Low)',
+        endpoint = 'mono_left/low',
+        socket_path = '/tmp/socketmonoleftlow',
+    )
+
+    mono_right_low = CameraStream(
+        id = 'mono_right_low',
+        name = 'Oak-D Mono Right (Low)',
+        endpoint = 'mono_right/low',
+        socket_path = '/tmp/socketmonorightlow',
+    )
+
+    depth_low = CameraStream(
+        id = 'depth_low',
+        name = 'Oak-D Stereo Disparity (Low)',
+        endpoint = 'depth/low',
+        socket_path = '/tmp/socketdepthlow',
+    )
+
 
     @staticmethod
     def is_supported(stream_id: str) -> bool:
@@ -62,15 +127,22 @@ class AllCameraStreams:
 
 
     @staticmethod
-    def get(stream_id: str) -> CameraStream:
-        return getattr(AllCameraStreams, stream_id)
+    def get(stream_id: str, device_id: str | None = None, namespaced: bool = True) -> CameraStream:
+        stream = getattr(AllCameraStreams, stream_id)
+        return stream if device_id is None else stream.for_device(device_id, namespaced)
 
 
     @staticmethod
-    def all_streams() -> list[CameraStream]:
-        return [
+    def all_streams(device_id: str | None = None, namespaced: bool = True) -> list[CameraStream]:
+        streams = [
             AllCameraStreams.rgb,
             AllCameraStreams.mono_left,
             AllCameraStreams.mono_right,
             AllCameraStreams.depth,
+            AllCameraStreams.composite,
+            AllCameraStreams.rgb_low,
+            AllCameraStreams.mono_left_low,
+            AllCameraStreams.mono_right_low,
+            AllCameraStreams.depth_low,
         ]
+        return streams if device_id is None else [stream.for_device(device_id, namespaced) for stream in streams]
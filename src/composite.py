@@ -0,0 +1,89 @@
+import depthai as dai
+
+from frame_gates import create_frame_gate
+
+"""
+The composite stream tiles several camera (or depth) outputs into one frame on the device, so that they are
+encoded once, and reach viewers as a single RTSP stream.
+
+Each source is first scaled (letterboxed) to the tile size and converted to NV12 by an `ImageManip` node. A Script
+node then stacks the tiles on top of each other, which for NV12 only takes their luma planes followed by their chroma
+planes. `ImageManip` cannot combine several images, so the stacking is the one step done in Python, on the device's
+LEON CPU: each plane is copied once, straight into a buffer allocated once, i.e. 1.5 bytes per pixel of the composite
+frame (33 MiB per second for 3 tiles at 400p and 30 FPS, before `setData()` copies the frame once more). Its
+sustained rate has not been measured on a device yet; the composite stream's `oakd_frames_per_second` falling short of
+its first tile's, along with `oakd_device_cpu_usage_ratio{cpu="leon_css"}`, shows when it cannot keep up, in which case
+tiles are dropped rather than queued up. The compositor is paced by its first tile, while every other tile shows its
+latest frame. Every source is fed through a frame gate of the composite stream ahead of its `ImageManip`, so that
+pausing (or slowing) the composite stream stops (or slows) the scaling of all of its tiles.
+"""
+
+COMPOSITOR_SCRIPT = """
+sources = {sources}
+tile_size = {width} * {height}
+luma_size = tile_size * len(sources)
+# Reused for every frame, as `setData()` copies it
+data = bytearray(luma_size * 3 // 2)
+latest = {{}}
+
+while True:
+    latest[sources[0]] = node.io[sources[0]].get()
+    for source in sources[1:]:
+        frame = node.io[source].tryGet()
+        while frame is not None:
+            latest[source] = frame
+            frame = node.io[source].tryGet()
+
+    # Wait until every tile has a frame to show
+    if len(latest) < len(sources):
+        continue
+
+    for index, source in enumerate(sources):
+        plane = memoryview(latest[source].getData())
+        data[index * tile_size:(index + 1) * tile_size] = plane[:tile_size]
+        chroma_start = luma_size + index * tile_size // 2
+        data[chroma_start:chroma_start + tile_size // 2] = plane[tile_size:tile_size * 3 // 2]
+
+    composite = ImgFrame(len(data))
+    composite.setData(data)
+    composite.setType(ImgFrame.Type.NV12)
+    composite.setWidth({width})
+    composite.setHeight({height} * len(sources))
+    composite.setTimestamp(latest[sources[0]].getTimestamp())
+    composite.setSequenceNum(latest[sources[0]].getSequenceNum())
+    node.io['out'].send(composite)
+"""
+
+
+def create_tile(pipeline, source, width: int, height: int):
+    # Returns the output of an `ImageManip` node turning `source` into an NV12 tile
+    manip = pipeline.create(dai.node.ImageManip)
+    manip.initialConfig.setResizeThumbnail(width, height)
+    manip.initialConfig.setFrameType(dai.ImgFrame.Type.NV12)
+    manip.setMaxOutputFrameSize(width * height * 3 // 2)
+
+    # Only the latest frame of each tile is ever shown
+    manip.inputImage.setBlocking(False)
+    manip.inputImage.setQueueSize(1)
+
+    source.link(manip.inputImage)
+    return manip.out
+
+
+def create_compositor(pipeline, control_in, stream_id: str, sources: dict, width: int, height: int):
+    # Takes the outputs to tile by stream ID (in order, from top to bottom), and returns the compositor's Script
+    # node, whose `outputs['out']` feeds the encoder
+    compositor = pipeline.create(dai.node.Script)
+    compositor.setScript(COMPOSITOR_SCRIPT.format(sources=list(sources), width=width, height=height))
+
+    for source_id, source in sources.items():
+        # All of the gates follow the composite stream's divisor
+        gate = create_frame_gate(pipeline, control_in, stream_id)
+        source.link(gate.inputs['in'])
+
+        tile = create_tile(pipeline, gate.outputs['out'], width, height)
+        compositor.inputs[source_id].setBlocking(False)
+        compositor.inputs[source_id].setQueueSize(1)
+        tile.link(compositor.inputs[source_id])
+
+    return compositor
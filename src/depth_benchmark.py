@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the raw depth stream (see `raw_depth.py`) and obstacle ranges (see `obstacle_ranges.py`),
+without a physical Oak-D.
+
+A simulated output queue replays raw UINT16 depth frames at the camera's rate through the real frame pump and
+`DepthPublisher`, while a local UDP receiver reassembles and decodes every frame and checks it is bit-exact. Frames
+come from a `.npy` recording of shape (frames, height, width), or are synthesized from a quantized disparity map
+of a floor with a few moving obstacles, which compresses much like the `StereoDepth` node's output. With
+`--obstacles`, sector ranges are computed from the same queue, as on the vehicle, and timed against the frame budget.
+`--codec` picks the compression (zstd, or the zlib fallback used without the `zstandard` package), to compare the two.
+Run it on the vehicle's computer (i.e. a Raspberry Pi) to see whether it keeps up there.
+
+Example:
+    python depth_benchmark.py --width 640 --height 400 --fps 30 --duration 10
+    python depth_benchmark.py --obstacles --grid 3x8
+    python depth_benchmark.py --codec zlib
+"""
+
+import argparse
+import resource
+import socket
+import threading
+import time
+
+import numpy as np
+
+from frame_pump import FramePump
+from obstacle_ranges import ObstacleRanges
+from raw_depth import DEFAULT_CODEC, PACKET_MAGICS, RAW_DEPTH_STREAM_NAME, DepthPublisher, DepthReassembler
+from simulated_device import SimulatedOutputQueue
+
+
+# Oak-D stereo geometry at 400p, which turns disparity (in pixels) into depth (in millimetres)
+FOCAL_LENGTH_PIXELS = 441
+BASELINE_MM = 75
+
+
+def synthesize_frames(width: int, height: int, frame_count: int, seed: int = 0) -> list[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    rows, cols = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    # A floor that gets closer towards the bottom of the picture, and a far wall above the horizon
+    floor_disparity = np.maximum(2.0, 90.0 * (rows - 0.4 * height) / (0.6 * height))
+
+    frames = []
+    for frame_index in range(frame_count):
+        disparity = floor_disparity.copy()
+
+        # Obstacles drifting across the picture
+        for obstacle in range(3):
+            center_x = (0.2 + 0.3 * obstacle) * width + 3 * frame_index
+            center_y = 0.5 * height
+            radius = (0.08 + 0.04 * obstacle) * width
+            inside = (cols - center_x % width) ** 2 + (rows - center_y) ** 2 < radius ** 2
+            disparity[inside] = 40.0 + 30.0 * obstacle
+
+        disparity += rng.normal(0.0, 0.4, size=disparity.shape)
+        disparity = np.round(disparity)
+
+        # Invalidated pixels (i.e. failed left-right check) are reported as 0
+        invalid = disparity < 1
+        invalid |= rng.random(size=disparity.shape) < 0.02
+        depth = np.where(invalid, 0, FOCAL_LENGTH_PIXELS * BASELINE_MM / np.maximum(disparity, 1))
+        frames.append(depth.astype(np.uint16))
+
+    return frames
+
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of raw depth compression and publishing')
+    parser.add_argument('--recording', help='.npy file of UINT16 depth frames (default: synthesized frames)')
+    parser.add_argument('--width', type=int, default=640, help='Synthesized frame width (default: 640)')
+    parser.add_argument('--height', type=int, default=400, help='Synthesized frame height (default: 400)')
+    parser.add_argument('--fps', type=float, default=30, help='Replay frame rate (default: 30)')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement duration in seconds (default: 10)')
+    parser.add_argument('--port', type=int, default=9120, help='UDP port to publish to (default: 9120)')
+    parser.add_argument('--codec', choices=sorted(PACKET_MAGICS), default=DEFAULT_CODEC, help=f'Frame compression (default: {DEFAULT_CODEC})')
+    parser.add_argument('--obstacles', action='store_true', help='Also compute obstacle ranges per sector')
+    parser.add_argument('--grid', default='1x8', help='Obstacle sector grid as <rows>x<columns> (default: 1x8)')
+    parser.add_argument('--percentile', type=float, default=5, help='Obstacle range percentile (default: 5)')
+    args = parser.parse_args()
+
+    if args.recording:
+        frames = [np.ascontiguousarray(frame, dtype=np.uint16) for frame in np.load(args.recording)]
+    else:
+        frames = synthesize_frames(args.width, args.height, 60)
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    receiver.bind(('127.0.0.1', args.port))
+    receiver.settimeout(0.5)
+
+    received = {'frames': 0, 'mismatches': 0}
+    stopped = threading.Event()
+
+    def run_receiver():
+        reassembler = DepthReassembler()
+        while not stopped.is_set():
+            try:
+                datagram = receiver.recv(65536)
+            except socket.timeout:
+                continue
+            result = reassembler.feed(datagram)
+            if result is not None:
+                sequence_num, _, frame = result
+                received['frames'] += 1
+                if not np.array_equal(frame, frames[sequence_num % len(frames)]):
+                    received['mismatches'] += 1
+
+    receiver_thread = threading.Thread(target=run_receiver, daemon=True)
+    receiver_thread.start()
+
+    publisher = DepthPublisher(args.port, codec=args.codec)
+    publish_times = []
+    payload_sizes = []
+
+    def on_packet(packet):
+        start = time.perf_counter()
+        payload = publisher.send_frame(packet.getFrame(), packet.getSequenceNum(), int(packet.getTimestampDevice().total_seconds() * 1e6))
+        publish_times.append(time.perf_counter() - start)
+        payload_sizes.append(len(payload))
+
+    # Same queue settings as `stream_device()`
+    output_queue = SimulatedOutputQueue(RAW_DEPTH_STREAM_NAME, frames, args.fps, maxSize=4, blocking=False)
+    frame_pump = FramePump()
+    frame_pump.add_consumer(RAW_DEPTH_STREAM_NAME, output_queue, on_packet)
+
+    obstacle_times = []
+    if args.obstacles:
+        rows, cols = (int(size) for size in args.grid.split('x'))
+        obstacle_ranges = ObstacleRanges(rows, cols, args.percentile)
+
+        def on_obstacle_packet(packet):
+            start = time.perf_counter()
+            obstacle_ranges.process(packet)
+            obstacle_times.append(time.perf_counter() - start)
+
+        frame_pump.add_consumer(RAW_DEPTH_STREAM_NAME, output_queue, on_obstacle_packet)
+
+    cpu_start, wall_start = cpu_seconds(), time.monotonic()
+    frame_pump.start()
+    time.sleep(args.duration)
+    frame_pump.stop()
+    output_queue.close()
+    cpu_used, wall_time = cpu_seconds() - cpu_start, time.monotonic() - wall_start
+
+    # Let the receiver catch up with the last frames
+    time.sleep(0.5)
+    stopped.set()
+    receiver_thread.join()
+
+    frame_size = frames[0].nbytes
+    published = len(publish_times)
+    times_us = sorted(seconds * 1e6 for seconds in publish_times)
+
+    print('\n=== Raw depth benchmark results ===')
+    print(f'Frames: {frames[0].shape[1]}x{frames[0].shape[0]} UINT16 ({frame_size / 1024:.0f} KiB) at {args.fps:g} FPS, {args.duration:g} s, {args.codec} compressed')
+    if published > 0:
+        print(f'Compression ratio: {frame_size * published / sum(payload_sizes):.2f}x ({sum(payload_sizes) / published / 1024:.1f} KiB per frame)')
+        print(f'Compress + send: p50 {times_us[published // 2]:.0f} us, p99 {times_us[int(0.99 * (published - 1))]:.0f} us, max {times_us[-1]:.0f} us per frame')
+    print(f'Published: {published / wall_time:.1f} FPS ({published} frames)')
+    if len(obstacle_times) > 0:
+        obstacle_us = sorted(seconds * 1e6 for seconds in obstacle_times)
+        budget_us = 1e6 / args.fps
+        print(
+            f'Obstacle ranges ({args.grid}): p50 {obstacle_us[len(obstacle_us) // 2]:.0f} us, '
+            f'p99 {obstacle_us[int(0.99 * (len(obstacle_us) - 1))]:.0f} us per frame, '
+            f'{100 * sum(obstacle_times) / len(obstacle_times) / (budget_us / 1e6):.1f}% of the {budget_us / 1000:.1f} ms frame budget'
+        )
+    print(f'Received intact: {received["frames"]} frames, {received["mismatches"]} mismatched')
+    print(f'CPU: {100 * cpu_used / wall_time:.1f}% of a core (all consumers and the receiver)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+from gi.repository import Gst # type: ignore
+
+
+# Large enough for most encoded frames; anything bigger (i.e. a detailed 1080p keyframe) gets a one-off buffer
+DEFAULT_BUFFER_SIZE = 512 * 1024
+
+
+class FrameBufferPool:
+    # Wraps encoded frames into recycled GstBuffers for `appsrc`.
+    #
+    # The frame is copied once, straight from the packet's memory into a pooled buffer through the buffer
+    # protocol, and the buffer returns to the pool once GStreamer is done with it, rather than being handed to
+    # PyGObject's array marshalling with `Gst.Buffer.new_wrapped(data)` and allocated afresh. Whether that is
+    # faster, and by how much, has not been measured yet; `buffer_benchmark.py` compares the two.
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, min_buffers: int = 4):
+        self.buffer_size = buffer_size
+
+        self.pool = Gst.BufferPool.new()
+        config = self.pool.get_config()
+        # NOTE: A max of 0 lets the pool grow instead of blocking the caller when all buffers are in flight
+        Gst.BufferPool.config_set_params(config, None, buffer_size, min_buffers, 0)
+        self.pool.set_config(config)
+        self.pool.set_active(True)
+
+
+    def wrap(self, data) -> Gst.Buffer:
+        frame_view = memoryview(data).cast('B')
+        frame_size = frame_view.nbytes
+
+        buffer = None
+        if frame_size <= self.buffer_size:
+            result, buffer = self.pool.acquire_buffer(None)
+            if result != Gst.FlowReturn.OK:
+                buffer = None
+
+        if buffer is None:
+            buffer = Gst.Buffer.new_allocate(None, frame_size, None)
+        else:
+            buffer.set_size(frame_size)
+
+        # NOTE: Requires the gst-python overrides, which expose mapped memory as a writable memoryview
+        _, map_info = buffer.map(Gst.MapFlags.WRITE)
+        try:
+            map_info.data[:frame_size] = frame_view
+        finally:
+            buffer.unmap(map_info)
+
+        return buffer
+
+
+    def close(self):
+        self.pool.set_active(False)
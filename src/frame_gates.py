@@ -0,0 +1,72 @@
+import depthai as dai
+
+from camera_streams import AllCameraStreams
+
+"""
+Frame gates are small Script nodes placed in front of each video encoder on the device. A gate forwards one
+in every `divisor` frames to its encoder, or none at all with a divisor of 0. This allows the host to change a
+stream's frame rate at runtime (the `VideoEncoder` has no runtime rate control in DepthAI), and as the encoder's
+rate control allots a fixed budget per frame, lowering the frame rate lowers the stream's bitrate with it.
+
+The divisor is changed by sending "<stream id>:<divisor>" over the shared XLinkIn control stream.
+"""
+
+CONTROL_STREAM_NAME = 'gate_control'
+
+# The host sets the divisor of every gated stream at once when it attaches to a device, and every gate's control input
+# (as well as the host's input queue) drops its oldest message once full, so each holds a message per stream, with
+# room for as many changes straight after
+CONTROL_QUEUE_SIZE = 2 * len(AllCameraStreams.all_streams())
+
+FRAME_GATE_SCRIPT = """
+divisor = {divisor}
+frame_count = 0
+
+while True:
+    frame = node.io['in'].get()
+
+    control = node.io['control'].tryGet()
+    while control is not None:
+        stream_id, _, value = bytes(control.getData()).decode().partition(':')
+        if stream_id == '{stream_id}':
+            divisor = int(value)
+        control = node.io['control'].tryGet()
+
+    frame_count += 1
+    if divisor > 0 and frame_count % divisor == 0:
+        node.io['out'].send(frame)
+"""
+
+
+def create_gate_control(pipeline):
+    control_in = pipeline.create(dai.node.XLinkIn)
+    control_in.setStreamName(CONTROL_STREAM_NAME)
+    return control_in
+
+
+def create_frame_gate(pipeline, control_in, stream_id: str, divisor: int = 1):
+    # Returns the gate's Script node, whose `inputs['in']` takes frames and `outputs['out']` feeds the encoder
+    gate = pipeline.create(dai.node.Script)
+    gate.setScript(FRAME_GATE_SCRIPT.format(stream_id=stream_id, divisor=divisor))
+
+    # Never hold up the camera; a stale frame is worth less than the next one
+    gate.inputs['in'].setBlocking(False)
+    gate.inputs['in'].setQueueSize(2)
+    gate.inputs['control'].setBlocking(False)
+    gate.inputs['control'].setQueueSize(CONTROL_QUEUE_SIZE)
+
+    control_in.out.link(gate.inputs['control'])
+    return gate
+
+
+
+class FrameGateControl:
+    # Host side of the frame gates of a running device
+    def __init__(self, device):
+        self.input_queue = device.getInputQueue(CONTROL_STREAM_NAME, maxSize=CONTROL_QUEUE_SIZE, blocking=False)
+
+
+    def set_divisor(self, stream_id: str, divisor: int):
+        control = dai.Buffer()
+        control.setData(list(f'{stream_id}:{divisor}'.encode()))
+        self.input_queue.send(control)
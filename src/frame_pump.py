@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+class FramePump:
+    # Forwards packets from DepthAI output queues to their consumers. Each queue gets a dedicated reader
+    # thread that blocks on `get()`, so no CPU time is spent while waiting for the next frame.
+    def __init__(self, metrics=None):
+        # Time spent taking packets off the queues, and waiting for them, is reported to `metrics` (see `metrics.py`), if given
+        self.metrics = metrics
+        self.consumers = {}
+        self.reader_threads = []
+        self.stopped = threading.Event()
+        self.error = None
+
+
+    def add_consumer(self, queue_name: str, output_queue, callback):
+        # Multiple consumers of the same queue share a single reader thread
+        if queue_name not in self.consumers:
+            self.consumers[queue_name] = (output_queue, [])
+        self.consumers[queue_name][1].append(callback)
+
+
+    def start(self):
+        for queue_name, (output_queue, callbacks) in self.consumers.items():
+            reader_thread = threading.Thread(
+                target=self._thread_reader,
+                args=(queue_name, output_queue, callbacks),
+                name=f'pump-{queue_name}',
+                daemon=True,
+            )
+            reader_thread.start()
+            self.reader_threads.append(reader_thread)
+
+
+    def _thread_reader(self, queue_name: str, output_queue, callbacks):
+        try:
+            while not self.stopped.is_set():
+                # Only taking a packet off the queue counts towards the `get` stage. When none is queued yet, the
+                # reader blocks until the next one arrives, which is time spent idle rather than handling frames.
+                get_start = time.perf_counter()
+                packet = output_queue.tryGet()
+                got_packet = time.perf_counter()
+                waited = packet is None
+                if waited:
+                    packet = output_queue.get()
+
+                if self.metrics is not None:
+                    self.metrics.observe_stage(queue_name, 'get', got_packet - get_start)
+                    if waited:
+                        self.metrics.observe_queue_wait(queue_name, time.perf_counter() - got_packet)
+                for callback in callbacks:
+                    callback(packet)
+        except Exception as ex:
+            # A closed device makes `get()` raise, which is only an error if nobody asked us to stop
+            if not self.stopped.is_set():
+                self.error = ex
+                self.stopped.set()
+
+
+    def wait(self):
+        # Block until a reader fails or the pump is stopped, re-raising the reader's error (if any)
+        self.stopped.wait()
+        if self.error is not None:
+            raise self.error
+
+
+    def stop(self):
+        # Reader threads exit once the device closes their queues
+        self.stopped.set()
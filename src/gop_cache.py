@@ -0,0 +1,50 @@
+from h264 import is_keyframe, parameter_sets
+
+
+# A GOP larger than this is not cached, and new viewers wait for the next keyframe instead
+MAX_GOP_BYTES = 8 * 1024 * 1024
+
+
+class GopCache:
+    # Keeps the frames of a stream's current GOP, from its latest keyframe up to the latest frame.
+    #
+    # A new viewer can only decode from a keyframe onwards, and the frames after it only decode correctly on top of
+    # the ones before them. Pushing the whole GOP to a viewer that just joined gets it to the current picture right
+    # away, instead of waiting up to a keyframe interval for the next keyframe.
+    def __init__(self, max_bytes: int = MAX_GOP_BYTES):
+        self.max_bytes = max_bytes
+        self.frames = []
+        self.size = 0
+        # The latest SPS/PPS, in case the encoder leaves them out of some keyframes
+        self.parameter_sets = b''
+
+
+    def add(self, data):
+        # Takes an encoded frame (i.e. the NumPy array from `getData()`), which is kept by reference
+        frame_size = memoryview(data).nbytes
+        if is_keyframe(data):
+            self.frames = []
+            self.size = 0
+            self.parameter_sets = parameter_sets(data) or self.parameter_sets
+        elif len(self.frames) == 0:
+            # Nothing to build on until the next keyframe
+            return
+
+        if self.size + frame_size > self.max_bytes:
+            self.frames = []
+            self.size = 0
+            return
+
+        self.frames.append(data)
+        self.size += frame_size
+
+
+    def replay(self) -> list:
+        # Returns the frames to push to a new viewer, starting with the parameter sets the keyframe depends on
+        if len(self.frames) == 0:
+            return []
+
+        keyframe = self.frames[0]
+        if self.parameter_sets and not parameter_sets(keyframe):
+            keyframe = self.parameter_sets + bytes(memoryview(keyframe).cast('B'))
+        return [keyframe] + self.frames[1:]
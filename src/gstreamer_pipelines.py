@@ -42,8 +42,9 @@ Explanation (paraphrased from ChatGPT as of 02/12/2025):
     - `format=time`: Specifies that timestamps should be in absolute time format
 2. `h264parse`
     - `h264parse`: Specifies that any incoming data should be parsed as H.264 video data
-3. `queue leaky=downstream`
+3. `queue name=upload_queue leaky=downstream`
     - `queue`: Creates a buffering element to store video frames for async data flow
+    - `name=upload_queue`: Names the queue for programatic access, i.e. to monitor how full it is
     - `leaky=downstream`: If the queue is full, drop older buffer frames instead of blocking the pipeline
 4. `rtph264pay config-interval=1 pt=96`
     - `rtph264pay`: Converts raw H.264 video into RTP packets for network streaming.
@@ -58,6 +59,60 @@ Explanation (paraphrased from ChatGPT as of 02/12/2025):
 UPLOAD_VIDEO_DATA_PIPELINE = "\
 appsrc name=source do-timestamp=true is-live=true format=time ! \
 h264parse ! \
-queue leaky=downstream ! \
+queue name=upload_queue leaky=downstream ! \
 rtph264pay config-interval=1 pt=96 ! \
 shmsink wait-for-connection=false sync=true socket-path={}"
+
+
+"""
+Explanation of the direct (in-process) media path, which skips the shared memory hop of the two pipelines above:
+1. `appsrc name=source do-timestamp=true is-live=true format=time`
+    - `appsrc`: The RTSP media pulls straight from the source fed with the device's encoded frames
+    - `name=source`: Names the source so that the server can find it once the media is created
+    - `do-timestamp=true`: Ensure that timestamps are added to buffers if not present
+    - `is-live=true`: Flags the source as live. Internally, it only pushes data into buffers when in PLAYING state
+    - `format=time`: Specifies that timestamps should be in absolute time format
+2. `h264parse`
+    - `h264parse`: Specifies that any incoming data should be parsed as H.264 video data
+3. `queue name=upload_queue leaky=downstream`
+    - `queue`: Creates a buffering element to store video frames for async data flow
+    - `name=upload_queue`: Names the queue for programatic access, i.e. to monitor how full it is
+    - `leaky=downstream`: If the queue is full, drop older buffer frames instead of blocking the pipeline
+4. `rtph264pay name=pay0 config-interval=1 pt=96`
+    - `rtph264pay`: Converts raw H.264 video into RTP packets, once, for the RTSP clients
+    - `name=pay0`: The RTSP server serves every element named `payN` as a stream of the media
+    - `config-interval=1`: Ensures that the SPS/PPS is sent every second, for telling clients how to handle the incoming video data
+    - `pt=96`: Specifies the payload type (PT) for RTP, where 96 is the first dynamic payload type
+"""
+DIRECT_VIDEO_DATA_PIPELINE = "\
+appsrc name=source do-timestamp=true is-live=true format=time ! \
+h264parse ! \
+queue name=upload_queue leaky=downstream ! \
+rtph264pay name=pay0 config-interval=1 pt=96"
+
+
+"""
+Explanation of the recording pipeline, which writes one segment of an encoded stream to a file without re-encoding it:
+1. `appsrc name=source is-live=false format=time block=true caps=...`
+    - `appsrc`: The recorder's writer thread pushes the device's encoded frames, with timestamps relative to the segment start
+    - `is-live=false`: Frames are muxed as fast as the file can be written, rather than in real time
+    - `block=true`: Pushing blocks the writer thread (and only it) while the file cannot keep up, e.g. on a slow SD card
+    - `caps=video/x-h264,stream-format=byte-stream,alignment=au`: Each pushed buffer is one Annex-B access unit (frame)
+2. `h264parse`
+    - `h264parse`: Converts the byte stream into the format the muxer expects, along with its SPS/PPS
+3. `{muxer}`
+    - `matroskamux` for MKV, or `mp4mux fragment-duration=1000` for MP4, whose fragments keep everything but the last
+      second playable if the vehicle loses power mid-segment
+4. `filesink location={location} sync=false`
+    - `filesink`: Writes the muxed segment to the given file, as fast as possible (`sync=false`)
+"""
+RECORD_VIDEO_DATA_PIPELINE = "\
+appsrc name=source is-live=false format=time block=true caps=video/x-h264,stream-format=byte-stream,alignment=au ! \
+h264parse ! \
+{muxer} ! \
+filesink location={location} sync=false"
+
+RECORDING_MUXERS = {
+    'mkv': 'matroskamux',
+    'mp4': 'mp4mux fragment-duration=1000',
+}
@@ -0,0 +1,100 @@
+"""
+Minimal helpers for inspecting H.264 Annex-B byte streams, such as the bitstream produced by the
+DepthAI `VideoEncoder` node. Each encoded frame from the device is one access unit: optional SPS/PPS/SEI
+NAL units followed by the slice of the picture itself.
+"""
+
+START_CODE = b'\x00\x00\x01'
+ACCESS_UNIT_START_CODE = b'\x00\x00\x00\x01'
+
+NAL_SLICE = 1
+NAL_IDR_SLICE = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+VCL_NAL_TYPES = (NAL_SLICE, NAL_IDR_SLICE)
+
+# Parameter sets and the first slice header of an encoded frame fit well within this many bytes
+KEYFRAME_SCAN_BYTES = 512
+
+
+def iter_nal_units(data: bytes):
+    # Yields each NAL unit (without its start code) in the given byte stream
+    start = data.find(START_CODE)
+    while start != -1:
+        start += len(START_CODE)
+        end = data.find(START_CODE, start)
+
+        # NOTE: A NAL unit always ends with a non-zero byte, so any zeros left belong to a 4-byte start code
+        nal = data[start:len(data) if end == -1 else end].rstrip(b'\x00')
+        if nal:
+            yield nal
+
+        start = end
+
+
+def nal_unit_type(nal: bytes) -> int:
+    return nal[0] & 0x1F
+
+
+def first_slice_type(data: bytes):
+    for nal in iter_nal_units(data):
+        nal_type = nal_unit_type(nal)
+        if nal_type in VCL_NAL_TYPES:
+            return nal_type
+    return None
+
+
+def is_keyframe(data) -> bool:
+    # An access unit holds a single picture, so usually only its first few bytes need to be copied and checked
+    data = memoryview(data).cast('B')
+    slice_type = first_slice_type(bytes(data[:KEYFRAME_SCAN_BYTES]))
+    if slice_type is None and len(data) > KEYFRAME_SCAN_BYTES:
+        slice_type = first_slice_type(bytes(data))
+    return slice_type == NAL_IDR_SLICE
+
+
+def parameter_sets(data) -> bytes:
+    # Returns the SPS/PPS NAL units at the start of an access unit (if any), each with its start code
+    data = memoryview(data).cast('B')
+    return b''.join(
+        ACCESS_UNIT_START_CODE + nal
+        for nal in iter_nal_units(bytes(data[:KEYFRAME_SCAN_BYTES]))
+        if nal_unit_type(nal) in (NAL_SPS, NAL_PPS)
+    )
+
+
+def last_slice(data: bytes) -> bytes:
+    # Returns the last picture slice of an access unit, which is carried unmodified through RTP (de)packetizing
+    slice_nal = b''
+    for nal in iter_nal_units(data):
+        if nal_unit_type(nal) in VCL_NAL_TYPES:
+            slice_nal = nal
+    return slice_nal
+
+
+def split_access_units(data: bytes) -> list[bytes]:
+    # Splits a recorded byte stream into access units, assuming the encoder's one slice per picture
+    access_units = []
+    current_nals = []
+    has_picture = False
+
+    for nal in iter_nal_units(data):
+        is_vcl = nal_unit_type(nal) in VCL_NAL_TYPES
+        # The top bit of the slice header is set when `first_mb_in_slice` is 0, i.e. a new picture starts
+        starts_picture = is_vcl and len(nal) > 1 and bool(nal[1] & 0x80)
+
+        if has_picture and (not is_vcl or starts_picture):
+            access_units.append(b''.join(current_nals))
+            current_nals = []
+            has_picture = False
+
+        current_nals.append(ACCESS_UNIT_START_CODE + nal)
+        has_picture = has_picture or is_vcl
+
+    if has_picture:
+        access_units.append(b''.join(current_nals))
+
+    return access_units
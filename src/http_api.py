@@ -0,0 +1,84 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class HttpApi:
+    # Minimal HTTP server for the extension's local endpoints (metrics, etc.), served from a background thread.
+    #
+    # Handlers take the request path and return a tuple of (status code, content type, body). Routes ending
+    # with a '/' also match any path below them.
+    def __init__(self, port: int, host: str = '0.0.0.0'):
+        self.routes = {}
+
+        api = self
+        class RequestHandler(BaseHTTPRequestHandler):
+            # Keep connections open between requests (i.e. for pollers of snapshots), as every response has a length
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                api.handle_request(self, 'GET')
+
+
+            def do_POST(self):
+                api.handle_request(self, 'POST')
+
+
+            def log_message(self, format, *args):
+                # Keep scrapes and polls out of the extension's log
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), RequestHandler)
+        self.server.daemon_threads = True
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name='http-api', daemon=True)
+        self.server_thread.start()
+        print(f'HTTP API available at http://<server-ip>:{port}/')
+
+
+    def add_route(self, method: str, path: str, handler):
+        self.routes[(method, path)] = handler
+
+
+    def find_handler(self, method: str, path: str):
+        path = path.split('?', 1)[0]
+        if (method, path) in self.routes:
+            return self.routes[(method, path)]
+
+        for (route_method, route_path), handler in self.routes.items():
+            if route_method == method and route_path.endswith('/') and path.startswith(route_path):
+                return handler
+        return None
+
+
+    def handle_request(self, request: BaseHTTPRequestHandler, method: str):
+        # Handlers only take the path, but the request's body must still be read off the connection, or it would be
+        # taken for the start of the next request. A body of unknown length ends the connection instead.
+        try:
+            content_length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0 or request.headers.get('Transfer-Encoding'):
+            request.close_connection = True
+        else:
+            request.rfile.read(content_length)
+
+        handler = self.find_handler(method, request.path)
+        if handler is None:
+            status, content_type, body = 404, 'text/plain', b'Not found\n'
+        else:
+            try:
+                status, content_type, body = handler(request.path.split('?', 1)[0])
+            except Exception as ex:
+                status, content_type, body = 500, 'text/plain', f'{ex}\n'.encode()
+
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        if request.close_connection:
+            request.send_header('Connection', 'close')
+        request.end_headers()
+        request.wfile.write(body)
+
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,115 @@
+"""
+IMU samples (accelerometer, gyroscope and, where the IMU has one, rotation vector) for local consumers, read off the
+device in batches and published over UDP, one datagram per batch.
+
+The device's IMU node only reports once it has collected a batch of samples (`setBatchReportThreshold`), so the
+XLink transfer, the queue and the Python call overhead are paid once per batch rather than once per sample.
+
+Each datagram starts with a `PACKET_HEADER`:
+    magic (b'ODI1'), batch sequence number (uint32), sample count (uint16), flags (uint16, see `FLAG_ROTATION_VECTOR`)
+followed by `sample count` records of `SAMPLE_RECORD`:
+    accelerometer and gyroscope device timestamps in microseconds (uint64 each), acceleration in m/s² (x, y, z),
+    angular velocity in rad/s (x, y, z), and the rotation vector as a quaternion (i, j, k, real), all float32
+All fields are little-endian, and the rotation vector is NaN when the IMU has none. See `decode_imu_batch` for the
+receiving side.
+"""
+
+import socket
+import struct
+import time
+
+import numpy as np
+
+
+# Name of the XLinkOut stream carrying the IMU batches
+IMU_STREAM_NAME = 'imu'
+
+PACKET_MAGIC = b'ODI1'
+PACKET_HEADER = struct.Struct('<4sIHH')
+SAMPLE_RECORD = struct.Struct('<QQ3f3f4f')
+
+# Set in the header's flags when the samples carry a rotation vector
+FLAG_ROTATION_VECTOR = 0x1
+
+# Same layout as `SAMPLE_RECORD`, for decoding a whole batch at once
+SAMPLE_DTYPE = np.dtype([
+    ('accelerometer_timestamp_us', '<u8'),
+    ('gyroscope_timestamp_us', '<u8'),
+    ('acceleration', '<f4', 3),
+    ('angular_velocity', '<f4', 3),
+    ('rotation_vector', '<f4', 4),
+])
+
+NO_ROTATION_VECTOR = (float('nan'),) * 4
+
+
+def timestamp_us(report) -> int:
+    return int(report.getTimestampDevice().total_seconds() * 1e6)
+
+
+def has_rotation_vector(imu_packets) -> bool:
+    # Only some IMUs (i.e. the BNO08x, not the BMI270) report a rotation vector, which is otherwise left unset
+    return len(imu_packets) > 0 and imu_packets[-1].rotationVector.getTimestampDevice().total_seconds() > 0
+
+
+def encode_imu_batch(imu_packets, sequence_num: int) -> bytes:
+    # Takes the `packets` of a `dai.IMUData` batch
+    rotation_vector = has_rotation_vector(imu_packets)
+    records = []
+    for imu_packet in imu_packets:
+        accelerometer, gyroscope = imu_packet.acceleroMeter, imu_packet.gyroscope
+        if rotation_vector:
+            rotation = imu_packet.rotationVector
+            quaternion = (rotation.i, rotation.j, rotation.k, rotation.real)
+        else:
+            quaternion = NO_ROTATION_VECTOR
+
+        records.append(SAMPLE_RECORD.pack(
+            timestamp_us(accelerometer), timestamp_us(gyroscope),
+            accelerometer.x, accelerometer.y, accelerometer.z,
+            gyroscope.x, gyroscope.y, gyroscope.z,
+            *quaternion,
+        ))
+
+    flags = FLAG_ROTATION_VECTOR if rotation_vector else 0
+    return PACKET_HEADER.pack(PACKET_MAGIC, sequence_num & 0xFFFFFFFF, len(records), flags) + b''.join(records)
+
+
+def decode_imu_batch(datagram: bytes):
+    # Returns (batch sequence number, structured array of `SAMPLE_DTYPE`), or None for anything else
+    magic, sequence_num, sample_count, _ = PACKET_HEADER.unpack_from(datagram)
+    if magic != PACKET_MAGIC:
+        return None
+    return sequence_num, np.frombuffer(datagram, dtype=SAMPLE_DTYPE, count=sample_count, offset=PACKET_HEADER.size)
+
+
+
+class ImuPublisher:
+    # Sends IMU batches to a local UDP port
+    def __init__(self, port: int, host: str = '127.0.0.1', metrics=None):
+        self.address = (host, port)
+        # Batch sizes and handling times are reported to `metrics` (see `metrics.py`), if given
+        self.metrics = metrics
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence_num = 0
+        print(f'IMU samples available at udp://{host}:{port}')
+
+
+    def publish(self, imu_data):
+        # Takes a `dai.IMUData` batch
+        start = time.perf_counter()
+        datagram = encode_imu_batch(imu_data.packets, self.sequence_num)
+        self.sequence_num += 1
+        try:
+            self.socket.sendto(datagram, self.address)
+        except OSError:
+            # Nobody listening (or the socket buffer is full); the next batch follows shortly
+            pass
+
+        if self.metrics is not None:
+            self.metrics.observe_frame(IMU_STREAM_NAME, len(datagram))
+            self.metrics.observe_stage(IMU_STREAM_NAME, 'push', time.perf_counter() - start)
+
+
+    def close(self):
+        self.socket.close()
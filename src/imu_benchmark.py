@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the IMU samples (see `imu.py`), without a physical Oak-D.
+
+A simulated output queue replays batches of synthesized IMU samples at `--rate` samples per second, in batches of
+`--batch-size` as the device's IMU node reports them, through the real frame pump and `ImuPublisher`, while a local
+UDP receiver decodes every batch. This gives the sample rate that is sustained end to end, the time spent per batch
+and the process' CPU usage. Run it on the vehicle's computer (i.e. a Raspberry Pi) to see what it costs there.
+
+Example:
+    python imu_benchmark.py --rate 400 --batch-size 20 --duration 10
+    python imu_benchmark.py --rate 400 --batch-size 1 --rotation-vector
+"""
+
+import argparse
+import datetime
+import math
+import resource
+import socket
+import threading
+import time
+
+from frame_pump import FramePump
+from imu import IMU_STREAM_NAME, ImuPublisher, decode_imu_batch
+from simulated_device import SimulatedOutputQueue
+
+
+class SimulatedImuReport:
+    # Mimics the accelerometer, gyroscope and rotation vector reports of a `dai.IMUPacket`
+    def __init__(self, timestamp: datetime.timedelta, x: float = 0.0, y: float = 0.0, z: float = 0.0, real: float = 1.0):
+        self.timestamp = timestamp
+        self.x, self.y, self.z = x, y, z
+        self.i, self.j, self.k, self.real = x, y, z, real
+
+
+    def getTimestampDevice(self) -> datetime.timedelta:
+        return self.timestamp
+
+
+
+class SimulatedImuPacket:
+    def __init__(self, acceleroMeter: SimulatedImuReport, gyroscope: SimulatedImuReport, rotationVector: SimulatedImuReport):
+        self.acceleroMeter = acceleroMeter
+        self.gyroscope = gyroscope
+        self.rotationVector = rotationVector
+
+
+
+def synthesize_batches(rate: float, batch_size: int, rotation_vector: bool, seconds: float = 1.0) -> list[list[SimulatedImuPacket]]:
+    # A vehicle gently rolling and pitching, sampled at `rate`
+    batches = []
+    for batch_index in range(max(1, round(seconds * rate / batch_size))):
+        batch = []
+        for sample_index in range(batch_size):
+            t = (batch_index * batch_size + sample_index) / rate
+            timestamp = datetime.timedelta(seconds=t)
+            roll, pitch = 0.1 * math.sin(t), 0.05 * math.cos(0.7 * t)
+            batch.append(SimulatedImuPacket(
+                acceleroMeter=SimulatedImuReport(timestamp, 9.81 * math.sin(pitch), -9.81 * math.sin(roll), 9.81),
+                gyroscope=SimulatedImuReport(timestamp, 0.1 * math.cos(t), -0.035 * math.sin(0.7 * t), 0.0),
+                rotationVector=SimulatedImuReport(
+                    timestamp if rotation_vector else datetime.timedelta(0),
+                    math.sin(roll / 2), math.sin(pitch / 2), 0.0, math.cos(roll / 2) * math.cos(pitch / 2),
+                ),
+            ))
+        batches.append(batch)
+    return batches
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of batched IMU publishing')
+    parser.add_argument('--rate', type=float, default=400, help='IMU samples per second (default: 400)')
+    parser.add_argument('--batch-size', type=int, default=20, help='Samples per batch reported by the device (default: 20)')
+    parser.add_argument('--rotation-vector', action='store_true', help='Include rotation vector samples, as a BNO08x IMU reports')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement duration in seconds (default: 10)')
+    parser.add_argument('--port', type=int, default=9130, help='UDP port to publish to (default: 9130)')
+    args = parser.parse_args()
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+    receiver.bind(('127.0.0.1', args.port))
+    receiver.settimeout(0.5)
+
+    received = {'batches': 0, 'samples': 0, 'gaps': 0}
+    stopped = threading.Event()
+
+    def run_receiver():
+        expected_sequence_num = None
+        while not stopped.is_set():
+            try:
+                datagram = receiver.recv(65536)
+            except socket.timeout:
+                continue
+            result = decode_imu_batch(datagram)
+            if result is None:
+                continue
+
+            sequence_num, samples = result
+            if expected_sequence_num is not None and sequence_num != expected_sequence_num:
+                received['gaps'] += 1
+            expected_sequence_num = sequence_num + 1
+            received['batches'] += 1
+            received['samples'] += len(samples)
+
+    receiver_thread = threading.Thread(target=run_receiver, daemon=True)
+    receiver_thread.start()
+
+    publisher = ImuPublisher(args.port)
+    publish_times = []
+
+    def on_batch(packet):
+        start = time.perf_counter()
+        publisher.publish(packet)
+        publish_times.append(time.perf_counter() - start)
+
+    # Same queue settings as `stream_device()`
+    batches = synthesize_batches(args.rate, args.batch_size, args.rotation_vector)
+    output_queue = SimulatedOutputQueue(IMU_STREAM_NAME, batches, args.rate / args.batch_size, maxSize=16, blocking=False)
+    frame_pump = FramePump()
+    frame_pump.add_consumer(IMU_STREAM_NAME, output_queue, on_batch)
+
+    cpu_start, wall_start = cpu_seconds(), time.monotonic()
+    frame_pump.start()
+    time.sleep(args.duration)
+    frame_pump.stop()
+    output_queue.close()
+    cpu_used, wall_time = cpu_seconds() - cpu_start, time.monotonic() - wall_start
+
+    # Let the receiver catch up with the last batches
+    time.sleep(0.5)
+    stopped.set()
+    receiver_thread.join()
+
+    published = len(publish_times)
+    times_us = sorted(seconds * 1e6 for seconds in publish_times)
+
+    print('\n=== IMU benchmark results ===')
+    print(
+        f'Samples: {args.rate:g} Hz in batches of {args.batch_size} ({args.rate / args.batch_size:g} batches/s), '
+        f'{"with" if args.rotation_vector else "without"} rotation vector, {args.duration:g} s'
+    )
+    if published > 0:
+        print(f'Encode + send: p50 {times_us[published // 2]:.0f} us, p99 {times_us[int(0.99 * (published - 1))]:.0f} us per batch')
+    print(f'Received: {received["samples"] / wall_time:.0f} samples/s ({received["batches"]} batches, {received["gaps"]} gaps)')
+    print(f'CPU: {100 * cpu_used / wall_time:.1f}% of a core (publisher and receiver), {1e6 * cpu_used / max(received["samples"], 1):.1f} us per sample')
+
+
+if __name__ == '__main__':
+    main()
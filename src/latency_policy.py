@@ -0,0 +1,29 @@
+from h264 import is_keyframe
+
+
+class LatencyPolicy:
+    # Caps how stale the frames of a stream may be by the time they are forwarded, without corrupting the picture.
+    #
+    # A frame that waited longer than the budget (in the encoder and the DepthAI output queue) is dropped, along with
+    # the rest of its GOP, as the frames after it could not be decoded without it. Forwarding resumes on the next
+    # keyframe, which is always let through, so that a host that stays behind still shows one picture per GOP.
+    def __init__(self, max_latency_seconds: float):
+        # A budget of 0 forwards every frame, however late
+        self.max_latency_seconds = max_latency_seconds
+        self.dropping = False
+
+
+    def admit(self, latency_seconds: float, data) -> bool:
+        # Takes a frame's latency and its encoded data, and returns whether to forward it
+        if self.max_latency_seconds <= 0:
+            return True
+        if not self.dropping and latency_seconds <= self.max_latency_seconds:
+            return True
+
+        # Only parse the frame when it matters, i.e. when late or already dropping
+        if is_keyframe(data):
+            self.dropping = False
+            return True
+
+        self.dropping = True
+        return False
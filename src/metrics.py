@@ -0,0 +1,270 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+# Name of the XLinkOut stream carrying the device's `SystemLogger` reports
+SYSTEM_INFO_STREAM_NAME = 'sysinfo'
+
+# Period over which frame and byte rates are averaged
+RATE_WINDOW_SECONDS = 5
+
+# Minimum time between repeats of the same warning
+WARNING_INTERVAL_SECONDS = 10
+
+# Host-side stages of handling a frame, from the DepthAI output queue to the RTSP server
+STAGES = ('get', 'getData', 'push')
+
+
+@dataclass
+class StreamMetrics:
+    # Whether the stream runs on the device, as streams without viewers may be paused (see OAKD_ON_DEMAND)
+    active: bool = True
+    frames: int = 0
+    bytes: int = 0
+    push_failures: int = 0
+    # Frames dropped for arriving later than the stream's latency budget (see `latency_policy.py`)
+    late_drops: int = 0
+    recording_drops: int = 0
+    recording_segments: int = 0
+    frames_per_second: float = 0.0
+    bytes_per_second: float = 0.0
+    # Age of the latest packet when it was taken off the output queue, i.e. how long it sat queued up
+    queue_latency_seconds: float = 0.0
+    stage_seconds: dict = field(default_factory=lambda: {stage: 0.0 for stage in STAGES})
+    stage_counts: dict = field(default_factory=lambda: {stage: 0 for stage in STAGES})
+    # Time spent blocked on the output queue until the next packet arrived, which is idle rather than handling frames
+    queue_wait_seconds: float = 0.0
+    window_start: float = field(default_factory=time.monotonic)
+    window_frames: int = 0
+    window_bytes: int = 0
+    last_frame_time: float = 0.0
+
+
+    def rates(self, now: float) -> tuple[float, float]:
+        # Frame and byte rates over the latest window, which only end with a frame, so a stream that stopped (e.g.
+        # after a device drop or while paused) would otherwise show its last rates forever
+        if now - self.last_frame_time >= RATE_WINDOW_SECONDS:
+            return 0.0, 0.0
+        return self.frames_per_second, self.bytes_per_second
+
+
+
+@dataclass
+class DeviceMetrics:
+    connected: bool = False
+    css_cpu_usage: float = 0.0
+    mss_cpu_usage: float = 0.0
+    ddr_memory_used: int = 0
+    ddr_memory_total: int = 0
+    cmx_memory_used: int = 0
+    cmx_memory_total: int = 0
+    chip_temperature: float = 0.0
+
+
+
+class StartupTimeline:
+    # Time from the start of bringing a device up to each stage of it, up to the first frame of every stream. Every
+    # stage is printed as it is reached, and the timeline starts over when the device reconnects.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.stages = {}
+        self.first_frames = set()
+
+
+    def restart(self):
+        with self.lock:
+            self.start = time.monotonic()
+            self.stages = {}
+            self.first_frames = set()
+
+
+    def mark(self, stage: str):
+        with self.lock:
+            if stage in self.stages:
+                return
+            seconds = time.monotonic() - self.start
+            self.stages[stage] = seconds
+        print(f'Startup: {stage} after {seconds * 1000:.0f} ms')
+
+
+    def mark_first_frame(self, stream_id: str):
+        # Called for every frame, so only the first one of each stream goes any further
+        if stream_id in self.first_frames:
+            return
+        self.first_frames.add(stream_id)
+        self.mark(f'first frame ({stream_id})')
+
+
+
+class Metrics:
+    # Per-stream and device health metrics of one device, rendered in the Prometheus text format
+    def __init__(self, device_id: str | None = None):
+        self.device_label = device_id or ''
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.device = DeviceMetrics()
+        self.rtsp_sessions = 0
+        self.startup = StartupTimeline()
+
+
+    def stream(self, stream_id: str) -> StreamMetrics:
+        if stream_id not in self.streams:
+            with self.lock:
+                self.streams.setdefault(stream_id, StreamMetrics())
+        return self.streams[stream_id]
+
+
+    def observe_stage(self, stream_id: str, stage: str, seconds: float):
+        # Only streams that have received frames are timed, which leaves out non-video queues (e.g. 'sysinfo')
+        stream_metrics = self.streams.get(stream_id)
+        if stream_metrics is None:
+            return
+        stream_metrics.stage_seconds[stage] += seconds
+        stream_metrics.stage_counts[stage] += 1
+
+
+    def observe_queue_wait(self, stream_id: str, seconds: float):
+        stream_metrics = self.streams.get(stream_id)
+        if stream_metrics is not None:
+            stream_metrics.queue_wait_seconds += seconds
+
+
+    def observe_frame(self, stream_id: str, frame_size: int, queue_latency_seconds: float | None = None):
+        self.startup.mark_first_frame(stream_id)
+        stream_metrics = self.stream(stream_id)
+        stream_metrics.frames += 1
+        stream_metrics.bytes += frame_size
+        stream_metrics.window_frames += 1
+        stream_metrics.window_bytes += frame_size
+        if queue_latency_seconds is not None:
+            stream_metrics.queue_latency_seconds = queue_latency_seconds
+
+        now = time.monotonic()
+        stream_metrics.last_frame_time = now
+        elapsed = now - stream_metrics.window_start
+        if elapsed >= RATE_WINDOW_SECONDS:
+            stream_metrics.frames_per_second = stream_metrics.window_frames / elapsed
+            stream_metrics.bytes_per_second = stream_metrics.window_bytes / elapsed
+            stream_metrics.window_start = now
+            stream_metrics.window_frames = 0
+            stream_metrics.window_bytes = 0
+
+
+    def observe_push_failure(self, stream_id: str):
+        self.stream(stream_id).push_failures += 1
+
+
+    def observe_late_drop(self, stream_id: str):
+        self.stream(stream_id).late_drops += 1
+
+
+    def observe_recording_drop(self, stream_id: str):
+        self.stream(stream_id).recording_drops += 1
+
+
+    def observe_recording_segment(self, stream_id: str):
+        self.stream(stream_id).recording_segments += 1
+
+
+    def observe_system_information(self, system_information):
+        # Takes a `dai.SystemInformation` message, as produced by the device's `SystemLogger` node
+        self.device.css_cpu_usage = system_information.leonCssCpuUsage.average
+        self.device.mss_cpu_usage = system_information.leonMssCpuUsage.average
+        self.device.ddr_memory_used = system_information.ddrMemoryUsage.used
+        self.device.ddr_memory_total = system_information.ddrMemoryUsage.total
+        self.device.cmx_memory_used = system_information.cmxMemoryUsage.used
+        self.device.cmx_memory_total = system_information.cmxMemoryUsage.total
+        self.device.chip_temperature = system_information.chipTemperature.average
+
+
+    def render(self) -> str:
+        lines = []
+
+        def add_metric(name: str, metric_type: str, description: str, samples: list[tuple[dict, float]]):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                labels = {'device': self.device_label, **labels}
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}')
+
+        with self.lock:
+            streams = dict(self.streams)
+        now = time.monotonic()
+
+        def per_stream(getter) -> list[tuple[dict, float]]:
+            return [({'stream': stream_id}, getter(stream_metrics)) for stream_id, stream_metrics in streams.items()]
+
+        add_metric('oakd_stream_active', 'gauge', 'Whether the stream runs on the device', per_stream(lambda m: int(m.active)))
+        add_metric('oakd_frames_total', 'counter', 'Frames received from the device', per_stream(lambda m: m.frames))
+        add_metric('oakd_bytes_total', 'counter', 'Encoded bytes received from the device', per_stream(lambda m: m.bytes))
+        add_metric('oakd_frames_per_second', 'gauge', f'Frame rate over the last {RATE_WINDOW_SECONDS} s', per_stream(lambda m: round(m.rates(now)[0], 2)))
+        add_metric('oakd_bytes_per_second', 'gauge', f'Byte rate over the last {RATE_WINDOW_SECONDS} s', per_stream(lambda m: round(m.rates(now)[1])))
+        add_metric('oakd_push_failures_total', 'counter', 'Frames rejected by the RTSP pipeline (push-buffer)', per_stream(lambda m: m.push_failures))
+        add_metric('oakd_late_drops_total', 'counter', 'Frames dropped up to the next keyframe for exceeding the latency budget', per_stream(lambda m: m.late_drops))
+        add_metric('oakd_recording_drops_total', 'counter', 'Frames left out of the recording as storage could not keep up', per_stream(lambda m: m.recording_drops))
+        add_metric('oakd_recording_segments_total', 'counter', 'Recording segments written', per_stream(lambda m: m.recording_segments))
+        add_metric('oakd_queue_latency_seconds', 'gauge', 'Time the latest frame spent in the DepthAI output queue', per_stream(lambda m: round(m.queue_latency_seconds, 4)))
+        add_metric(
+            'oakd_stage_seconds_total', 'counter', 'Host time spent per frame handling stage',
+            [({'stream': stream_id, 'stage': stage}, round(m.stage_seconds[stage], 6)) for stream_id, m in streams.items() for stage in STAGES],
+        )
+        add_metric(
+            'oakd_queue_wait_seconds_total', 'counter', 'Host time spent idle, waiting for the next frame from the device',
+            per_stream(lambda m: round(m.queue_wait_seconds, 6)),
+        )
+        add_metric(
+            'oakd_stage_calls_total', 'counter', 'Number of times each frame handling stage ran',
+            [({'stream': stream_id, 'stage': stage}, m.stage_counts[stage]) for stream_id, m in streams.items() for stage in STAGES],
+        )
+
+        device = self.device
+        add_metric('oakd_device_connected', 'gauge', 'Whether the device is connected', [({}, int(device.connected))])
+        add_metric('oakd_device_cpu_usage_ratio', 'gauge', 'Device CPU usage', [
+            ({'cpu': 'leon_css'}, round(device.css_cpu_usage, 4)),
+            ({'cpu': 'leon_mss'}, round(device.mss_cpu_usage, 4)),
+        ])
+        add_metric('oakd_device_memory_used_bytes', 'gauge', 'Device memory in use', [
+            ({'memory': 'ddr'}, device.ddr_memory_used),
+            ({'memory': 'cmx'}, device.cmx_memory_used),
+        ])
+        add_metric('oakd_device_memory_total_bytes', 'gauge', 'Device memory available', [
+            ({'memory': 'ddr'}, device.ddr_memory_total),
+            ({'memory': 'cmx'}, device.cmx_memory_total),
+        ])
+        add_metric('oakd_device_temperature_celsius', 'gauge', 'Average chip temperature', [({}, round(device.chip_temperature, 2))])
+        add_metric('oakd_rtsp_sessions', 'gauge', 'Active RTSP sessions', [({}, self.rtsp_sessions)])
+        with self.startup.lock:
+            startup_stages = dict(self.startup.stages)
+        add_metric(
+            'oakd_startup_seconds', 'gauge', 'Time from the start of bringing the device up (or back up) to each stage of it',
+            [({'stage': stage}, round(seconds, 4)) for stage, seconds in startup_stages.items()],
+        )
+
+        return '\n'.join(lines) + '\n'
+
+
+    def handle_request(self, path: str) -> tuple[int, str, bytes]:
+        return 200, 'text/plain; version=0.0.4', self.render().encode()
+
+
+
+_warning_times = {}
+_warning_lock = threading.Lock()
+
+
+def warn_rate_limited(key: str, message: str, interval: float = WARNING_INTERVAL_SECONDS):
+    # Prints a warning at most once per interval for the same key, noting how many repeats were held back
+    now = time.monotonic()
+    with _warning_lock:
+        last_time, suppressed = _warning_times.get(key, (None, 0))
+        if last_time is not None and now - last_time < interval:
+            _warning_times[key] = (last_time, suppressed + 1)
+            return
+        _warning_times[key] = (now, 0)
+
+    if suppressed > 0:
+        message = f'{message} (repeated {suppressed} more time(s) in the last {interval:g} s)'
+    print(message)
@@ -1,6 +1,14 @@
 import depthai as dai
 
+import settings
 from camera_streams import SupportedConfig
+from composite import create_compositor
+from frame_gates import create_gate_control, create_frame_gate
+from imu import IMU_STREAM_NAME
+from metrics import SYSTEM_INFO_STREAM_NAME
+from raw_depth import RAW_DEPTH_STREAM_NAME
+from snapshots import SNAPSHOT_QUALITY, snapshot_stream_name
+from stream_profiles import StreamProfile, COLOR_RESOLUTIONS, MONO_RESOLUTIONS, MONO_RESOLUTION_SIZES, LOW_RESOLUTIONS, ENCODER_PROFILES, load_profiles
 
 """
 Pipeline Visualization (auto-generated by ChatGPT as of 02/12/2025).
@@ -21,78 +29,218 @@ Prompt Source: https://gist.github.com/tejashah88/3672eb69bbeeceaccc246d60af8525
 | Colormap          | ---> | Video Encoder    | ---> | XLinkOut ('depth') |
 | (colormap)        |      | (videoDepthEnc)  |      | (xout)             |
 +-------------------+      +------------------+      +--------------------+
+
+NOTE: A System Logger node reports the device's CPU/memory usage and temperature through the XLinkOut ('sysinfo')
+stream, for the metrics endpoint.
+
+NOTE: With raw depth or obstacle ranges enabled, the Stereo Depth node's UINT16 depth output is also sent as is
+through the XLinkOut ('depth_raw') stream, to be compressed losslessly (see `raw_depth.py`) or reduced to ranges per
+sector (see `obstacle_ranges.py`) on the host.
+
+NOTE: With snapshots enabled, every camera (and the colormapped depth) also feeds an MJPEG encoder at a low frame
+rate, through its own frame gate and XLinkOut ('<stream>_snapshot') stream, for the snapshot endpoint.
+
+NOTE: With a composite stream enabled, the outputs it tiles are also fed through a frame gate of the composite stream
+and scaled by an ImageManip node each, then stacked into one frame by a Script node (see `composite.py`), which feeds a video encoder and the XLinkOut ('composite') stream.
+
+NOTE: With low renditions enabled, a camera (or the colormapped depth) also feeds an ImageManip node that scales it
+down, and a second video encoder at a lower bitrate, through its own frame gate and XLinkOut ('<stream>_low') stream.
+
+NOTE: With IMU samples enabled, an IMU node reports batches of accelerometer, gyroscope and (on IMUs that have one)
+rotation vector samples through the XLinkOut ('imu') stream, to be published on the host (see `imu.py`).
+
+NOTE: Every video encoder is fed through a frame gate (see `frame_gates.py`), controlled by the host through
+the XLinkIn ('gate_control') stream. The gates are left out above for readability.
 """
 
+# How often the device reports its health, in Hz
+SYSTEM_INFO_RATE_HZ = 1
+
+
+def configure_encoder(encoder, profile: StreamProfile, fps: float):
+    encoder.setDefaultProfilePreset(fps, getattr(dai.VideoEncoderProperties.Profile, ENCODER_PROFILES[profile.profile]))
+    if profile.bitrate_kbps > 0:
+        encoder.setBitrateKbps(profile.bitrate_kbps)
+    encoder.setKeyframeFrequency(profile.keyframe_interval)
+
+
+def create_snapshot_encoder(pipeline, gate_control_in, stream_id: str, source, fps: float, snapshot_fps: float):
+    # Encodes one in every few frames of `source` as a JPEG, for the snapshot endpoint
+    gate = create_frame_gate(pipeline, gate_control_in, snapshot_stream_name(stream_id), divisor=max(1, round(fps / snapshot_fps)))
+
+    encoder = pipeline.create(dai.node.VideoEncoder)
+    encoder.setDefaultProfilePreset(snapshot_fps, dai.VideoEncoderProperties.Profile.MJPEG)
+    encoder.setQuality(SNAPSHOT_QUALITY)
+
+    snapshotOut = pipeline.create(dai.node.XLinkOut)
+    snapshotOut.setStreamName(snapshot_stream_name(stream_id))
+
+    source.link(gate.inputs['in'])
+    gate.outputs['out'].link(encoder.input)
+    encoder.bitstream.link(snapshotOut.input)
+
+
+def create_low_rendition(pipeline, gate_control_in, stream_id: str, source, profile: StreamProfile, fps: float):
+    # Encodes a downscaled copy of `source`, gated ahead of the scaling so that a paused rendition costs nothing. The
+    # gate starts closed, until the host sees someone watching.
+    gate = create_frame_gate(pipeline, gate_control_in, stream_id, divisor=0)
+
+    width, height = LOW_RESOLUTIONS[profile.resolution]
+    scaler = pipeline.create(dai.node.ImageManip)
+    scaler.initialConfig.setResizeThumbnail(width, height)
+    scaler.initialConfig.setFrameType(dai.ImgFrame.Type.NV12)
+    scaler.setMaxOutputFrameSize(width * height * 3 // 2)
+
+    encoder = pipeline.create(dai.node.VideoEncoder)
+    configure_encoder(encoder, profile, fps)
+
+    lowEncOut = pipeline.create(dai.node.XLinkOut)
+    lowEncOut.setStreamName(stream_id)
+
+    source.link(gate.inputs['in'])
+    gate.outputs['out'].link(scaler.inputImage)
+    scaler.out.link(encoder.input)
+    encoder.bitstream.link(lowEncOut.input)
+
+
+def create_imu(pipeline, imu_model: str, rate_hz: int, batch_size: int):
+    imu = pipeline.create(dai.node.IMU)
+    imu.enableIMUSensor([dai.IMUSensor.ACCELEROMETER_RAW, dai.IMUSensor.GYROSCOPE_RAW], rate_hz)
+    if imu_model.startswith('BNO'):
+        imu.enableIMUSensor(dai.IMUSensor.ROTATION_VECTOR, rate_hz)
+
+    # Report once a whole batch is in, and let a device that fell behind catch up in batches of up to twice the size
+    imu.setBatchReportThreshold(batch_size)
+    imu.setMaxBatchReports(2 * batch_size)
+
+    imuOut = pipeline.create(dai.node.XLinkOut)
+    imuOut.setStreamName(IMU_STREAM_NAME)
+    imu.out.link(imuOut.input)
 
-DEFAULT_FPS = 15
 
+def build_processing_pipeline(
+    supported_config: SupportedConfig,
+    profiles: dict[str, StreamProfile] | None = None,
+    raw_depth: bool = settings.RAW_DEPTH or settings.OBSTACLE_RANGES,
+    snapshot_fps: float = settings.SNAPSHOT_FPS,
+    composite_streams: list[str] = settings.COMPOSITE_STREAMS,
+    imu_rate_hz: int = settings.IMU_RATE_HZ if settings.IMU else 0,
+):
+    if profiles is None:
+        profiles = load_profiles()
 
-def build_processing_pipeline(supported_config: SupportedConfig):
     # Create pipeline
     pipeline = dai.Pipeline()
 
+    # Create Input Stream Node for controlling the frame gates in front of the encoders
+    gateControlIn = create_gate_control(pipeline)
+
+    # Create System Logger Node for the device's health metrics
+    sysLog = pipeline.create(dai.node.SystemLogger)
+    sysLog.setRate(SYSTEM_INFO_RATE_HZ)
+
+    sysLogOut = pipeline.create(dai.node.XLinkOut)
+    sysLogOut.setStreamName(SYSTEM_INFO_STREAM_NAME)
+    sysLog.out.link(sysLogOut.input)
+
+    if imu_rate_hz > 0 and supported_config.imu is not None:
+        create_imu(pipeline, supported_config.imu, imu_rate_hz, settings.IMU_BATCH_SIZE)
+
+    # Outputs available to the composite stream, along with their FPS
+    tileSources = {}
+
 
     if supported_config.rgb:
         # Create Color Camera Node
         camRgb = pipeline.create(dai.node.ColorCamera)
         camRgb.setBoardSocket(dai.CameraBoardSocket.CAM_A)
-        camRgb.setResolution(dai.ColorCameraProperties.SensorResolution.THE_1080_P)
-        camRgb.setFps(DEFAULT_FPS)
+        camRgb.setResolution(getattr(dai.ColorCameraProperties.SensorResolution, COLOR_RESOLUTIONS[profiles['rgb'].resolution]))
+        camRgb.setFps(profiles['rgb'].fps)
 
         # Create Video Encoder Node
         videoRgbEnc = pipeline.create(dai.node.VideoEncoder)
-        videoRgbEnc.setDefaultProfilePreset(camRgb.getFps(), dai.VideoEncoderProperties.Profile.H264_MAIN)
+        configure_encoder(videoRgbEnc, profiles['rgb'], camRgb.getFps())
 
         # Create Output Stream Node for RGB Camera
         rgbEncOut = pipeline.create(dai.node.XLinkOut)
         rgbEncOut.setStreamName('rgb')
 
         # Link Color Camera nodes
-        camRgb.video.link(videoRgbEnc.input)
+        rgbGate = create_frame_gate(pipeline, gateControlIn, 'rgb')
+        camRgb.video.link(rgbGate.inputs['in'])
+        rgbGate.outputs['out'].link(videoRgbEnc.input)
         videoRgbEnc.bitstream.link(rgbEncOut.input)
 
+        if snapshot_fps > 0:
+            create_snapshot_encoder(pipeline, gateControlIn, 'rgb', camRgb.video, camRgb.getFps(), snapshot_fps)
+
+        tileSources['rgb'] = (camRgb.video, camRgb.getFps())
+
+        if supported_config.check('rgb_low'):
+            create_low_rendition(pipeline, gateControlIn, 'rgb_low', camRgb.video, profiles['rgb_low'], camRgb.getFps())
+
 
     if supported_config.mono_left:
         # Create Left Mono Camera Node
         monoLeft = pipeline.create(dai.node.MonoCamera)
         monoLeft.setBoardSocket(dai.CameraBoardSocket.CAM_B)
-        monoLeft.setResolution(dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        monoLeft.setResolution(getattr(dai.MonoCameraProperties.SensorResolution, MONO_RESOLUTIONS[profiles['mono_left'].resolution]))
         monoLeft.setCamera('left')
-        monoLeft.setFps(DEFAULT_FPS)
+        monoLeft.setFps(profiles['mono_left'].fps)
 
         # Create Video Encoder Node
         videoMonoLeftEnc = pipeline.create(dai.node.VideoEncoder)
-        videoMonoLeftEnc.setDefaultProfilePreset(monoLeft.getFps(), dai.VideoEncoderProperties.Profile.H264_MAIN)
+        configure_encoder(videoMonoLeftEnc, profiles['mono_left'], monoLeft.getFps())
 
         # Create Output Stream Node for RGB Camera
         monoLeftEncOut = pipeline.create(dai.node.XLinkOut)
         monoLeftEncOut.setStreamName('mono_left')
 
         # Link Mono Left Camera nodes
-        monoLeft.out.link(videoMonoLeftEnc.input)
+        monoLeftGate = create_frame_gate(pipeline, gateControlIn, 'mono_left')
+        monoLeft.out.link(monoLeftGate.inputs['in'])
+        monoLeftGate.outputs['out'].link(videoMonoLeftEnc.input)
         videoMonoLeftEnc.bitstream.link(monoLeftEncOut.input)
 
+        if snapshot_fps > 0:
+            create_snapshot_encoder(pipeline, gateControlIn, 'mono_left', monoLeft.out, monoLeft.getFps(), snapshot_fps)
+
+        tileSources['mono_left'] = (monoLeft.out, monoLeft.getFps())
+
+        if supported_config.check('mono_left_low'):
+            create_low_rendition(pipeline, gateControlIn, 'mono_left_low', monoLeft.out, profiles['mono_left_low'], monoLeft.getFps())
+
 
     if supported_config.mono_right:
         # Create Right Mono Camera Node
         monoRight = pipeline.create(dai.node.MonoCamera)
         monoRight.setBoardSocket(dai.CameraBoardSocket.CAM_C)
-        monoRight.setResolution(dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        monoRight.setResolution(getattr(dai.MonoCameraProperties.SensorResolution, MONO_RESOLUTIONS[profiles['mono_right'].resolution]))
         monoRight.setCamera('right')
-        monoRight.setFps(DEFAULT_FPS)
+        monoRight.setFps(profiles['mono_right'].fps)
 
         # Create Video Encoder Node
         videoMonoRightEnc = pipeline.create(dai.node.VideoEncoder)
-        videoMonoRightEnc.setDefaultProfilePreset(monoRight.getFps(), dai.VideoEncoderProperties.Profile.H264_MAIN)
+        configure_encoder(videoMonoRightEnc, profiles['mono_right'], monoRight.getFps())
 
         # Create Output Stream Node for RGB Camera
         monoRightEncOut = pipeline.create(dai.node.XLinkOut)
         monoRightEncOut.setStreamName('mono_right')
 
         # Link Mono Right Camera nodes
-        monoRight.out.link(videoMonoRightEnc.input)
+        monoRightGate = create_frame_gate(pipeline, gateControlIn, 'mono_right')
+        monoRight.out.link(monoRightGate.inputs['in'])
+        monoRightGate.outputs['out'].link(videoMonoRightEnc.input)
         videoMonoRightEnc.bitstream.link(monoRightEncOut.input)
 
+        if snapshot_fps > 0:
+            create_snapshot_encoder(pipeline, gateControlIn, 'mono_right', monoRight.out, monoRight.getFps(), snapshot_fps)
+
+        tileSources['mono_right'] = (monoRight.out, monoRight.getFps())
+
+        if supported_config.check('mono_right_low'):
+            create_low_rendition(pipeline, gateControlIn, 'mono_right_low', monoRight.out, profiles['mono_right_low'], monoRight.getFps())
+
 
     if supported_config.depth:
         # Create Depth Node to produce the depth map from both mono cameras
@@ -101,7 +249,8 @@ def build_processing_pipeline(supported_config: SupportedConfig):
         depth.initialConfig.setMedianFilter(dai.MedianFilter.KERNEL_7x7)
         depth.setLeftRightCheck(True)
         depth.setExtendedDisparity(True)
-        # NOTE: Subpixel disparity is of UINT16 format, which is unsupported by VideoEncoder
+        # NOTE: Subpixel disparity is of UINT16 format, which is unsupported by VideoEncoder. The depth output is
+        # UINT16 (in millimetres) either way, which is what the raw depth stream carries.
         depth.setSubpixel(False)
 
         # Link output of Mono Camera Nodes to input of Depth Node
@@ -115,14 +264,54 @@ def build_processing_pipeline(supported_config: SupportedConfig):
 
         videoDepthEnc = pipeline.create(dai.node.VideoEncoder)
         # Depth resolution/FPS will be the same as mono resolution/FPS
-        videoDepthEnc.setDefaultProfilePreset(monoLeft.getFps(), dai.VideoEncoderProperties.Profile.H264_MAIN) # type: ignore
+        configure_encoder(videoDepthEnc, profiles['depth'], monoLeft.getFps()) # type: ignore
 
         # Link
+        depthGate = create_frame_gate(pipeline, gateControlIn, 'depth')
         depth.disparity.link(colormap.inputImage)
-        colormap.out.link(videoDepthEnc.input)
+        colormap.out.link(depthGate.inputs['in'])
+        depthGate.outputs['out'].link(videoDepthEnc.input)
 
         xout = pipeline.create(dai.node.XLinkOut)
         xout.setStreamName('depth')
         videoDepthEnc.bitstream.link(xout.input)
 
+        if snapshot_fps > 0:
+            create_snapshot_encoder(pipeline, gateControlIn, 'depth', colormap.out, monoLeft.getFps(), snapshot_fps) # type: ignore
+
+        tileSources['depth'] = (colormap.out, monoLeft.getFps()) # type: ignore
+
+        if supported_config.check('depth_low'):
+            create_low_rendition(pipeline, gateControlIn, 'depth_low', colormap.out, profiles['depth_low'], monoLeft.getFps()) # type: ignore
+
+        if raw_depth:
+            rawDepthOut = pipeline.create(dai.node.XLinkOut)
+            rawDepthOut.setStreamName(RAW_DEPTH_STREAM_NAME)
+            depth.depth.link(rawDepthOut.input)
+
+
+    if supported_config.composite:
+        # Create Compositor Node, which stacks the tiles into one frame
+        tileWidth, tileHeight = MONO_RESOLUTION_SIZES[profiles['composite'].resolution]
+        compositor = create_compositor(
+            pipeline,
+            gateControlIn,
+            'composite',
+            {stream_id: tileSources[stream_id][0] for stream_id in composite_streams},
+            tileWidth,
+            tileHeight,
+        )
+
+        # Create Video Encoder Node, running at the rate of the first tile
+        videoCompositeEnc = pipeline.create(dai.node.VideoEncoder)
+        configure_encoder(videoCompositeEnc, profiles['composite'], tileSources[composite_streams[0]][1])
+
+        # Create Output Stream Node for the composite stream
+        compositeEncOut = pipeline.create(dai.node.XLinkOut)
+        compositeEncOut.setStreamName('composite')
+
+        # Link Compositor nodes
+        compositor.outputs['out'].link(videoCompositeEnc.input)
+        videoCompositeEnc.bitstream.link(compositeEncOut.input)
+
     return pipeline
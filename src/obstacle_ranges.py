@@ -0,0 +1,163 @@
+"""
+Nearest obstacle distance per sector of the raw depth frames (see `raw_depth.py`), for station-keeping and obstacle
+avoidance at the camera's full rate.
+
+Each frame is split into a grid of sectors, and the min, median and a low percentile (a min that is robust to a
+few noisy pixels) of the valid depths are computed for every sector at once: invalid (zero) pixels are pushed to the
+top of the range, each sector is sorted in one batched `np.sort`, and the statistics are picked out by index.
+
+Ranges are sent as MAVLink 2 DISTANCE_SENSOR messages over UDP (one per sector, with the sector's direction as a
+quaternion), and are also available as JSON from the HTTP API.
+"""
+
+import json
+import math
+import socket
+import struct
+import threading
+
+import numpy as np
+
+
+# Oak-D mono camera field of view, which sets the direction of each sector
+HORIZONTAL_FOV_DEGREES = 72
+VERTICAL_FOV_DEGREES = 50
+
+# Depths outside this range are not trusted, in millimetres
+MIN_RANGE_MM = 200
+MAX_RANGE_MM = 20000
+
+# Only every n-th pixel (in both directions) is used, which is plenty for sectors spanning dozens of pixels
+DEFAULT_SUBSAMPLE = 2
+
+MAVLINK_SYSTEM_ID = 1
+MAVLINK_COMPONENT_ID = 196 # MAV_COMP_ID_OBSTACLE_AVOIDANCE
+MAVLINK_DISTANCE_SENSOR_ID = 132
+MAVLINK_DISTANCE_SENSOR_CRC_EXTRA = 85
+MAV_DISTANCE_SENSOR_INFRARED = 2
+MAV_SENSOR_ROTATION_CUSTOM = 100
+
+# DISTANCE_SENSOR fields in wire order: time_boot_ms, min/max/current distance (cm), type, id, orientation,
+# covariance, then the extensions: horizontal/vertical FOV (rad), quaternion and signal quality
+DISTANCE_SENSOR_PAYLOAD = struct.Struct('<IHHHBBBBff4fB')
+
+
+def sector_ranges(frame: np.ndarray, rows: int, cols: int, percentile: float, subsample: int = DEFAULT_SUBSAMPLE):
+    # Returns (min, median, percentile) arrays of shape (rows, cols) in millimetres, where 0 means no valid depth
+    frame = frame[::subsample, ::subsample]
+    height, width = frame.shape[0] // rows * rows, frame.shape[1] // cols * cols
+
+    # (rows, cols, pixels per sector), with invalid pixels sorted to the end
+    sectors = frame[:height, :width].reshape(rows, height // rows, cols, width // cols).swapaxes(1, 2).reshape(rows, cols, -1)
+    valid = (sectors >= MIN_RANGE_MM) & (sectors <= MAX_RANGE_MM)
+    sorted_depths = np.sort(np.where(valid, sectors, np.uint16(0xFFFF)), axis=2)
+    valid_counts = valid.sum(axis=2)
+
+    last_valid = np.maximum(valid_counts - 1, 0)
+    picks = np.stack([
+        np.zeros_like(last_valid),
+        last_valid // 2,
+        (last_valid * percentile / 100).astype(last_valid.dtype),
+    ], axis=2)
+    stats = np.take_along_axis(sorted_depths, picks, axis=2)
+    stats[valid_counts == 0] = 0
+    return stats[..., 0], stats[..., 1], stats[..., 2]
+
+
+def x25_crc(data: bytes, crc: int = 0xFFFF) -> int:
+    for byte in data:
+        tmp = byte ^ (crc & 0xFF)
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+def mavlink2_message(message_id: int, crc_extra: int, payload: bytes, sequence: int) -> bytes:
+    # MAVLink 2 drops trailing zero bytes of the payload (but always keeps the first)
+    payload = payload[:1] + payload[1:].rstrip(b'\x00')
+    header = struct.pack(
+        '<BBBBBBBHB', 0xFD, len(payload), 0, 0, sequence & 0xFF,
+        MAVLINK_SYSTEM_ID, MAVLINK_COMPONENT_ID, message_id & 0xFFFF, message_id >> 16,
+    )
+    crc = x25_crc(header[1:] + payload)
+    crc = x25_crc(bytes([crc_extra]), crc)
+    return header + payload + struct.pack('<H', crc)
+
+
+def sector_quaternion(row: int, col: int, rows: int, cols: int) -> tuple[float, float, float, float]:
+    # Direction of a sector's center, relative to a forward-facing camera (yaw to the right, pitch up)
+    yaw = math.radians(((col + 0.5) / cols - 0.5) * HORIZONTAL_FOV_DEGREES)
+    pitch = -math.radians(((row + 0.5) / rows - 0.5) * VERTICAL_FOV_DEGREES)
+    return (
+        math.cos(pitch / 2) * math.cos(yaw / 2),
+        -math.sin(pitch / 2) * math.sin(yaw / 2),
+        math.sin(pitch / 2) * math.cos(yaw / 2),
+        math.cos(pitch / 2) * math.sin(yaw / 2),
+    )
+
+
+
+class ObstacleRanges:
+    # Computes sector ranges from raw depth frames and publishes them as MAVLink DISTANCE_SENSOR messages
+    def __init__(self, rows: int, cols: int, percentile: float, mavlink_address: tuple[str, int] | None = None):
+        self.rows = rows
+        self.cols = cols
+        self.percentile = percentile
+        self.mavlink_address = mavlink_address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+
+        self.lock = threading.Lock()
+        self.latest = None
+
+        self.quaternions = [[sector_quaternion(row, col, rows, cols) for col in range(cols)] for row in range(rows)]
+        self.sector_fov = (math.radians(HORIZONTAL_FOV_DEGREES / cols), math.radians(VERTICAL_FOV_DEGREES / rows))
+
+
+    def process(self, packet):
+        # Takes a `dai.ImgFrame` of type RAW16 (see `raw_depth.py`)
+        timestamp_ms = int(packet.getTimestampDevice().total_seconds() * 1000)
+        minimums, medians, percentiles = sector_ranges(packet.getFrame(), self.rows, self.cols, self.percentile)
+
+        with self.lock:
+            self.latest = (timestamp_ms, minimums, medians, percentiles)
+
+        if self.mavlink_address is not None:
+            self.send_distance_sensors(timestamp_ms, percentiles)
+
+
+    def send_distance_sensors(self, timestamp_ms: int, ranges_mm: np.ndarray):
+        for row in range(self.rows):
+            for col in range(self.cols):
+                # No valid depth means nothing within range, which MAVLink reports as beyond the max distance
+                range_mm = int(ranges_mm[row, col]) or MAX_RANGE_MM + 10
+                payload = DISTANCE_SENSOR_PAYLOAD.pack(
+                    timestamp_ms & 0xFFFFFFFF, MIN_RANGE_MM // 10, MAX_RANGE_MM // 10, range_mm // 10,
+                    MAV_DISTANCE_SENSOR_INFRARED, row * self.cols + col, MAV_SENSOR_ROTATION_CUSTOM, 0,
+                    *self.sector_fov, *self.quaternions[row][col], 0,
+                )
+                message = mavlink2_message(MAVLINK_DISTANCE_SENSOR_ID, MAVLINK_DISTANCE_SENSOR_CRC_EXTRA, payload, self.sequence)
+                self.sequence += 1
+                try:
+                    self.socket.sendto(message, self.mavlink_address)
+                except OSError:
+                    # Nobody listening; the next frame's ranges supersede these anyway
+                    return
+
+
+    def handle_request(self, path: str) -> tuple[int, str, bytes]:
+        with self.lock:
+            latest = self.latest
+        if latest is None:
+            return 503, 'text/plain', b'No depth frames received yet\n'
+
+        timestamp_ms, minimums, medians, percentiles = latest
+        body = {
+            'timestamp_ms': timestamp_ms,
+            'grid': [self.rows, self.cols],
+            'percentile': self.percentile,
+            'min_mm': minimums.tolist(),
+            'median_mm': medians.tolist(),
+            'percentile_mm': percentiles.tolist(),
+        }
+        return 200, 'application/json', json.dumps(body).encode()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of reading frames off the device's output queues (see `frame_pump.py`), without a physical Oak-D.
+
+Simulated output queues produce `--frame-size` byte frames at `--fps` on each of `--streams` queues, which are read
+either by the original vision loop (`spin`), polling every queue with `has()` and no sleep, or by the frame pump
+(`pump`), with a reader thread per queue blocking on `get()`. Both hand every frame to the same no-op consumer, so
+the difference in the process' CPU usage (and CPU time per frame) is the cost of waiting for frames. Run it on the
+vehicle's computer (i.e. a Raspberry Pi) to see what it costs there.
+
+Example:
+    python pump_benchmark.py --streams 4 --fps 15 --duration 10
+    python pump_benchmark.py --mode spin --streams 1 --fps 30
+"""
+
+import argparse
+import resource
+import threading
+import time
+
+import numpy as np
+
+from frame_pump import FramePump
+from simulated_device import SimulatedOutputQueue
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+
+class FrameCounter:
+    # Stands in for `RTSPServer.send_data`, so that only the cost of reading frames is measured
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+
+
+    def consume(self, packet):
+        data = packet.getData()
+        with self.lock:
+            self.frames += 1
+        return data
+
+
+def run_spin(output_queues: dict, counter: FrameCounter, stopped: threading.Event):
+    # The original vision loop, which checks every queue over and over without ever waiting
+    supported_streams = set(output_queues)
+    while not stopped.is_set():
+        for queue_id, output_queue in output_queues.items():
+            if queue_id in supported_streams and output_queue.has():
+                counter.consume(output_queue.get())
+
+
+def measure(mode: str, args) -> tuple[float, float, int]:
+    # Returns the CPU time used, the wall time and the number of frames handed to the consumer
+    access_units = [np.zeros(args.frame_size, dtype=np.uint8)]
+    # Same queue settings as `stream_device()`
+    output_queues = {
+        f'stream{index}': SimulatedOutputQueue(f'stream{index}', access_units, args.fps, maxSize=30, blocking=True)
+        for index in range(args.streams)
+    }
+    counter = FrameCounter()
+
+    cpu_start, wall_start = cpu_seconds(), time.monotonic()
+    if mode == 'spin':
+        stopped = threading.Event()
+        spin_thread = threading.Thread(target=run_spin, args=(output_queues, counter, stopped), daemon=True)
+        spin_thread.start()
+        time.sleep(args.duration)
+        stopped.set()
+        spin_thread.join()
+    else:
+        frame_pump = FramePump()
+        for queue_name, output_queue in output_queues.items():
+            frame_pump.add_consumer(queue_name, output_queue, counter.consume)
+        frame_pump.start()
+        time.sleep(args.duration)
+        frame_pump.stop()
+    cpu_used, wall_time = cpu_seconds() - cpu_start, time.monotonic() - wall_start
+
+    for output_queue in output_queues.values():
+        output_queue.close()
+    return cpu_used, wall_time, counter.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the frame pump against the original polling loop')
+    parser.add_argument('--mode', choices=('spin', 'pump', 'both'), default='both', help='How to read the queues (default: both, one after the other)')
+    parser.add_argument('--streams', type=int, default=4, help='Number of output queues (default: 4)')
+    parser.add_argument('--fps', type=float, default=15, help='Frame rate of every queue (default: 15)')
+    parser.add_argument('--frame-size', type=int, default=50_000, help='Bytes per frame (default: 50000)')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement duration per mode in seconds (default: 10)')
+    args = parser.parse_args()
+
+    modes = ('spin', 'pump') if args.mode == 'both' else (args.mode,)
+    results = {mode: measure(mode, args) for mode in modes}
+
+    print('\n=== Frame pump benchmark results ===')
+    print(f'Queues: {args.streams} at {args.fps:g} FPS, {args.frame_size} bytes per frame, {args.duration:g} s per mode')
+    for mode, (cpu_used, wall_time, frames) in results.items():
+        print(
+            f'{mode:<5} {frames / wall_time:6.1f} FPS delivered, CPU {100 * cpu_used / wall_time:5.1f}% of a core, '
+            f'{1e6 * cpu_used / max(frames, 1):8.0f} us per frame'
+        )
+
+
+if __name__ == '__main__':
+    main()
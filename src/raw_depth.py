@@ -0,0 +1,155 @@
+"""
+Raw 16-bit depth frames (in millimetres, from the `StereoDepth` node's `depth` output) for local consumers, losslessly
+compressed on the host and published over UDP.
+
+Compression is vectorised with NumPy: each row is delta-coded against its left neighbour (wrapping around at 16 bits),
+which turns smooth surfaces into runs of small values, and the low and high bytes are split into separate planes, so
+that the mostly-zero high bytes compress to almost nothing. The planes are then compressed with zstd at level 1, or,
+without the optional `zstandard` package, deflated with zlib at its fastest level, matching only runs (`Z_RLE`). On a
+640x400 frame zstd takes a quarter to a half of the time zlib does (around 4 ms instead of 9-16 ms on an x86 core),
+and compresses slightly better (about 3.8x instead of 3.2x); zlib at 30 FPS would take an estimated half of a Raspberry Pi's core.
+
+Each frame is sent as one or more datagrams, each starting with a `PACKET_HEADER`:
+    magic (b'ODZ1' for zstd, b'ODD1' for zlib), sequence number (uint32), device timestamp in microseconds (uint64),
+    width, height, chunk index and chunk count (uint16 each)
+followed by its chunk of the compressed frame. All fields are little-endian. See `DepthReassembler` for the receiving side.
+"""
+
+import socket
+import struct
+import time
+import zlib
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Name of the XLinkOut stream carrying the raw depth frames
+RAW_DEPTH_STREAM_NAME = 'depth_raw'
+
+# Identifies the compression of each frame, so that receivers without zstd support drop its frames rather than
+# misread them
+PACKET_MAGICS = {
+    'zlib': b'ODD1',
+    'zstd': b'ODZ1',
+}
+CODECS_BY_MAGIC = {magic: codec for codec, magic in PACKET_MAGICS.items()}
+PACKET_HEADER = struct.Struct('<4sIQHHHH')
+
+# Keeps every datagram within the maximum UDP payload size
+MAX_CHUNK_BYTES = 60000
+
+DEFAULT_CODEC = 'zlib' if zstandard is None else 'zstd'
+COMPRESSION_LEVEL = 1
+
+
+def compress(data, codec: str, level: int) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_RLE)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(payload: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Decoding zstd depth frames needs the "zstandard" package')
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def encode_depth(frame: np.ndarray, codec: str = DEFAULT_CODEC, level: int = COMPRESSION_LEVEL) -> bytes:
+    # Takes a (height, width) UINT16 frame
+    frame = np.ascontiguousarray(frame, dtype=np.uint16)
+    deltas = frame.copy()
+    np.subtract(frame[:, 1:], frame[:, :-1], out=deltas[:, 1:])
+
+    # Little-endian byte pairs, rearranged into a plane of low bytes followed by a plane of high bytes
+    planes = deltas.astype('<u2', copy=False).view(np.uint8).reshape(-1, 2).T
+    return compress(np.ascontiguousarray(planes), codec, level)
+
+
+def decode_depth(payload: bytes, width: int, height: int, codec: str = DEFAULT_CODEC) -> np.ndarray:
+    planes = np.frombuffer(decompress(payload, codec), dtype=np.uint8).reshape(2, -1)
+    deltas = np.ascontiguousarray(planes.T).view('<u2').reshape(height, width)
+    return np.cumsum(deltas, axis=1, dtype=np.uint16)
+
+
+
+class DepthPublisher:
+    # Compresses raw depth frames and sends them to a local UDP port
+    def __init__(self, port: int, host: str = '127.0.0.1', metrics=None, codec: str = DEFAULT_CODEC):
+        self.address = (host, port)
+        self.codec = codec
+        # Frame sizes and handling times are reported to `metrics` (see `metrics.py`), if given
+        self.metrics = metrics
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        print(f'Raw depth frames available at udp://{host}:{port} ({codec} compressed)')
+
+
+    def publish(self, packet):
+        # Takes a `dai.ImgFrame` of type RAW16
+        start = time.perf_counter()
+        frame = packet.getFrame()
+        got_frame = time.perf_counter()
+        payload = self.send_frame(frame, packet.getSequenceNum(), int(packet.getTimestampDevice().total_seconds() * 1e6))
+        sent = time.perf_counter()
+
+        if self.metrics is not None:
+            self.metrics.observe_frame(RAW_DEPTH_STREAM_NAME, len(payload))
+            self.metrics.observe_stage(RAW_DEPTH_STREAM_NAME, 'getData', got_frame - start)
+            self.metrics.observe_stage(RAW_DEPTH_STREAM_NAME, 'push', sent - got_frame)
+
+
+    def send_frame(self, frame: np.ndarray, sequence_num: int, timestamp_us: int) -> bytes:
+        payload = encode_depth(frame, self.codec)
+        height, width = frame.shape
+        chunk_count = max(1, -(-len(payload) // MAX_CHUNK_BYTES))
+
+        for chunk_index in range(chunk_count):
+            header = PACKET_HEADER.pack(PACKET_MAGICS[self.codec], sequence_num & 0xFFFFFFFF, timestamp_us, width, height, chunk_index, chunk_count)
+            chunk = payload[chunk_index * MAX_CHUNK_BYTES:(chunk_index + 1) * MAX_CHUNK_BYTES]
+            try:
+                self.socket.sendto(header + chunk, self.address)
+            except OSError:
+                # Nobody listening (or the socket buffer is full); consumers only ever want the latest frame
+                break
+
+        return payload
+
+
+    def close(self):
+        self.socket.close()
+
+
+
+class DepthReassembler:
+    # Receiving side of `DepthPublisher`: rebuilds frames from their datagrams, giving up on a frame once a newer
+    # one starts arriving
+    def __init__(self):
+        self.sequence_num = None
+        self.chunks = {}
+
+
+    def feed(self, datagram: bytes):
+        # Returns (sequence number, device timestamp in µs, frame) once a frame is complete, or None
+        magic, sequence_num, timestamp_us, width, height, chunk_index, chunk_count = PACKET_HEADER.unpack_from(datagram)
+        codec = CODECS_BY_MAGIC.get(magic)
+        if codec is None:
+            return None
+
+        if sequence_num != self.sequence_num:
+            self.sequence_num = sequence_num
+            self.chunks = {}
+        self.chunks[chunk_index] = datagram[PACKET_HEADER.size:]
+
+        if len(self.chunks) < chunk_count:
+            return None
+
+        payload = b''.join(self.chunks[index] for index in range(chunk_count))
+        self.chunks = {}
+        return sequence_num, timestamp_us, decode_depth(payload, width, height, codec)
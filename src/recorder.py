@@ -0,0 +1,297 @@
+import collections
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from gi.repository import Gst # type: ignore
+
+import settings
+from frame_buffers import FrameBufferPool
+from gstreamer_pipelines import RECORD_VIDEO_DATA_PIPELINE, RECORDING_MUXERS
+from h264 import is_keyframe
+from metrics import Metrics, warn_rate_limited
+
+
+# Encoded frames allowed to wait for a stream's writer, beyond which frames are dropped rather than held in memory
+MAX_PENDING_BYTES = 32 * 1024 * 1024
+
+# An open segment is finished once its stream has been idle for this long, e.g. after a device drop
+IDLE_SECONDS = 2
+
+# How long to wait for the muxer to finish writing a segment
+FINISH_TIMEOUT_SECONDS = 10
+
+# Queued in place of a frame when an event recording ends, so that the writer finishes its segment as it would
+# when the stream goes idle
+END_OF_RECORDING = None
+
+
+@dataclass
+class RecordedFrame:
+    # Host time at which the frame was received, from `time.monotonic()`
+    timestamp: float
+    keyframe: bool
+    # The encoded access unit, as received (i.e. the NumPy array from `getData()`)
+    data: object
+    size: int
+
+
+
+def is_segment_boundary(segment_start: float | None, frame: RecordedFrame, segment_seconds: float) -> bool:
+    # Segments only ever start on a keyframe, so that each file can be played on its own
+    if not frame.keyframe:
+        return False
+    return segment_start is None or frame.timestamp - segment_start >= segment_seconds
+
+
+
+class SegmentWriter:
+    # Muxes the frames of one segment into a file, through its own short-lived GStreamer pipeline
+    def __init__(self, path: str, container: str, start_timestamp: float, buffer_pool: FrameBufferPool):
+        self.path = path
+        self.start_timestamp = start_timestamp
+        self.buffer_pool = buffer_pool
+
+        self.pipeline = Gst.parse_launch(RECORD_VIDEO_DATA_PIPELINE.format(muxer=RECORDING_MUXERS[container], location=path))
+        self.appsrc = self.pipeline.get_by_name('source')
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+
+    def write(self, frame: RecordedFrame):
+        buffer = self.buffer_pool.wrap(frame.data)
+        buffer.pts = buffer.dts = int((frame.timestamp - self.start_timestamp) * Gst.SECOND)
+
+        retval = self.appsrc.emit('push-buffer', buffer)
+        if retval != Gst.FlowReturn.OK:
+            raise RuntimeError(f'Unable to write to "{self.path}" ({retval.value_nick})')
+
+
+    def finish(self):
+        # Waits for the muxer to write out the rest of the file (i.e. the MKV cues or last MP4 fragment)
+        self.appsrc.emit('end-of-stream')
+        message = self.pipeline.get_bus().timed_pop_filtered(
+            FINISH_TIMEOUT_SECONDS * Gst.SECOND,
+            Gst.MessageType.EOS | Gst.MessageType.ERROR,
+        )
+        self.pipeline.set_state(Gst.State.NULL)
+
+        if message is None:
+            raise RuntimeError(f'Timed out finishing "{self.path}"')
+        if message.type == Gst.MessageType.ERROR:
+            error, _ = message.parse_error()
+            raise RuntimeError(f'Unable to finish "{self.path}": {error.message}')
+
+
+    def abort(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+
+
+class StreamRecorder:
+    # Records one stream's encoded frames into time-segmented files, without re-encoding them.
+    #
+    # Frames are handed over from the hot path (`send_data`) and written by a background thread, through a queue
+    # bounded in bytes. If the storage cannot keep up, frames are dropped until the next keyframe, so that the
+    # live stream is never held up and the recording stays decodable. In event mode, the last few seconds are
+    # kept in memory (whole GOPs, so that they start on a keyframe) and only written once a trigger comes in.
+    def __init__(
+        self,
+        stream_id: str,
+        directory: str,
+        metrics: Metrics,
+        mode: str = settings.RECORDING_MODE,
+        container: str = settings.RECORDING_FORMAT,
+        segment_seconds: float = settings.RECORDING_SEGMENT_SECONDS,
+        pre_trigger_seconds: float = settings.RECORDING_PRE_TRIGGER_SECONDS,
+        post_trigger_seconds: float = settings.RECORDING_POST_TRIGGER_SECONDS,
+    ):
+        self.stream_id = stream_id
+        self.directory = directory
+        self.metrics = metrics
+        self.mode = mode
+        self.container = container
+        self.segment_seconds = segment_seconds
+        self.pre_trigger_seconds = pre_trigger_seconds
+        self.post_trigger_seconds = post_trigger_seconds
+        self.buffer_pool = FrameBufferPool()
+
+        self.lock = threading.Lock()
+        self.frames_pending = threading.Condition(self.lock)
+        self.pending = collections.deque()
+        self.pending_bytes = 0
+        # Set after dropping a frame, as anything up to the next keyframe would not decode
+        self.resync = False
+        self.closed = False
+
+        # Pre-trigger ring buffer of whole GOPs, used in event mode only
+        self.gops = collections.deque()
+        self.recording = mode == 'continuous'
+        self.recording_until = 0.0
+
+        self.writer_thread = threading.Thread(target=self._thread_writer, name=f'recorder-{stream_id}', daemon=True)
+        self.writer_thread.start()
+
+
+    def record(self, data):
+        now = time.monotonic()
+        frame = RecordedFrame(now, is_keyframe(data), data, memoryview(data).nbytes)
+
+        with self.lock:
+            if self.mode == 'event':
+                self._add_to_ring(frame)
+                if self.recording and now >= self.recording_until:
+                    self.recording = False
+                    self.pending.append(END_OF_RECORDING)
+                    self.frames_pending.notify()
+
+            if self.recording:
+                self._enqueue(frame)
+
+
+    def trigger(self):
+        # Starts (or extends) an event recording, beginning with the ring buffer
+        now = time.monotonic()
+        with self.lock:
+            if not self.recording:
+                for gop in self.gops:
+                    for frame in gop:
+                        self._enqueue(frame)
+                self.recording = True
+            self.recording_until = now + self.post_trigger_seconds
+
+
+    def _add_to_ring(self, frame: RecordedFrame):
+        if frame.keyframe:
+            self.gops.append([])
+        if len(self.gops) == 0:
+            return
+        self.gops[-1].append(frame)
+
+        # Keep just enough GOPs to cover the pre-trigger period
+        while len(self.gops) > 1 and self.gops[1][0].timestamp <= frame.timestamp - self.pre_trigger_seconds:
+            self.gops.popleft()
+
+
+    def _enqueue(self, frame: RecordedFrame):
+        # NOTE: Called with the lock held
+        if (self.resync and not frame.keyframe) or self.pending_bytes + frame.size > MAX_PENDING_BYTES:
+            self.resync = True
+            self.metrics.observe_recording_drop(self.stream_id)
+            warn_rate_limited(f'record-{self.stream_id}', f'Warning: Dropping frames of "{self.stream_id}" from recording, storage is too slow')
+            return
+
+        self.resync = False
+        self.pending.append(frame)
+        self.pending_bytes += frame.size
+        self.frames_pending.notify()
+
+
+    def _next_frame(self):
+        # Returns the next frame to write (or END_OF_RECORDING when idle), and whether the recorder was closed
+        with self.lock:
+            if len(self.pending) == 0 and not self.closed:
+                self.frames_pending.wait(IDLE_SECONDS)
+            if len(self.pending) == 0:
+                return END_OF_RECORDING, self.closed
+
+            frame = self.pending.popleft()
+            if frame is not END_OF_RECORDING:
+                self.pending_bytes -= frame.size
+            return frame, False
+
+
+    def _thread_writer(self):
+        segment = None
+
+        while True:
+            frame, closed = self._next_frame()
+
+            try:
+                if frame is END_OF_RECORDING:
+                    if segment is not None:
+                        self.finish_segment(segment)
+                        segment = None
+                    if closed:
+                        return
+                    continue
+
+                if is_segment_boundary(segment.start_timestamp if segment is not None else None, frame, self.segment_seconds):
+                    if segment is not None:
+                        self.finish_segment(segment)
+                    segment = self.start_segment(frame)
+
+                # Frames before the first keyframe cannot be decoded on their own
+                if segment is not None:
+                    segment.write(frame)
+            except Exception as ex:
+                print(f'Recording of "{self.stream_id}" failed: {ex}')
+                if segment is not None:
+                    segment.abort()
+                    segment = None
+
+
+    def start_segment(self, frame: RecordedFrame) -> SegmentWriter:
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Files are named after the wall clock time of their first frame
+        start_time = time.time() - (time.monotonic() - frame.timestamp)
+        file_name = time.strftime('%Y%m%d-%H%M%S', time.localtime(start_time))
+        if self.mode == 'event':
+            file_name += '-event'
+
+        path = os.path.join(self.directory, f'{file_name}.{self.container}')
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f'{file_name}-{suffix}.{self.container}')
+            suffix += 1
+
+        print(f'Recording "{self.stream_id}" to "{path}"')
+        return SegmentWriter(path, self.container, frame.timestamp, self.buffer_pool)
+
+
+    def finish_segment(self, segment: SegmentWriter):
+        segment.finish()
+        self.metrics.observe_recording_segment(self.stream_id)
+
+
+    def close(self):
+        # Writes out what is still pending and finishes the open segment
+        with self.lock:
+            self.closed = True
+            self.frames_pending.notify()
+        self.writer_thread.join()
+        self.buffer_pool.close()
+
+
+
+class Recorder:
+    # Records the streams selected in the settings (OAKD_RECORDING_STREAMS) of one device
+    def __init__(self, device_id: str, metrics: Metrics, stream_ids: list[str] = settings.RECORDING_STREAMS, mode: str = settings.RECORDING_MODE):
+        Gst.init(None)
+
+        self.mode = mode
+        self.stream_recorders = {
+            stream_id: StreamRecorder(stream_id, os.path.join(settings.RECORDING_PATH, device_id, stream_id), metrics, mode)
+            for stream_id in stream_ids
+        }
+
+
+    def record(self, stream_id: str, data):
+        stream_recorder = self.stream_recorders.get(stream_id)
+        if stream_recorder is not None:
+            stream_recorder.record(data)
+
+
+    def handle_trigger(self, path: str) -> tuple[int, str, bytes]:
+        if self.mode != 'event':
+            return 409, 'text/plain', f'Recording mode is "{self.mode}", triggers need "event"\n'.encode()
+
+        for stream_recorder in self.stream_recorders.values():
+            stream_recorder.trigger()
+        return 200, 'text/plain', f'Recording {", ".join(self.stream_recorders)} for the next {settings.RECORDING_POST_TRIGGER_SECONDS} s\n'.encode()
+
+
+    def close(self):
+        for stream_recorder in self.stream_recorders.values():
+            stream_recorder.close()
@@ -1,49 +1,137 @@
-# import pprint
-# import time
-# import requests
-
-# from src.camera_streams import CAMERA_STREAMS
-
-# mcm_endpoint = 'http://127.0.0.1:6020/streams'
-
-# def has_oak_stream(current_streams, name):
-#     for stream in current_streams:
-#         if stream['video_and_stream']['name'] == name:
-#             return True
-#     return False
-
-
-# def add_mcm_stream(endpoint):
-#     name = CAMERA_STREAMS[endpoint]['name']
-#     new_stream = {
-#         'name': name,
-#         'source': 'Redirect',
-#         'stream_information': {
-#             'endpoints': [
-#                 f'rtsp://127.0.0.1:8554/{endpoint}'
-#             ],
-#             'configuration': {
-#                 'type': 'redirect'
-#             },
-#             'extended_configuration': {
-#                 'thermal': False,
-#                 'disable_mavlink': True
-#             }
-#         }
-#     }
-
-#     print(f'Adding stream {endpoint}...')
-#     stream_add_response = requests.post(mcm_endpoint, json=new_stream)
-#     pprint.pprint(stream_add_response.text)
-
-
-# def check_streams():
-#     while True:
-#         time.sleep(4)
-#         current_streams = requests.get(mcm_endpoint).json()
-#         for endpoint, name in CAMERA_STREAMS.items():
-#             try:
-#                 if not has_oak_stream(current_streams, name):
-#                     add_mcm_stream(endpoint)
-#             except Exception as ex:
-#                 print(ex)
+import threading
+
+import requests
+
+from camera_streams import CameraStream
+
+
+MCM_URL = 'http://127.0.0.1:6020'
+
+# (connect, read) timeouts, so that a hung MCM cannot block registration forever
+REQUEST_TIMEOUT = (2, 5)
+
+# How often to check on MCM when everything is registered, mainly to notice MCM restarting
+POLL_SECONDS = 10
+
+# How soon to check that MCM took on the changes made to its stream list
+CONFIRM_SECONDS = 2
+
+# Retry delays while MCM is unreachable, doubling from the minimum up to the maximum
+MIN_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 60
+
+
+
+class StreamRegistrar:
+    # Keeps Mavlink Camera Manager's (MCM) stream list in sync with the streams served on one RTSP port.
+    #
+    # Every MCM stream pointing at our port is ours: missing streams are added, and stale ones (i.e. from a
+    # camera that disappeared, or an older version of this extension) are removed. MCM is only reconciled
+    # when our streams or MCM's stream list change, through a persistent connection.
+    def __init__(self, rtsp_port: int, mcm_url: str = MCM_URL):
+        self.rtsp_port = rtsp_port
+        self.mcm_url = mcm_url
+        self.session = requests.Session()
+
+        self.lock = threading.Lock()
+        self.streams_changed = threading.Event()
+        self.desired_streams = {}
+        self.last_reconciled = None
+
+        self.registrar_thread = threading.Thread(target=self._thread_registrar, name='mcm-registrar', daemon=True)
+        self.registrar_thread.start()
+
+
+    def rtsp_url(self, endpoint: str) -> str:
+        return f'rtsp://127.0.0.1:{self.rtsp_port}/{endpoint}'
+
+
+    def set_streams(self, streams: list[CameraStream]):
+        desired_streams = {stream.name: self.rtsp_url(stream.endpoint) for stream in streams}
+        with self.lock:
+            if desired_streams == self.desired_streams:
+                return
+            self.desired_streams = desired_streams
+        self.streams_changed.set()
+
+
+    def _thread_registrar(self):
+        backoff = MIN_BACKOFF_SECONDS
+
+        while True:
+            try:
+                changed = self.reconcile()
+                backoff = MIN_BACKOFF_SECONDS
+                wait_seconds = CONFIRM_SECONDS if changed else POLL_SECONDS
+            except (requests.RequestException, ValueError, KeyError, TypeError) as ex:
+                print(f'Unable to sync streams with MCM, retrying in {backoff} seconds: {ex}')
+                wait_seconds = backoff
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+            # Wake up early if our streams change
+            self.streams_changed.wait(wait_seconds)
+            self.streams_changed.clear()
+
+
+    def reconcile(self) -> bool:
+        # Returns whether MCM's stream list had to be changed
+        response = self.session.get(f'{self.mcm_url}/streams', timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+
+        with self.lock:
+            desired_streams = dict(self.desired_streams)
+
+        # Nothing to do if neither side changed since the last successful reconciliation
+        if (desired_streams, response.content) == self.last_reconciled:
+            return False
+
+        registered_streams = {}
+        for mcm_stream in response.json():
+            video_and_stream = mcm_stream['video_and_stream']
+            endpoints = video_and_stream.get('stream_information', {}).get('endpoints', [])
+            if any(endpoint.startswith(self.rtsp_url('')) for endpoint in endpoints):
+                registered_streams[video_and_stream['name']] = endpoints
+
+        changed = False
+        for name, endpoints in registered_streams.items():
+            if desired_streams.get(name) not in endpoints or len(endpoints) != 1:
+                self.remove_mcm_stream(name)
+                changed = True
+
+        for name, rtsp_url in desired_streams.items():
+            if registered_streams.get(name) != [rtsp_url]:
+                self.add_mcm_stream(name, rtsp_url)
+                changed = True
+
+        # MCM's stream list is only known to be in sync if it was left untouched
+        self.last_reconciled = None if changed else (desired_streams, response.content)
+        return changed
+
+
+    def add_mcm_stream(self, name: str, rtsp_url: str):
+        new_stream = {
+            'name': name,
+            'source': 'Redirect',
+            'stream_information': {
+                'endpoints': [
+                    rtsp_url
+                ],
+                'configuration': {
+                    'type': 'redirect'
+                },
+                'extended_configuration': {
+                    'thermal': False,
+                    'disable_mavlink': True
+                }
+            }
+        }
+
+        print(f'Adding stream "{name}" as "{rtsp_url}"...')
+        response = self.session.post(f'{self.mcm_url}/streams', json=new_stream, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+
+
+    def remove_mcm_stream(self, name: str):
+        print(f'Removing stale stream "{name}"...')
+        response = self.session.delete(f'{self.mcm_url}/delete_stream', params={'name': name}, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
@@ -0,0 +1,152 @@
+"""
+Settings that are configured through environment variables, e.g. through the extension's settings in BlueOS.
+Stream profiles have their own settings, see `stream_profiles.py`.
+"""
+
+import ipaddress
+import os
+
+
+def env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f'Invalid value "{value}" for {name}, expected a boolean (e.g. "true" or "false")')
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Invalid value "{value}" for {name}, expected a whole number') from None
+
+
+def env_choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    value = os.environ.get(name) or default
+    if value not in choices:
+        raise ValueError(f'Invalid value "{value}" for {name}, expected one of: {", ".join(choices)}')
+    return value
+
+
+def env_list(name: str, default: list[str], choices: tuple[str, ...]) -> list[str]:
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    for item in items:
+        if item not in choices:
+            raise ValueError(f'Invalid value "{item}" in {name}, expected a comma-separated list of: {", ".join(choices)}')
+    return items
+
+
+# Lower a stream's frame rate (and bitrate) when its viewers or the host cannot keep up
+ADAPTIVE_BITRATE = env_flag('OAKD_ADAPTIVE_BITRATE', True)
+
+# How frames reach the RTSP server: "shm" goes through shared memory, while "direct" feeds the RTSP media
+# in-process, skipping a Unix socket hop and an RTP depacketize/repacketize round trip
+MEDIA_PATHS = ('shm', 'direct')
+MEDIA_PATH = env_choice('OAKD_MEDIA_PATH', 'shm', MEDIA_PATHS)
+
+# Serve every device's streams under its MX ID (e.g. "<mxid>/rgb", named "Oak-D RGB (<mxid>)"), rather than only those of
+# the devices after the first one, so that they stay the same whichever order the devices are detected in
+DEVICE_NAMESPACE = env_flag('OAKD_DEVICE_NAMESPACE', False)
+
+# HTTP port of the first device's API (metrics, etc.), with every further device using the next port up
+HTTP_BASE_PORT = env_int('OAKD_HTTP_PORT', 9110)
+
+# Let RTSP clients receive the streams over multicast (e.g. `rtspsrc protocols=udp-mcast`), so that every packet is sent
+# once however many of them watch. Group addresses come from the "<first>-<last>" range, and ports from the given base
+# port for the first device, with every further device using the next 100 ports up.
+MULTICAST = env_flag('OAKD_MULTICAST', False)
+MULTICAST_ADDRESSES = os.environ.get('OAKD_MULTICAST_ADDRESSES') or '239.255.42.1-239.255.42.254'
+try:
+    MULTICAST_FIRST_ADDRESS, MULTICAST_LAST_ADDRESS = (ipaddress.IPv4Address(address.strip()) for address in MULTICAST_ADDRESSES.split('-'))
+except ValueError:
+    raise ValueError(f'Invalid value "{MULTICAST_ADDRESSES}" for OAKD_MULTICAST_ADDRESSES, expected "<first>-<last>" IPv4 addresses') from None
+if not MULTICAST_FIRST_ADDRESS.is_multicast or not MULTICAST_LAST_ADDRESS.is_multicast or MULTICAST_FIRST_ADDRESS > MULTICAST_LAST_ADDRESS:
+    raise ValueError(f'Invalid value "{MULTICAST_ADDRESSES}" for OAKD_MULTICAST_ADDRESSES, expected an ascending range of multicast addresses')
+MULTICAST_BASE_PORT = env_int('OAKD_MULTICAST_PORT', 5000)
+MULTICAST_TTL = env_int('OAKD_MULTICAST_TTL', 1)
+if not 1 <= MULTICAST_TTL <= 255:
+    raise ValueError(f'Invalid value "{MULTICAST_TTL}" for OAKD_MULTICAST_TTL, expected a value in [1, 255]')
+
+# On-vehicle recording of the encoded streams: "continuous" records all the time, while "event" keeps the last
+# few seconds in memory and only records around triggers (POST /recording/trigger on the HTTP API)
+RECORDING_MODES = ('off', 'continuous', 'event')
+RECORDING_MODE = env_choice('OAKD_RECORDING', 'off', RECORDING_MODES)
+RECORDING_STREAMS = env_list('OAKD_RECORDING_STREAMS', ['rgb'], ('rgb', 'mono_left', 'mono_right', 'depth', 'composite'))
+RECORDING_PATH = os.environ.get('OAKD_RECORDING_PATH') or '/recordings'
+RECORDING_FORMATS = ('mkv', 'mp4')
+RECORDING_FORMAT = env_choice('OAKD_RECORDING_FORMAT', 'mkv', RECORDING_FORMATS)
+RECORDING_SEGMENT_SECONDS = env_int('OAKD_RECORDING_SEGMENT_SECONDS', 60)
+RECORDING_PRE_TRIGGER_SECONDS = env_int('OAKD_RECORDING_PRE_TRIGGER_SECONDS', 10)
+RECORDING_POST_TRIGGER_SECONDS = env_int('OAKD_RECORDING_POST_TRIGGER_SECONDS', 30)
+
+# Raw 16-bit depth frames, losslessly compressed and sent over UDP to local consumers (see `raw_depth.py`), on the
+# given port for the first device, with every further device using the next port up
+RAW_DEPTH = env_flag('OAKD_RAW_DEPTH', False)
+RAW_DEPTH_BASE_PORT = env_int('OAKD_RAW_DEPTH_PORT', 9120)
+
+# Batched IMU samples (accelerometer, gyroscope and, where the IMU has one, rotation vector) at the given rate, sent over
+# UDP to local consumers (see `imu.py`), on the given port for the first device, with every further device using the
+# next port up. The device reports once it has collected a batch of samples.
+IMU = env_flag('OAKD_IMU', False)
+IMU_RATE_HZ = env_int('OAKD_IMU_RATE_HZ', 400)
+if IMU_RATE_HZ < 1:
+    raise ValueError(f'Invalid value "{IMU_RATE_HZ}" for OAKD_IMU_RATE_HZ, expected 1 or more')
+IMU_BATCH_SIZE = env_int('OAKD_IMU_BATCH_SIZE', 20)
+if not 1 <= IMU_BATCH_SIZE <= 1000:
+    raise ValueError(f'Invalid value "{IMU_BATCH_SIZE}" for OAKD_IMU_BATCH_SIZE, expected a value in [1, 1000]')
+IMU_BASE_PORT = env_int('OAKD_IMU_PORT', 9130)
+
+# Nearest obstacle distance per sector of the raw depth frames (see `obstacle_ranges.py`), over a grid of
+# "<rows>x<columns>" sectors, sent as MAVLink DISTANCE_SENSOR messages to the given UDP address
+OBSTACLE_RANGES = env_flag('OAKD_OBSTACLE_RANGES', False)
+OBSTACLE_GRID = os.environ.get('OAKD_OBSTACLE_GRID') or '1x8'
+try:
+    OBSTACLE_GRID_ROWS, OBSTACLE_GRID_COLS = (int(size) for size in OBSTACLE_GRID.lower().split('x'))
+except ValueError:
+    raise ValueError(f'Invalid value "{OBSTACLE_GRID}" for OAKD_OBSTACLE_GRID, expected "<rows>x<columns>" (e.g. "1x8")') from None
+if OBSTACLE_GRID_ROWS < 1 or OBSTACLE_GRID_COLS < 1:
+    raise ValueError(f'Invalid value "{OBSTACLE_GRID}" for OAKD_OBSTACLE_GRID, expected at least 1 row and column')
+# Each sector's index is its MAVLink sensor ID, which is a single byte
+if OBSTACLE_GRID_ROWS * OBSTACLE_GRID_COLS > 256:
+    raise ValueError(f'Invalid value "{OBSTACLE_GRID}" for OAKD_OBSTACLE_GRID, expected at most 256 sectors')
+OBSTACLE_PERCENTILE = env_int('OAKD_OBSTACLE_PERCENTILE', 5)
+if not 0 <= OBSTACLE_PERCENTILE <= 100:
+    raise ValueError(f'Invalid value "{OBSTACLE_PERCENTILE}" for OAKD_OBSTACLE_PERCENTILE, expected a value in [0, 100]')
+MAVLINK_ADDRESS = os.environ.get('OAKD_MAVLINK_ADDRESS') or '127.0.0.1:14550'
+MAVLINK_HOST, _, MAVLINK_PORT = MAVLINK_ADDRESS.rpartition(':')
+if not MAVLINK_HOST or not MAVLINK_PORT.isdigit():
+    raise ValueError(f'Invalid value "{MAVLINK_ADDRESS}" for OAKD_MAVLINK_ADDRESS, expected "<host>:<port>"')
+MAVLINK_PORT = int(MAVLINK_PORT)
+
+# Start viewers of a stream from its current GOP, instead of having them wait for the next keyframe. In direct mode,
+# every (unicast) viewer gets a media of its own for it, and otherwise only a media's first viewer is covered
+KEYFRAME_CACHE = env_flag('OAKD_KEYFRAME_CACHE', True)
+
+# Rate of the JPEG snapshots encoded on the device for the HTTP API (/snapshot/<stream>.jpg), where 0 turns them off
+SNAPSHOT_FPS = env_int('OAKD_SNAPSHOT_FPS', 0)
+
+# Streams to tile (top to bottom, in the given order) into a single composite stream, encoded once on the device,
+# where an empty list turns it off
+COMPOSITE_STREAMS = env_list('OAKD_COMPOSITE', [], ('rgb', 'mono_left', 'mono_right', 'depth'))
+if len(COMPOSITE_STREAMS) == 1 or len(set(COMPOSITE_STREAMS)) != len(COMPOSITE_STREAMS):
+    raise ValueError(f'Invalid value "{",".join(COMPOSITE_STREAMS)}" for OAKD_COMPOSITE, expected at least 2 different streams')
+
+# Streams that also get a low rendition, a downscaled and low-bitrate copy served at "<stream>/low" (e.g. rgb/low), which
+# only runs on the device while someone watches it
+LOW_STREAMS = env_list('OAKD_LOW_STREAMS', [], ('rgb', 'mono_left', 'mono_right', 'depth'))
+
+# Pause streams on the device while nobody is watching them (recorded streams are never paused)
+ON_DEMAND = env_flag('OAKD_ON_DEMAND', False)
@@ -0,0 +1,239 @@
+import datetime
+import queue
+import threading
+import time
+
+import numpy as np
+
+from frame_gates import CONTROL_QUEUE_SIZE, CONTROL_STREAM_NAME
+from h264 import split_access_units
+
+
+class SimulatedPacket:
+    # Mimics the encoded `dai.ImgFrame` packets read from a device output queue
+    def __init__(self, data: np.ndarray, timestamp: datetime.timedelta, sequence_num: int):
+        self.data = data
+        self.timestamp = timestamp
+        self.sequence_num = sequence_num
+
+
+    def getData(self) -> np.ndarray:
+        return self.data
+
+
+    def getFrame(self) -> np.ndarray:
+        # Raw (i.e. depth) frames are replayed as (height, width) arrays
+        return self.data
+
+
+    @property
+    def packets(self) -> list:
+        # IMU batches are replayed as lists of samples, as in `dai.IMUData.packets`
+        return self.data
+
+
+    def getTimestamp(self) -> datetime.timedelta:
+        return self.timestamp
+
+
+    def getTimestampDevice(self) -> datetime.timedelta:
+        return self.timestamp
+
+
+    def getSequenceNum(self) -> int:
+        return self.sequence_num
+
+
+
+class SimulatedOutputQueue:
+    # Mimics `dai.DataOutputQueue`, with a producer thread standing in for the device encoder. As on the device,
+    # a full blocking queue stalls the producer, while a non-blocking queue discards its oldest packet instead.
+    CLOSED = object()
+
+
+    def __init__(self, name: str, access_units: list[np.ndarray], fps: float, maxSize: int = 30, blocking: bool = True):
+        self.name = name
+        self.access_units = access_units
+        self.fps = fps
+        self.blocking = blocking
+        # Frame gate divisor, see `frame_gates.py`
+        self.divisor = 1
+        self.packets = queue.Queue(maxsize=maxSize)
+        self.closed = threading.Event()
+
+        self.producer_thread = threading.Thread(target=self._thread_producer, name=f'simulated-{name}', daemon=True)
+        self.producer_thread.start()
+
+
+    def _thread_producer(self):
+        frame_interval = 1.0 / self.fps
+        next_frame_time = time.monotonic()
+        captured_count = 0
+        sequence_num = 0
+
+        while not self.closed.is_set():
+            # Frames are captured on a fixed schedule, regardless of how long the previous one took
+            next_frame_time += frame_interval
+            time.sleep(max(0.0, next_frame_time - time.monotonic()))
+
+            # Gated frames never reach the encoder, so they do not use up a recorded frame either
+            captured_count += 1
+            divisor = self.divisor
+            if divisor == 0 or captured_count % divisor != 0:
+                continue
+
+            # NOTE: Timestamps use the same monotonic clock as `dai.Clock.now()` on the host
+            packet = SimulatedPacket(
+                self.access_units[sequence_num % len(self.access_units)],
+                datetime.timedelta(seconds=time.monotonic()),
+                sequence_num,
+            )
+            sequence_num += 1
+
+            if self.blocking:
+                while not self.closed.is_set():
+                    try:
+                        self.packets.put(packet, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+            else:
+                while not self.closed.is_set():
+                    try:
+                        self.packets.put_nowait(packet)
+                        break
+                    except queue.Full:
+                        self._discard_oldest()
+
+
+    def _discard_oldest(self):
+        try:
+            self.packets.get_nowait()
+        except queue.Empty:
+            pass
+
+
+    def getName(self) -> str:
+        return self.name
+
+
+    def has(self) -> bool:
+        return not self.packets.empty()
+
+
+    def tryGet(self):
+        try:
+            packet = self.packets.get_nowait()
+        except queue.Empty:
+            return None
+        return self._check_packet(packet)
+
+
+    def get(self):
+        return self._check_packet(self.packets.get())
+
+
+    def _check_packet(self, packet):
+        if packet is self.CLOSED:
+            # Let any other waiting readers see the closure too
+            self.packets.put(self.CLOSED)
+            raise RuntimeError(f'Communication exception - simulated queue "{self.name}" was closed')
+        return packet
+
+
+    def close(self):
+        self.closed.set()
+        while True:
+            try:
+                self.packets.put_nowait(self.CLOSED)
+                break
+            except queue.Full:
+                self._discard_oldest()
+
+
+
+class SimulatedInputQueue:
+    # Mimics the `dai.DataInputQueue` of the frame gates' control stream, by gating the simulated output queues
+    def __init__(self, device: 'SimulatedDevice'):
+        self.device = device
+
+
+    def send(self, control):
+        stream_id, _, value = bytes(control.getData()).decode().partition(':')
+        if stream_id in self.device.stream_ids:
+            self.device.getOutputQueue(stream_id).divisor = int(value)
+
+
+
+class SimulatedDevice:
+    # Stand-in for `dai.Device` that replays a recorded H.264 byte stream (such as one dumped from a real Oak-D,
+    # or `ffmpeg -i video.mp4 -c:v copy -bsf:v h264_mp4toannexb recording.h264`) on every output queue.
+    def __init__(
+        self,
+        recording_path: str,
+        stream_ids: list[str],
+        fps: float = 15,
+        connected_cameras: list | None = None,
+        boot_seconds: float = 0.0,
+    ):
+        with open(recording_path, 'rb') as recording_file:
+            self.access_units = [
+                np.frombuffer(access_unit, dtype=np.uint8)
+                for access_unit in split_access_units(recording_file.read())
+            ]
+
+        if len(self.access_units) == 0:
+            raise ValueError(f'No H.264 access units found in "{recording_path}"')
+
+        self.stream_ids = list(stream_ids)
+        self.fps = fps
+        self.connected_cameras = connected_cameras or []
+        self.output_queues = {}
+        self.pipeline = None
+
+        # Stands in for uploading the firmware to the device and booting it, which `dai.Device()` blocks on
+        time.sleep(boot_seconds)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def getConnectedCameras(self) -> list:
+        return self.connected_cameras
+
+
+    def startPipeline(self, pipeline):
+        self.pipeline = pipeline
+
+
+    def getConnectedIMU(self) -> str:
+        return 'NONE'
+
+
+    def getOutputQueueNames(self) -> list[str]:
+        return self.stream_ids
+
+
+    def getOutputQueue(self, name: str, maxSize: int = 30, blocking: bool = True) -> SimulatedOutputQueue:
+        if name not in self.stream_ids:
+            raise RuntimeError(f'Queue for stream name "{name}" doesn\'t exist')
+
+        if name not in self.output_queues:
+            self.output_queues[name] = SimulatedOutputQueue(name, self.access_units, self.fps, maxSize, blocking)
+        return self.output_queues[name]
+
+
+    def getInputQueue(self, name: str, maxSize: int = CONTROL_QUEUE_SIZE, blocking: bool = False) -> SimulatedInputQueue:
+        if name != CONTROL_STREAM_NAME:
+            raise RuntimeError(f'Queue for stream name "{name}" doesn\'t exist')
+        return SimulatedInputQueue(self)
+
+
+    def close(self):
+        for output_queue in self.output_queues.values():
+            output_queue.close()
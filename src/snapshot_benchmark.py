@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Load test of the snapshot endpoint (see `snapshots.py`), without a physical Oak-D.
+
+Snapshots are fed into the real HTTP API at the device's snapshot rate, while separate client processes request
+`/snapshot/<stream>.jpg` back to back over keep-alive connections, which gives the requests per second the
+endpoint sustains, its response times and the server process' CPU usage.
+
+Example:
+    python snapshot_benchmark.py --image snapshot.jpg --clients 8 --duration 10
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import resource
+import threading
+import time
+
+from http_api import HttpApi
+from snapshots import Snapshots
+
+
+def run_client(port: int, path: str, duration: float, results):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    response_times = []
+    received_bytes = 0
+    errors = 0
+
+    end_time = time.monotonic() + duration
+    while time.monotonic() < end_time:
+        start = time.perf_counter()
+        connection.request('GET', path)
+        response = connection.getresponse()
+        body = response.read()
+        response_times.append(time.perf_counter() - start)
+
+        if response.status == 200:
+            received_bytes += len(body)
+        else:
+            errors += 1
+
+    connection.close()
+    results.put((response_times, received_bytes, errors))
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the snapshot endpoint')
+    parser.add_argument('--image', help='JPEG to serve (default: random bytes of --size)')
+    parser.add_argument('--size', type=int, default=150 * 1024, help='Snapshot size in bytes without --image (default: 150 KiB)')
+    parser.add_argument('--snapshot-fps', type=float, default=1, help='Rate of new snapshots (default: 1)')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent client processes (default: 4)')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement duration in seconds (default: 10)')
+    parser.add_argument('--port', type=int, default=9110, help='HTTP port (default: 9110)')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as image_file:
+            jpeg = image_file.read()
+    else:
+        jpeg = os.urandom(args.size)
+
+    snapshots = Snapshots()
+    http_api = HttpApi(args.port, host='127.0.0.1')
+    http_api.add_route('GET', '/snapshot/', snapshots.handle_request)
+
+    # Stands in for the device's snapshot encoder, each new snapshot being a fresh copy as when read off a packet
+    stopped = threading.Event()
+    def run_feeder():
+        while not stopped.is_set():
+            snapshots.update('rgb', bytes(bytearray(jpeg)))
+            stopped.wait(1 / args.snapshot_fps)
+
+    feeder_thread = threading.Thread(target=run_feeder, daemon=True)
+    feeder_thread.start()
+
+    mp_context = multiprocessing.get_context('spawn')
+    results = mp_context.Queue()
+    clients = [
+        mp_context.Process(target=run_client, args=(args.port, '/snapshot/rgb.jpg', args.duration, results))
+        for _ in range(args.clients)
+    ]
+
+    cpu_start, wall_start = cpu_seconds(), time.monotonic()
+    for client in clients:
+        client.start()
+    client_results = [results.get() for _ in clients]
+    for client in clients:
+        client.join()
+    cpu_used, wall_time = cpu_seconds() - cpu_start, time.monotonic() - wall_start
+
+    stopped.set()
+    http_api.close()
+
+    response_times = sorted(seconds for times, _, _ in client_results for seconds in times)
+    received_bytes = sum(size for _, size, _ in client_results)
+    errors = sum(count for _, _, count in client_results)
+    requests = len(response_times)
+
+    print('\n=== Snapshot load test results ===')
+    print(f'Snapshot: {len(jpeg) / 1024:.0f} KiB, renewed at {args.snapshot_fps:g} FPS, {args.clients} client(s), {args.duration:g} s')
+    print(f'Throughput: {requests / args.duration:.0f} requests/s, {received_bytes * 8 / args.duration / 1e6:.0f} Mbit/s ({errors} errors)')
+    if requests > 0:
+        picks = {'p50': 0.50, 'p90': 0.90, 'p99': 0.99}
+        print('Response time: ' + ', '.join(f'{label} {response_times[int(fraction * (requests - 1))] * 1000:.2f} ms' for label, fraction in picks.items()))
+    print(f'Server CPU: {100 * cpu_used / wall_time:.1f}% of a core, {1e6 * cpu_used / max(requests, 1):.0f} us per request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import threading
+
+from camera_streams import AllCameraStreams
+
+
+# JPEG quality of the device's snapshot encoders
+SNAPSHOT_QUALITY = 90
+
+
+def snapshot_stream_name(stream_id: str) -> str:
+    # Name of the XLinkOut stream (and frame gate) carrying a camera stream's snapshots
+    return f'{stream_id}_snapshot'
+
+
+
+class Snapshots:
+    # Latest JPEG snapshot of each stream, as encoded on the device by an MJPEG encoder running at a low frame rate
+    # (see `build_processing_pipeline`). Each snapshot is copied off its packet once, and the same bytes are then
+    # served to every request until the next one arrives.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest = {}
+
+
+    def observe(self, stream_id: str, packet):
+        self.update(stream_id, bytes(memoryview(packet.getData()).cast('B')))
+
+
+    def update(self, stream_id: str, jpeg: bytes):
+        with self.lock:
+            self.latest[stream_id] = jpeg
+
+
+    def handle_request(self, path: str) -> tuple[int, str, bytes]:
+        # Serves "/snapshot/<stream id>.jpg", with "/snapshot/" listing the available snapshots
+        name = path.rsplit('/', 1)[-1]
+        with self.lock:
+            latest = dict(self.latest)
+
+        if name == '':
+            lines = [f'/snapshot/{stream.id}.jpg' for stream in AllCameraStreams.all_streams() if stream.id in latest]
+            return 200, 'text/plain', ''.join(f'{line}\n' for line in lines).encode()
+
+        stream_id = name.removesuffix('.jpg')
+        if not name.endswith('.jpg') or not AllCameraStreams.is_supported(stream_id):
+            return 404, 'text/plain', b'Not found\n'
+        if stream_id not in latest:
+            return 503, 'text/plain', f'No snapshot of "{stream_id}" received yet\n'.encode()
+
+        return 200, 'image/jpeg', latest[stream_id]
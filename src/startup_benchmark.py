@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Startup timeline of a device worker (see `run_device_session()`), without a physical Oak-D.
+
+A `SimulatedDevice` that takes `--boot-seconds` to boot stands in for the Oak-D, while the real RTSP server is
+started alongside it, and the real pipeline is built for its cameras. Every stage is timed from the moment the device
+was found, up to the first frame of each stream. With `--sequential`, the device is booted twice (once to recognize
+its cameras, once more to run the pipeline) with the RTSP server started in between, as the worker used to do.
+
+Example:
+    python startup_benchmark.py --recording recording.h264 --streams rgb,mono_left,mono_right,depth --boot-seconds 2
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import depthai as dai
+
+from camera_streams import SupportedConfig, AllCameraStreams
+from metrics import Metrics
+from simulated_device import SimulatedDevice
+from stream import RTSPServer, detect_cameras, remove_existing_sockets, run_device_session
+from stream_profiles import load_profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup timeline of a device worker with a simulated Oak-D')
+    parser.add_argument('--recording', required=True, help='Annex-B H.264 recording to replay on every stream')
+    parser.add_argument('--streams', default='rgb,mono_left,mono_right,depth', help='Comma-separated stream IDs to serve (default: all four)')
+    parser.add_argument('--fps', type=float, default=15, help='Replay frame rate (default: 15)')
+    parser.add_argument('--boot-seconds', type=float, default=2, help='Time the simulated device takes to boot (default: 2)')
+    parser.add_argument('--sequential', action='store_true', help='Boot the device twice, and start the RTSP server in between')
+    parser.add_argument('--timeout', type=float, default=20, help='Seconds to wait for the first frame of every stream (default: 20)')
+    parser.add_argument('--port', type=int, default=8554, help='RTSP server port (default: 8554)')
+    args = parser.parse_args()
+
+    stream_ids = args.streams.split(',')
+    for stream_id in stream_ids:
+        if not AllCameraStreams.is_supported(stream_id):
+            parser.error(f'Unknown stream "{stream_id}"')
+
+    connected_cameras = []
+    if 'rgb' in stream_ids:
+        connected_cameras.append(dai.CameraBoardSocket.CAM_A)
+    if 'mono_left' in stream_ids or 'depth' in stream_ids:
+        connected_cameras.append(dai.CameraBoardSocket.CAM_B)
+    if 'mono_right' in stream_ids or 'depth' in stream_ids:
+        connected_cameras.append(dai.CameraBoardSocket.CAM_C)
+
+    remove_existing_sockets()
+    metrics = Metrics()
+    timeline = metrics.startup
+    profiles = load_profiles()
+
+    def start_rtsp_server() -> RTSPServer:
+        rtsp_server = RTSPServer(
+            SupportedConfig(rgb=False, mono_left=False, mono_right=False),
+            metrics=metrics,
+            mcm_registration=False,
+            service=str(args.port),
+        )
+        timeline.mark('RTSP server started')
+        return rtsp_server
+
+    def open_device() -> SimulatedDevice:
+        return SimulatedDevice(args.recording, stream_ids, fps=args.fps, connected_cameras=connected_cameras, boot_seconds=args.boot_seconds)
+
+    devices = []
+    def run_worker():
+        timeline.mark('device found')
+        if args.sequential:
+            with open_device() as device:
+                detect_cameras(device)
+            timeline.mark('cameras recognized (first boot)')
+            rtsp_server_future = Future()
+            rtsp_server_future.set_result(start_rtsp_server())
+        else:
+            rtsp_server_executor = ThreadPoolExecutor(max_workers=1)
+            rtsp_server_future = rtsp_server_executor.submit(start_rtsp_server)
+            rtsp_server_executor.shutdown(wait=False)
+
+        devices.append(open_device())
+        timeline.mark('device booted')
+        run_device_session(devices[0], rtsp_server_future, profiles, timeline)
+
+    # The session streams until its device is closed
+    worker_thread = threading.Thread(target=run_worker, daemon=True)
+    worker_thread.start()
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and not all(stream_id in timeline.first_frames for stream_id in stream_ids):
+        time.sleep(0.01)
+    for device in devices:
+        device.close()
+
+    print('\n=== Startup timeline ===')
+    print(f'Streams: {", ".join(stream_ids)}, {args.boot_seconds:g} s device boot, {"sequential" if args.sequential else "overlapped"} startup')
+    previous_seconds = 0.0
+    for stage, seconds in sorted(timeline.stages.items(), key=lambda item: item[1]):
+        print(f'{stage:<32} {seconds * 1000:8.0f} ms  (+{(seconds - previous_seconds) * 1000:.0f} ms)')
+        previous_seconds = seconds
+
+    missing = [stream_id for stream_id in stream_ids if stream_id not in timeline.first_frames]
+    if missing:
+        print(f'No first frame within {args.timeout:g} s: {", ".join(missing)}')
+
+
+if __name__ == '__main__':
+    main()
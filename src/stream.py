@@ -1,154 +1,403 @@
 #!/usr/bin/env python3
 
+import multiprocessing
 import os
-import pprint
+import signal
+from concurrent.futures import Future, ThreadPoolExecutor
 import time
 import threading
 import traceback
+from dataclasses import dataclass
 
 import depthai as dai
-import requests
 
 import gi
 gi.require_version('Gst', '1.0')
 gi.require_version('GstRtspServer', '1.0')
 from gi.repository import Gst, GstRtspServer, GLib, GstRtsp # type: ignore
 
+import settings
+from bitrate_controller import AdaptiveBitrateController
+from frame_buffers import FrameBufferPool
+from frame_gates import FrameGateControl
+from frame_pump import FramePump
+from gop_cache import GopCache
+from http_api import HttpApi
+from imu import IMU_STREAM_NAME, ImuPublisher
+from latency_policy import LatencyPolicy
+from metrics import Metrics, StartupTimeline, SYSTEM_INFO_STREAM_NAME, warn_rate_limited
 from oakd_pipeline import build_processing_pipeline
-from camera_streams import SupportedConfig, CameraStream, AllCameraStreams
-from gstreamer_pipelines import RECEIVE_VIDEO_DATA_PIPELINE, UPLOAD_VIDEO_DATA_PIPELINE
+from obstacle_ranges import ObstacleRanges
+from raw_depth import RAW_DEPTH_STREAM_NAME, DepthPublisher
+from recorder import Recorder
+from register_stream import StreamRegistrar
+from snapshots import Snapshots, snapshot_stream_name
+from stream_profiles import StreamProfile, load_profiles
+from camera_streams import SupportedConfig, CameraStream, AllCameraStreams, is_low_rendition
+from gstreamer_pipelines import RECEIVE_VIDEO_DATA_PIPELINE, UPLOAD_VIDEO_DATA_PIPELINE, DIRECT_VIDEO_DATA_PIPELINE
 
 
-class RtspSystem(GstRtspServer.RTSPMediaFactory):
-    def __init__(self, **properties):
-        super(RtspSystem, self).__init__(**properties)
+# RTSP port of the first device, with every further device using the next port up
+RTSP_BASE_PORT = 8554
 
+# Multicast ports of each device (see `OAKD_MULTICAST_PORT`), of which every stream takes a pair (RTP and RTCP)
+MULTICAST_PORTS_PER_DEVICE = 100
 
-    def start(self):
-        self.system_thread = threading.Thread(target=self._thread_rtsp)
-        self.system_thread.start()
+# How often to look for a device that has dropped off, which bounds the time to recover from a drop
+DEVICE_RETRY_SECONDS = 0.2
 
+# How long an on-demand stream keeps running after its last viewer left, so that a viewer reconnecting straight
+# away (e.g. after a page reload) does not have to wait for it to resume
+IDLE_GRACE_SECONDS = 5
 
-    def _thread_rtsp(self):
-        loop = GLib.MainLoop()
-        loop.run()
 
+@dataclass
+class MediaSource:
+    # A source that a stream's frames are pushed into, i.e. a direct-mode media's or the shared memory upload pipeline's
+    appsrc: Gst.Element
+    upload_queue: Gst.Element
+    # Whether it has taken its first frames, which with the keyframe cache are the cached GOP (see `start_media_source`)
+    started: bool = False
 
-    def do_create_element(self, url):
-        stream_id = url.abspath.split('/')[-1]
 
-        if stream_id in AllCameraStreams:
-            socket_path = AllCameraStreams.get(stream_id).socket_path
-            return Gst.parse_launch(RECEIVE_VIDEO_DATA_PIPELINE.format(socket_path))
+class RtspSystem(GstRtspServer.RTSPMediaFactory):
+    def __init__(self, stream_info: CameraStream, rtsp_server: 'RTSPServer', **properties):
+        super(RtspSystem, self).__init__(**properties)
+        self.stream_info = stream_info
+        self.rtsp_server = rtsp_server
+
+
+    def do_create_element(self, url):
+        if self.rtsp_server.media_path == 'direct':
+            return Gst.parse_launch(DIRECT_VIDEO_DATA_PIPELINE)
+        return Gst.parse_launch(RECEIVE_VIDEO_DATA_PIPELINE.format(self.stream_info.socket_path))
 
 
     def do_configure(self, rtsp_media):
-        self.appsrc = rtsp_media.get_element().get_child_by_name('source')
         # Docs: https://lazka.github.io/pgi-docs/GstRtsp-1.0/flags.html#GstRtsp.RTSPProfile
         self.set_profiles(GstRtsp.RTSPProfile.AVPF)
 
+        # A paused on-demand stream resumes as soon as its media exists, as preparing the media (i.e. answering
+        # DESCRIBE) waits for the stream's first frame, to learn its caps
+        self.rtsp_server.media_configured(self.stream_info.id)
+        rtsp_media.connect('prepared', self.on_media_prepared)
+        rtsp_media.connect('unprepared', lambda _: self.rtsp_server.media_unprepared(self.stream_info.id))
 
-class CameraStreamChecker:
-    MCM_ENDPOINT = 'http://127.0.0.1:6020/streams'
+        # In direct mode, frames are pushed straight into the media's source for as long as it exists, starting
+        # before it is prepared, which needs the stream's first frame
+        if self.rtsp_server.media_path == 'direct':
+            element = rtsp_media.get_element()
+            self.rtsp_server.attach_media_element(self.stream_info.id, element)
+            rtsp_media.connect('unprepared', lambda _: self.rtsp_server.detach_media_element(self.stream_info.id, element))
 
+        if self.rtsp_server.keyframe_cache and self.rtsp_server.media_path == 'shm':
+            # The first viewer of a media starts from the cached GOP once it plays, rather than waiting for the next
+            # keyframe. The GOP goes through the shared memory upload pipeline, which every media of the stream reads,
+            # so viewers joining a playing (shared) media pick up from the next keyframe instead. Direct-mode media
+            # start from the cached GOP on their own (see `RTSPServer.start_media_source`).
+            primed = False
 
-    def __init__(self, supported_config: SupportedConfig):
-        self.supported_config = supported_config
+            def on_new_state(rtsp_media, state):
+                nonlocal primed
+                if state != Gst.State.PLAYING or primed:
+                    return
+                primed = True
+                self.rtsp_server.prime_stream(self.stream_info.id)
 
+            rtsp_media.connect('new-state', on_new_state)
 
-    def has_oak_stream(self, current_streams, name):
-        for stream in current_streams:
-            if stream['video_and_stream']['name'] == name:
-                return True
-        return False
 
+    def on_media_prepared(self, rtsp_media):
+        # RTP sessions only exist once the media is prepared
+        for stream_index in range(rtsp_media.n_streams()):
+            rtp_session = rtsp_media.get_stream(stream_index).get_rtpsession()
+            if rtp_session is not None:
+                rtp_session.connect('on-ssrc-active', self.on_ssrc_active)
 
-    def add_mcm_stream(self, name, endpoint):
-        new_stream = {
-            'name': name,
-            'source': 'Redirect',
-            'stream_information': {
-                'endpoints': [
-                    f'rtsp://127.0.0.1:8554/{endpoint}'
-                ],
-                'configuration': {
-                    'type': 'redirect'
-                },
-                'extended_configuration': {
-                    'thermal': False,
-                    'disable_mavlink': True
-                }
-            }
-        }
-
-        print(f'Adding stream "{name}" as "{endpoint}"...')
-        stream_add_response = requests.post(self.MCM_ENDPOINT, json=new_stream)
-        pprint.pprint(stream_add_response.text)
-
-
-    def check_streams(self):
-        while True:
-            current_streams = requests.get(self.MCM_ENDPOINT).json()
-            for cam_stream in AllCameraStreams.all_streams():
-                try:
-                    stream_is_supported = self.supported_config.check(cam_stream.id)
-                    stream_is_ready = self.has_oak_stream(current_streams, cam_stream.name)
-
-                    if stream_is_supported and not stream_is_ready:
-                        self.add_mcm_stream(cam_stream.name, cam_stream.endpoint)
-                except Exception as ex:
-                    print(ex)
 
-            # Wait 3 seconds before checking again
-            time.sleep(3)
+    def on_ssrc_active(self, rtp_session, rtp_source):
+        # Receiver reports from clients tell how much of this stream they lost since their previous report
+        stats = rtp_source.get_property('stats')
+        if stats.get_value('is-sender') or not stats.get_value('have-rb'):
+            return
+        self.rtsp_server.bitrate_controller.report_fraction_lost(self.stream_info.id, stats.get_value('rb-fractionlost') / 256)
 
 
 class RTSPServer(GstRtspServer.RTSPServer):
-    def __init__(self, supported_config: SupportedConfig, **properties):
+    def __init__(
+        self,
+        supported_config: SupportedConfig,
+        device_id: str | None = None,
+        namespace_streams: bool = settings.DEVICE_NAMESPACE,
+        mcm_registration: bool = True,
+        media_path: str = settings.MEDIA_PATH,
+        metrics: Metrics | None = None,
+        recorder: Recorder | None = None,
+        keyframe_cache: bool = settings.KEYFRAME_CACHE,
+        on_demand: bool = settings.ON_DEMAND,
+        multicast: bool = settings.MULTICAST,
+        multicast_port: int = settings.MULTICAST_BASE_PORT,
+        **properties,
+    ):
         super(RTSPServer, self).__init__(**properties)
 
-        if supported_config.rgb:          self.rgb_rtsp = RtspSystem()
-        elif supported_config.mono_left:  self.mono_left_rtsp = RtspSystem()
-        elif supported_config.mono_right: self.mono_right_rtsp = RtspSystem()
-        elif supported_config.depth:      self.depth_rtsp = RtspSystem()
-
+        self.media_path = media_path
+        self.keyframe_cache = keyframe_cache
+        self.metrics = metrics if metrics is not None else Metrics(device_id)
+        self.recorder = recorder
+        self.supported_config = supported_config
+        self.rtsp_systems = {}
         self.app_pipeline = {}
-        self.appsrc = {}
+        # Sources of each stream, replaced rather than modified, so that they can be iterated over without a lock
+        self.media_sources = {}
+        self.buffer_pools = {}
+        self.gop_caches = {}
         Gst.init(None)
 
-        if supported_config.rgb:          self.setup_rtsp_stream(AllCameraStreams.rgb, self.rgb_rtsp)
-        elif supported_config.mono_left:  self.setup_rtsp_stream(AllCameraStreams.mono_left, self.mono_left_rtsp)
-        elif supported_config.mono_right: self.setup_rtsp_stream(AllCameraStreams.mono_right, self.mono_right_rtsp)
-        elif supported_config.depth:      self.setup_rtsp_stream(AllCameraStreams.depth, self.depth_rtsp)
+        # Multicast clients of a (shared) media all receive the same group address from this pool, so the media sends
+        # every packet once, instead of once per client. Unicast clients are served as before.
+        self.address_pool = None
+        if multicast:
+            self.address_pool = GstRtspServer.RTSPAddressPool()
+            self.address_pool.add_range(
+                str(settings.MULTICAST_FIRST_ADDRESS),
+                str(settings.MULTICAST_LAST_ADDRESS),
+                multicast_port,
+                multicast_port + MULTICAST_PORTS_PER_DEVICE - 1,
+                settings.MULTICAST_TTL,
+            )
+
+        # Mount every stream the device supports, all served from the same main loop
+        self.streams = AllCameraStreams.all_streams(device_id, namespace_streams)
+        # Held while pushing to a stream's source, so that a cached GOP is never interleaved with live frames
+        self.push_locks = {cam_stream.id: threading.Lock() for cam_stream in self.streams}
+        self.bitrate_controller = AdaptiveBitrateController(
+            [cam_stream.id for cam_stream in self.streams],
+            enabled=settings.ADAPTIVE_BITRATE,
+        )
+        for cam_stream in self.streams:
+            if supported_config.check(cam_stream.id):
+                self.setup_rtsp_stream(cam_stream)
+
+        # On demand, streams only run on the device while they have a media, i.e. from a viewer's DESCRIBE until the
+        # last viewer has left
+        self.on_demand = on_demand
+        self.media_counts = {cam_stream.id: 0 for cam_stream in self.streams}
+        for cam_stream in self.streams:
+            if self.is_on_demand(cam_stream.id) and not self.is_recorded(cam_stream.id):
+                self.set_stream_active(cam_stream.id, False)
 
         self.attach(None)
 
-        # MCM thread
-        self.camera_stream_checker = CameraStreamChecker(supported_config)
-        self.mcm_thread = threading.Thread(target=self.camera_stream_checker.check_streams)
-        self.mcm_thread.start()
+        # Register mounted streams with MCM in the background
+        self.mcm_registration = mcm_registration
+        self.stream_registrar = None
+        self.register_streams()
         GLib.timeout_add_seconds(2, self.timeout)
+        GLib.timeout_add_seconds(1, self.check_congestion)
+
+        self.main_loop = GLib.MainLoop()
+        self.main_loop_thread = threading.Thread(target=self.main_loop.run, name='rtsp-main-loop', daemon=True)
+        self.main_loop_thread.start()
 
 
-    def setup_rtsp_stream(self, stream_info: CameraStream, rtsp_system):
-        rtsp_system.set_shared(True)
-        rtsp_system.start()
+    def setup_rtsp_stream(self, stream_info: CameraStream):
+        rtsp_system = RtspSystem(stream_info, self)
+        # With the keyframe cache, every direct-mode viewer gets a media (and so a source) of its own, which starts
+        # from the cached GOP however long others have been watching. Multicast viewers share a media, so that they
+        # share its group address.
+        rtsp_system.set_shared(not self.keyframe_cache or self.media_path != 'direct' or self.address_pool is not None)
+        if self.address_pool is not None:
+            rtsp_system.set_address_pool(self.address_pool)
+        self.rtsp_systems[stream_info.id] = rtsp_system
 
         self.get_mount_points().add_factory(f"/{stream_info.endpoint}", rtsp_system)
-        self.app_pipeline[stream_info.endpoint] = self.start_app_pipeline(stream_info.socket_path)
-        self.appsrc[stream_info.endpoint] = self.app_pipeline[stream_info.endpoint].get_child_by_name('source')
+        self.buffer_pools[stream_info.id] = FrameBufferPool()
+        if self.keyframe_cache:
+            self.gop_caches[stream_info.id] = GopCache()
+
+        # In direct mode, the source only exists once a client has caused the media to be created
+        if self.media_path == 'shm':
+            self.app_pipeline[stream_info.id] = self.start_app_pipeline(stream_info.socket_path)
+            self.attach_media_element(stream_info.id, self.app_pipeline[stream_info.id])
+
+
+    def teardown_rtsp_stream(self, stream_info: CameraStream):
+        self.get_mount_points().remove_factory(f"/{stream_info.endpoint}")
+        self.rtsp_systems.pop(stream_info.id)
+        self.detach_media_element(stream_info.id)
+
+        app_pipeline = self.app_pipeline.pop(stream_info.id, None)
+        if app_pipeline is not None:
+            app_pipeline.set_state(Gst.State.NULL)
+        self.buffer_pools.pop(stream_info.id).close()
+        self.gop_caches.pop(stream_info.id, None)
+
+
+    def set_supported_config(self, supported_config: SupportedConfig):
+        # Cameras may differ after a reconnect, so (un)mount streams to match while leaving the others untouched
+        for cam_stream in self.streams:
+            is_mounted = cam_stream.id in self.rtsp_systems
+            if supported_config.check(cam_stream.id) and not is_mounted:
+                self.setup_rtsp_stream(cam_stream)
+            elif not supported_config.check(cam_stream.id) and is_mounted:
+                self.teardown_rtsp_stream(cam_stream)
+
+        self.supported_config = supported_config
+        self.register_streams()
+
+
+    def register_streams(self):
+        if not self.mcm_registration:
+            return
+
+        # A server started before the device's cameras are known has nothing mounted yet, and registering that would
+        # have MCM drop our streams from a previous run, only to add them back moments later
+        if self.stream_registrar is None:
+            if len(self.mounted_streams()) == 0:
+                return
+            self.stream_registrar = StreamRegistrar(int(self.get_service()))
+        self.stream_registrar.set_streams(self.mounted_streams())
+
+
+    def mounted_streams(self) -> list[CameraStream]:
+        return [cam_stream for cam_stream in self.streams if cam_stream.id in self.rtsp_systems]
+
+
+    def media_configured(self, stream_id: str):
+        self.media_counts[stream_id] += 1
+        if self.is_on_demand(stream_id):
+            self.set_stream_active(stream_id, True)
+
+
+    def media_unprepared(self, stream_id: str):
+        self.media_counts[stream_id] -= 1
+        if self.is_on_demand(stream_id) and self.media_counts[stream_id] == 0:
+            GLib.timeout_add_seconds(IDLE_GRACE_SECONDS, self.pause_if_idle, stream_id)
+
+
+    def pause_if_idle(self, stream_id: str):
+        if self.media_counts[stream_id] == 0 and not self.is_recorded(stream_id):
+            self.set_stream_active(stream_id, False)
+        return False
+
+
+    def is_on_demand(self, stream_id: str) -> bool:
+        # Low renditions are extra copies of a stream, which only run while someone watches them
+        return self.on_demand or is_low_rendition(stream_id)
+
+
+    def is_recorded(self, stream_id: str) -> bool:
+        return self.recorder is not None and stream_id in self.recorder.stream_recorders
+
+
+    def set_stream_active(self, stream_id: str, active: bool):
+        self.metrics.stream(stream_id).active = active
+        self.bitrate_controller.set_active(stream_id, active)
+
+
+    def attach_media_element(self, stream_id: str, element):
+        media_source = MediaSource(element.get_by_name('source'), element.get_by_name('upload_queue'))
+        with self.push_locks[stream_id]:
+            self.media_sources[stream_id] = [*self.media_sources.get(stream_id, []), media_source]
+
+
+    def prime_stream(self, stream_id: str):
+        with self.push_locks[stream_id]:
+            self.push_cached_gop(stream_id)
+
+
+    def push_cached_gop(self, stream_id: str):
+        # NOTE: Called with the stream's push lock held
+        gop_cache = self.gop_caches.get(stream_id)
+        if gop_cache is None:
+            return
+
+        for data in gop_cache.replay():
+            buffer = self.buffer_pools[stream_id].wrap(data)
+            for media_source in self.media_sources.get(stream_id, []):
+                media_source.appsrc.emit('push-buffer', buffer)
+
+
+    def start_media_source(self, stream_id: str, media_source: MediaSource):
+        # NOTE: Called with the stream's push lock held, once the latest frame is in the stream's GOP cache
+        #
+        # A source starts from the cached GOP, which ends with the latest frame, so that its viewers get a keyframe
+        # first and the current picture right away. Without a cached GOP (i.e. before the stream's first keyframe),
+        # it waits for the next keyframe, and it takes nothing until its media has started it (the push is refused).
+        frames = self.gop_caches[stream_id].replay()
+        if len(frames) == 0:
+            return
+
+        buffer_pool = self.buffer_pools[stream_id]
+        if media_source.appsrc.emit('push-buffer', buffer_pool.wrap(frames[0])) != Gst.FlowReturn.OK:
+            return
+        media_source.started = True
+        for data in frames[1:]:
+            media_source.appsrc.emit('push-buffer', buffer_pool.wrap(data))
+
+
+    def detach_media_element(self, stream_id: str, element=None):
+        # Detaches the given media's source, or every source of the stream
+        with self.push_locks[stream_id]:
+            if element is None:
+                self.media_sources.pop(stream_id, None)
+                return
+
+            appsrc = element.get_by_name('source')
+            self.media_sources[stream_id] = [
+                media_source for media_source in self.media_sources.get(stream_id, []) if media_source.appsrc is not appsrc
+            ]
 
 
     def timeout(self):
         pool = self.get_session_pool()
         pool.cleanup()
+        self.metrics.rtsp_sessions = pool.get_n_sessions()
+        return True
+
+
+    def check_congestion(self):
+        for stream_id, media_sources in list(self.media_sources.items()):
+            for media_source in media_sources:
+                self.bitrate_controller.report_queue_fill(stream_id, queue_fill(media_source.upload_queue))
+
+        self.bitrate_controller.evaluate()
         return True
 
 
     def send_data(self, kind, data):
-        retval = self.appsrc[kind].emit('push-buffer', Gst.Buffer.new_wrapped(data))
+        # Recordings only take a reference to the frame here, and are written out from their own thread
+        if self.recorder is not None:
+            self.recorder.record(kind, data)
+
+        with self.push_locks[kind]:
+            gop_cache = self.gop_caches.get(kind)
+            if gop_cache is not None:
+                gop_cache.add(data)
+
+            media_sources = self.media_sources.get(kind, [])
+            if len(media_sources) == 0:
+                # Nobody is watching this stream in direct mode
+                return
+
+            # The frame is wrapped once, however many sources it is pushed into
+            buffer = None
+            retval = Gst.FlowReturn.OK
+            for media_source in media_sources:
+                if not media_source.started and gop_cache is not None:
+                    self.start_media_source(kind, media_source)
+                    continue
+
+                if buffer is None:
+                    buffer = self.buffer_pools[kind].wrap(data)
+                source_retval = media_source.appsrc.emit('push-buffer', buffer)
+                if source_retval != Gst.FlowReturn.OK:
+                    retval = source_retval
+        self.bitrate_controller.report_push(kind, retval == Gst.FlowReturn.OK)
         if retval != Gst.FlowReturn.OK:
-            print("Warning: Buffer may be full?")
+            self.metrics.observe_push_failure(kind)
+            warn_rate_limited(f'push-{kind}', f'Warning: Unable to push frame of "{kind}" ({retval.value_nick}), buffer may be full?')
 
 
     def start_app_pipeline(self, file):
@@ -161,110 +410,392 @@ class RTSPServer(GstRtspServer.RTSPServer):
 
 
 
-def remove_existing_sockets():
+def queue_fill(queue) -> float:
+    # A queue leaks once it reaches any of its limits (where 0 is no limit), and with the defaults, that is the 1 s
+    # time limit, at only 15-30 of its 200 buffers
+    limits = (
+        ('current-level-buffers', 'max-size-buffers'),
+        ('current-level-bytes', 'max-size-bytes'),
+        ('current-level-time', 'max-size-time'),
+    )
+    return max(
+        (queue.get_property(level) / queue.get_property(limit) for level, limit in limits if queue.get_property(limit) > 0),
+        default=0.0,
+    )
+
+
+
+def remove_existing_sockets(device_id: str | None = None):
     # Clear any existing sockets before creating new ones
-    for stream in AllCameraStreams.all_streams():
+    for stream in AllCameraStreams.all_streams(device_id):
         if os.path.exists(stream.socket_path):
             os.remove(stream.socket_path)
 
 
 
-def detect_cameras(device_info):
-    supported_config = {}
+def detect_cameras(device) -> SupportedConfig:
+    # Takes a booted device, whose pipeline has yet to be started
+    available_cameras = device.getConnectedCameras()
 
-    with dai.Device(device_info) as device:
-        available_cameras = device.getConnectedCameras()
+    supported_config = SupportedConfig(
+        rgb = dai.CameraBoardSocket.CAM_A in available_cameras,
+        mono_left = dai.CameraBoardSocket.CAM_B in available_cameras,
+        mono_right = dai.CameraBoardSocket.CAM_C in available_cameras,
+    )
 
-        supported_config = SupportedConfig(
-            rgb = dai.CameraBoardSocket.CAM_A in available_cameras,
-            mono_left = dai.CameraBoardSocket.CAM_B in available_cameras,
-            mono_right = dai.CameraBoardSocket.CAM_C in available_cameras,
-        )
+    supported_config.low_renditions = tuple(settings.LOW_STREAMS)
+
+    imu_model = device.getConnectedIMU()
+    supported_config.imu = imu_model if imu_model not in ('', 'NONE') else None
+
+    # The composite stream needs every one of its tiles
+    supported_config.composite = len(settings.COMPOSITE_STREAMS) > 0 and all(
+        supported_config.check(stream_id) for stream_id in settings.COMPOSITE_STREAMS
+    )
 
     return supported_config
 
 
-while True:
-    print('\n')
 
-    # Step 0: Cleanup potentially existing sockets
-    remove_existing_sockets()
+def forward_packet(rtsp_server: RTSPServer, stream_id: str, packet, latency_policy: LatencyPolicy):
+    metrics = rtsp_server.metrics
+
+    # How long the packet waited in the output queue, as device timestamps are synced to the host's clock
+    queue_latency = (dai.Clock.now() - packet.getTimestamp()).total_seconds()
+
+    start = time.perf_counter()
+    data = packet.getData()
+    got_data = time.perf_counter()
+    metrics.observe_frame(stream_id, len(data), queue_latency)
+    metrics.observe_stage(stream_id, 'getData', got_data - start)
+
+    # Stale frames are dropped here, which also lets a host that fell behind catch up on the queue quickly
+    if not latency_policy.admit(queue_latency, data):
+        metrics.observe_late_drop(stream_id)
+        rtsp_server.bitrate_controller.report_late_drop(stream_id)
+        warn_rate_limited(f'late-{stream_id}', f'Warning: Dropping late frames of "{stream_id}" ({queue_latency * 1000:.0f} ms behind) up to the next keyframe')
+        return
+
+    rtsp_server.send_data(stream_id, data)
+    metrics.observe_stage(stream_id, 'push', time.perf_counter() - got_data)
+
+
+
+def stream_device(
+    device,
+    supported_config: SupportedConfig,
+    rtsp_server: RTSPServer,
+    depth_consumers: list | None = None,
+    snapshots: Snapshots | None = None,
+    profiles: dict[str, StreamProfile] | None = None,
+    imu_consumers: list | None = None,
+):
+    if profiles is None:
+        profiles = load_profiles()
+
+    # Output queue(s) will be used to get the encoded data from the output defined above
+    outputQueueNames = device.getOutputQueueNames()
+    metrics = rtsp_server.metrics
+
+    print('6b) Preparing output queues...')
+    frame_pump = FramePump(metrics)
+    gated_stream_ids = []
+    for cam_stream in AllCameraStreams.all_streams():
+        if supported_config.check(cam_stream.id) and cam_stream.id in outputQueueNames:
+            gated_stream_ids.append(cam_stream.id)
+            outputQueue = device.getOutputQueue(
+                name=cam_stream.id,
+                maxSize=30, # type: ignore
+                blocking=True, # type: ignore
+            )
+            latency_policy = LatencyPolicy(profiles[cam_stream.id].max_latency_ms / 1000)
+            frame_pump.add_consumer(
+                cam_stream.id,
+                outputQueue,
+                lambda packet, stream_id=cam_stream.id, latency_policy=latency_policy: forward_packet(rtsp_server, stream_id, packet, latency_policy),
+            )
+
+    if snapshots is not None:
+        for cam_stream in AllCameraStreams.all_streams():
+            snapshot_name = snapshot_stream_name(cam_stream.id)
+            if supported_config.check(cam_stream.id) and snapshot_name in outputQueueNames:
+                # Only the latest snapshot is of interest
+                snapshotQueue = device.getOutputQueue(
+                    name=snapshot_name,
+                    maxSize=1, # type: ignore
+                    blocking=False, # type: ignore
+                )
+                frame_pump.add_consumer(
+                    snapshot_name,
+                    snapshotQueue,
+                    lambda packet, stream_id=cam_stream.id: snapshots.observe(stream_id, packet),
+                )
+
+    if SYSTEM_INFO_STREAM_NAME in outputQueueNames:
+        systemInfoQueue = device.getOutputQueue(
+            name=SYSTEM_INFO_STREAM_NAME,
+            maxSize=4, # type: ignore
+            blocking=False, # type: ignore
+        )
+        frame_pump.add_consumer(SYSTEM_INFO_STREAM_NAME, systemInfoQueue, metrics.observe_system_information)
+
+    if depth_consumers and RAW_DEPTH_STREAM_NAME in outputQueueNames:
+        # Consumers only want the latest depth frame, so never let raw frames stall the device
+        rawDepthQueue = device.getOutputQueue(
+            name=RAW_DEPTH_STREAM_NAME,
+            maxSize=4, # type: ignore
+            blocking=False, # type: ignore
+        )
+        for depth_consumer in depth_consumers:
+            frame_pump.add_consumer(RAW_DEPTH_STREAM_NAME, rawDepthQueue, depth_consumer)
+
+    if imu_consumers and IMU_STREAM_NAME in outputQueueNames:
+        # Each batch holds many samples, so the queue covers a while without ever stalling the device
+        imuQueue = device.getOutputQueue(
+            name=IMU_STREAM_NAME,
+            maxSize=16, # type: ignore
+            blocking=False, # type: ignore
+        )
+        for imu_consumer in imu_consumers:
+            frame_pump.add_consumer(IMU_STREAM_NAME, imuQueue, imu_consumer)
 
-    # Step 1: Find connected devices
-    print('1) Looking for DepthAI devices...')
-    camera_devices = dai.Device.getAllAvailableDevices()
-    if len(camera_devices) == 0:
-        print('No DepthAI devices found! Restarting loop...')
-        time.sleep(1)
-        continue
+    for cam_stream in rtsp_server.mounted_streams():
+        print(f'RTSP stream available at rtsp://<server-ip>:{rtsp_server.get_service()}/{cam_stream.endpoint}')
+    print('Starting streaming of video data...')
 
-    device_info = camera_devices[0]
-    print(f'Detected device: {device_info.name}')
+    # Hand control of the device's frame gates to the bitrate controller
+    rtsp_server.bitrate_controller.attach(FrameGateControl(device).set_divisor, gated_stream_ids)
 
-    # Step 2: Recognize cameras on device
-    print('2) Recognizing cameras...')
-    supported_config = detect_cameras(device_info)
+    # Frames are forwarded by the pump's reader threads, so this thread just waits for one of them to fail
+    frame_pump.start()
+    metrics.device.connected = True
+    try:
+        frame_pump.wait()
+    finally:
+        metrics.device.connected = False
+        frame_pump.stop()
+        rtsp_server.bitrate_controller.detach()
+
+
+
+def run_device_session(
+    device,
+    rtsp_server_future: Future,
+    profiles: dict[str, StreamProfile],
+    timeline: StartupTimeline,
+    depth_consumers: list | None = None,
+    snapshots: Snapshots | None = None,
+    imu_consumers: list | None = None,
+):
+    # Brings up a booted device without booting it again: recognizes its cameras, builds and starts the pipeline for
+    # them, and streams from it until it drops
+    # Step 3: Recognize cameras on device
+    print('3) Recognizing cameras...')
+    supported_config = detect_cameras(device)
+    timeline.mark('cameras recognized')
 
     if not supported_config.rgb and not supported_config.mono_left and not supported_config.mono_right:
         print('Unable to find any cameras on device! Restarting loop...')
         time.sleep(1)
-        continue
+        return
     else:
         print('Supported Configuration:')
         print(f' - RGB: {supported_config.rgb}')
         print(f' - Mono (left): {supported_config.mono_left}')
         print(f' - Mono (right): {supported_config.mono_right}')
         print(f' - Depth: {supported_config.depth}')
+        print(f' - Composite: {supported_config.composite}')
+        print(f' - Low renditions: {", ".join(supported_config.low_renditions) or "none"}')
+        print(f' - IMU: {supported_config.imu or "none"}')
 
-    # Step 3: Build pipeline based on found cameras
-    print('3) Building pipeline...')
+    # Step 4: Build pipeline based on found cameras
+    print('4) Building pipeline...')
     try:
-        vision_pipeline = build_processing_pipeline(supported_config)
+        vision_pipeline = build_processing_pipeline(supported_config, profiles)
     except Exception as ex:
         print(f'Unable to build pipeline: {ex}')
         traceback.print_exception(ex)
         print('Restarting loop...')
-        continue
+        time.sleep(1)
+        return
+    timeline.mark('pipeline built')
+
+    # Step 5: Mount the streams of the found cameras on the RTSP server, which has been starting up in the meantime
+    print('5) Mounting streams on RTSP Server...')
+    rtsp_server = rtsp_server_future.result()
+    rtsp_server.set_supported_config(supported_config)
+    timeline.mark('streams mounted')
+
+    # Step 6: Starting vision data loop
+    print('6) Starting vision data loop...')
+    print('6a) Starting pipeline...')
+    device.startPipeline(vision_pipeline)
+    timeline.mark('pipeline started')
+    stream_device(device, supported_config, rtsp_server, depth_consumers, snapshots, profiles, imu_consumers)
+
+
+
+def exit_on_sigterm(signum, frame):
+    # Turns termination into a normal exit, so that `finally` blocks get to clean up
+    raise SystemExit(0)
+
+
+
+def run_device_worker(device_id: str, slot: int, profiles: dict[str, StreamProfile]):
+    # Each device's slot sets the ports it is served on
+    rtsp_port = RTSP_BASE_PORT + slot
+    http_port = settings.HTTP_BASE_PORT + slot
+    print(f'Starting worker for device {device_id} on RTSP port {rtsp_port}')
+
+    # Metrics outlive device drops too, so that counters keep counting across reconnects
+    metrics = Metrics(device_id)
+    http_api = HttpApi(http_port)
+    http_api.add_route('GET', '/metrics', metrics.handle_request)
+
+    recorder = None
+    if settings.RECORDING_MODE != 'off':
+        recorder = Recorder(device_id, metrics)
+        http_api.add_route('POST', '/recording/trigger', recorder.handle_trigger)
+
+    snapshots = None
+    if settings.SNAPSHOT_FPS > 0:
+        snapshots = Snapshots()
+        http_api.add_route('GET', '/snapshot/', snapshots.handle_request)
+
+    # Consumers of the raw depth frames, each taking a packet
+    depth_consumers = []
+    if settings.RAW_DEPTH:
+        depth_consumers.append(DepthPublisher(settings.RAW_DEPTH_BASE_PORT + slot, metrics=metrics).publish)
+    if settings.OBSTACLE_RANGES:
+        obstacle_ranges = ObstacleRanges(
+            settings.OBSTACLE_GRID_ROWS,
+            settings.OBSTACLE_GRID_COLS,
+            settings.OBSTACLE_PERCENTILE,
+            (settings.MAVLINK_HOST, settings.MAVLINK_PORT),
+        )
+        depth_consumers.append(obstacle_ranges.process)
+        http_api.add_route('GET', '/obstacles', obstacle_ranges.handle_request)
+
+    # Consumers of the IMU batches, each taking a packet
+    imu_consumers = []
+    if settings.IMU:
+        imu_consumers.append(ImuPublisher(settings.IMU_BASE_PORT + slot, metrics=metrics).publish)
+
+    # The RTSP server, its mount points and upload pipelines live as long as the worker does, so that only
+    # the DepthAI side is re-established after a device drop, and clients just see a short stall. It does not depend
+    # on the device either, so GStreamer is set up while the device boots, and the streams of its cameras are
+    # mounted once they are known.
+    remove_existing_sockets(device_id)
+
+    def start_rtsp_server() -> RTSPServer:
+        rtsp_server = RTSPServer(
+            SupportedConfig(rgb=False, mono_left=False, mono_right=False),
+            device_id,
+            # Further devices are always namespaced, as they would otherwise be registered under the same names
+            namespace_streams=settings.DEVICE_NAMESPACE or slot > 0,
+            metrics=metrics,
+            recorder=recorder,
+            multicast_port=settings.MULTICAST_BASE_PORT + MULTICAST_PORTS_PER_DEVICE * slot,
+            service=str(rtsp_port),
+        )
+        metrics.startup.mark('RTSP server started')
+        return rtsp_server
+
+    rtsp_server_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rtsp-setup')
+    rtsp_server_future = rtsp_server_executor.submit(start_rtsp_server)
+    rtsp_server_executor.shutdown(wait=False)
 
-    # Step 4: Start RTSP Server
-    print('4) Starting RTSP Server...')
-    rtsp_server = RTSPServer(supported_config)
+    device_missing = False
+    connected_before = False
 
-    # Step 5: Starting vision data loop
-    print('5) Starting vision data loop...')
+    # Stopping the worker (e.g. on `docker stop`) must still finish the open recording segments, or they would not play
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
     try:
-        print('5a) Connecting to device...')
-        with dai.Device(vision_pipeline) as device:
-            # Output queue(s) will be used to get the encoded data from the output defined above
-            outputQueueNames = device.getOutputQueueNames()
-
-            print('5b) Preparing output queues...')
-            OUTPUT_QUEUES = {
-                queueName: device.getOutputQueue(
-                    name=queueName,
-                    maxSize=30, # type: ignore
-                    blocking=True, # type: ignore
-                ) for queueName in outputQueueNames if AllCameraStreams.is_supported(queueName)
-            }
-
-            print("RTSP stream available at rtsp://<server-ip>:8554/preview")
-            print('Starting streaming of video data...')
-
-            while True:
-                for queue_id, outputQueue in OUTPUT_QUEUES.items():
-                    if supported_config.check(queue_id) and outputQueue.has():
-                        frame_data = outputQueue.get().getData()
-                        rtsp_server.send_data(queue_id, frame_data)
-    except KeyboardInterrupt:
-        # Keyboard interrupt (Ctrl + C) detected, ignore it
-        pass
-    except RuntimeError as ex:
-        if 'No available devices' in str(ex):
-            print('Unable to initialize OAK-D camera')
-        elif 'Communication exception' in str(ex):
-            print('Lost connection to camera')
-        else:
-            print(ex)
-
-        print('Restarting loop after 5 seconds...')
-        time.sleep(5)
+        while True:
+            # Step 1: Find this worker's device
+            device_found, device_info = dai.Device.getDeviceByMxId(device_id)
+            if not device_found:
+                if not device_missing:
+                    print(f'DepthAI device {device_id} not found! Waiting for it to reappear...')
+                    device_missing = True
+                time.sleep(DEVICE_RETRY_SECONDS)
+                continue
+
+            print('\n')
+            print(f'1) Found DepthAI device {device_id}')
+            device_missing = False
+
+            if connected_before:
+                metrics.startup.restart()
+            metrics.startup.mark('device found')
+            connected_before = True
+
+            try:
+                # Step 2: Boot the device, once for the whole session
+                print('2) Booting device...')
+                with dai.Device(device_info) as device:
+                    metrics.startup.mark('device booted')
+                    run_device_session(device, rtsp_server_future, profiles, metrics.startup, depth_consumers, snapshots, imu_consumers)
+            except KeyboardInterrupt:
+                # Keyboard interrupt (Ctrl + C) detected, ignore it
+                pass
+            except RuntimeError as ex:
+                if 'No available devices' in str(ex):
+                    print('Unable to initialize OAK-D camera')
+                elif 'Communication exception' in str(ex):
+                    print('Lost connection to camera')
+                else:
+                    print(ex)
+
+                print(f'Reconnecting after {DEVICE_RETRY_SECONDS} seconds...')
+                time.sleep(DEVICE_RETRY_SECONDS)
+
+    finally:
+        if recorder is not None:
+            recorder.close()
+        http_api.close()
+
+
+def main():
+    # Each device is served by its own worker process (with its own RTSP port), so that one device's
+    # USB/XLink stalls and GIL load cannot hold up the others
+    mp_context = multiprocessing.get_context('spawn')
+    workers = {}
+    # Exiting normally terminates the (daemon) workers, with a SIGTERM of their own
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+
+    # Load stream profiles up front, so that an invalid configuration fails at startup
+    profiles = load_profiles()
+    print('Stream profiles:')
+    for stream_id, profile in profiles.items():
+        print(f' - {stream_id}: {profile}')
+
+    # Each device gets a slot, which sets its ports
+    device_slots = {}
+
+    while True:
+        # NOTE: Devices already opened by a worker are not listed as available
+        for device_info in dai.Device.getAllAvailableDevices():
+            device_id = device_info.getMxId()
+            if device_id in workers and workers[device_id].is_alive():
+                continue
+
+            # Ports stay assigned to the same device (through its slot) for as long as the extension runs
+            if device_id not in device_slots:
+                device_slots[device_id] = len(device_slots)
+            slot = device_slots[device_id]
+
+            print(f'Detected device: {device_info.name} ({device_id})')
+            workers[device_id] = mp_context.Process(
+                target=run_device_worker,
+                args=(device_id, slot, profiles),
+                name=f'oakd-{device_id}',
+                daemon=True,
+            )
+            workers[device_id].start()
+
+        time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import json
+import os
+from dataclasses import dataclass, fields, replace
+
+import settings
+from camera_streams import is_low_rendition
+
+
+# Sensor resolutions per camera type, mapped to their DepthAI `SensorResolution` names
+COLOR_RESOLUTIONS = {
+    '720p': 'THE_720_P',
+    '1080p': 'THE_1080_P',
+    '4k': 'THE_4_K',
+    '12mp': 'THE_12_MP',
+}
+
+MONO_RESOLUTIONS = {
+    '400p': 'THE_400_P',
+    '480p': 'THE_480_P',
+    '720p': 'THE_720_P',
+    '800p': 'THE_800_P',
+}
+
+# Frame sizes (width, height) of the mono resolutions, which are also the tile sizes of the composite stream
+MONO_RESOLUTION_SIZES = {
+    '400p': (640, 400),
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '800p': (1280, 800),
+}
+
+# Output sizes (width, height) of the low renditions, which are letterboxed to keep their camera's aspect ratio
+LOW_RESOLUTIONS = {
+    '180p': (320, 180),
+    '200p': (320, 200),
+    '240p': (320, 240),
+    '360p': (640, 360),
+    '400p': (640, 400),
+}
+
+# H.264 encoder profiles, mapped to their DepthAI `VideoEncoderProperties.Profile` names
+ENCODER_PROFILES = {
+    'baseline': 'H264_BASELINE',
+    'main': 'H264_MAIN',
+    'high': 'H264_HIGH',
+}
+
+MAX_FPS = 60
+
+# Tallest frame the video encoder takes, which bounds the composite stream's stack of tiles
+MAX_ENCODER_HEIGHT = 2160
+
+
+@dataclass(frozen=True)
+class StreamProfile:
+    # NOTE: The depth stream always runs at the mono cameras' resolution and FPS, so those fields are unused for it.
+    # The composite stream's resolution is that of each of its tiles, and it runs at its first tile's FPS. Low renditions
+    # (e.g. 'rgb_low') are scaled down to their resolution, and run at their camera's FPS.
+    resolution: str
+    fps: float
+    # Encoder bitrate, where 0 keeps the encoder's default for the resolution and FPS
+    bitrate_kbps: int
+    # Number of frames between keyframes (IDR frames)
+    keyframe_interval: int
+    profile: str
+    # Frames later than this on reaching the host are dropped up to the next keyframe, where 0 never drops frames
+    max_latency_ms: int
+
+
+
+PRESETS = {
+    # Matches the original encoding of this extension
+    'default': {
+        'rgb': StreamProfile(resolution='1080p', fps=15, bitrate_kbps=0, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'mono_left': StreamProfile(resolution='400p', fps=15, bitrate_kbps=0, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'mono_right': StreamProfile(resolution='400p', fps=15, bitrate_kbps=0, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'depth': StreamProfile(resolution='400p', fps=15, bitrate_kbps=0, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'composite': StreamProfile(resolution='400p', fps=15, bitrate_kbps=0, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'rgb_low': StreamProfile(resolution='360p', fps=15, bitrate_kbps=600, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'mono_left_low': StreamProfile(resolution='200p', fps=15, bitrate_kbps=250, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'mono_right_low': StreamProfile(resolution='200p', fps=15, bitrate_kbps=250, keyframe_interval=30, profile='main', max_latency_ms=1000),
+        'depth_low': StreamProfile(resolution='200p', fps=15, bitrate_kbps=300, keyframe_interval=30, profile='main', max_latency_ms=1000),
+    },
+    # Fast mono feeds for piloting, with a modest RGB feed alongside
+    'piloting': {
+        'rgb': StreamProfile(resolution='1080p', fps=15, bitrate_kbps=2000, keyframe_interval=15, profile='main', max_latency_ms=500),
+        'mono_left': StreamProfile(resolution='400p', fps=30, bitrate_kbps=1500, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'mono_right': StreamProfile(resolution='400p', fps=30, bitrate_kbps=1500, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'depth': StreamProfile(resolution='400p', fps=30, bitrate_kbps=1500, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'composite': StreamProfile(resolution='400p', fps=30, bitrate_kbps=3000, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'rgb_low': StreamProfile(resolution='360p', fps=15, bitrate_kbps=500, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'mono_left_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=300, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'mono_right_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=300, keyframe_interval=30, profile='main', max_latency_ms=500),
+        'depth_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=300, keyframe_interval=30, profile='main', max_latency_ms=500),
+    },
+    # High frame rates and short GOPs, so that new viewers and lost packets recover quickly
+    'low-latency': {
+        'rgb': StreamProfile(resolution='1080p', fps=30, bitrate_kbps=6000, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'mono_left': StreamProfile(resolution='400p', fps=30, bitrate_kbps=2500, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'mono_right': StreamProfile(resolution='400p', fps=30, bitrate_kbps=2500, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'depth': StreamProfile(resolution='400p', fps=30, bitrate_kbps=2500, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'composite': StreamProfile(resolution='400p', fps=30, bitrate_kbps=5000, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'rgb_low': StreamProfile(resolution='360p', fps=30, bitrate_kbps=800, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'mono_left_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=400, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'mono_right_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=400, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+        'depth_low': StreamProfile(resolution='200p', fps=30, bitrate_kbps=400, keyframe_interval=15, profile='baseline', max_latency_ms=250),
+    },
+    # Low frame rates and bitrates for congested tethers
+    'low-bandwidth': {
+        'rgb': StreamProfile(resolution='1080p', fps=10, bitrate_kbps=800, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'mono_left': StreamProfile(resolution='400p', fps=10, bitrate_kbps=300, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'mono_right': StreamProfile(resolution='400p', fps=10, bitrate_kbps=300, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'depth': StreamProfile(resolution='400p', fps=10, bitrate_kbps=400, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'composite': StreamProfile(resolution='400p', fps=10, bitrate_kbps=700, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'rgb_low': StreamProfile(resolution='360p', fps=10, bitrate_kbps=250, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'mono_left_low': StreamProfile(resolution='200p', fps=10, bitrate_kbps=100, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'mono_right_low': StreamProfile(resolution='200p', fps=10, bitrate_kbps=100, keyframe_interval=20, profile='high', max_latency_ms=1000),
+        'depth_low': StreamProfile(resolution='200p', fps=10, bitrate_kbps=120, keyframe_interval=20, profile='high', max_latency_ms=1000),
+    },
+}
+
+DEFAULT_PRESET = 'default'
+
+
+def validate_profiles(profiles: dict[str, StreamProfile], composite_streams: list[str] = settings.COMPOSITE_STREAMS):
+    for stream_id, profile in profiles.items():
+        if is_low_rendition(stream_id):
+            resolutions = LOW_RESOLUTIONS
+        elif stream_id == 'rgb':
+            resolutions = COLOR_RESOLUTIONS
+        else:
+            resolutions = MONO_RESOLUTIONS
+
+        for field_name in ('fps', 'bitrate_kbps', 'keyframe_interval', 'max_latency_ms'):
+            value = getattr(profile, field_name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f'Invalid {field_name} "{value}" for "{stream_id}", expected a number')
+
+        # Checked as strings first, as anything unhashable (i.e. a list from the profile file) cannot be looked up
+        if not isinstance(profile.resolution, str) or profile.resolution not in resolutions:
+            raise ValueError(f'Invalid resolution "{profile.resolution}" for "{stream_id}", expected one of: {", ".join(resolutions)}')
+        if not 0 < profile.fps <= MAX_FPS:
+            raise ValueError(f'Invalid FPS {profile.fps} for "{stream_id}", expected a value in (0, {MAX_FPS}]')
+        if profile.bitrate_kbps < 0:
+            raise ValueError(f'Invalid bitrate {profile.bitrate_kbps} kbps for "{stream_id}", expected 0 (default) or more')
+        if profile.keyframe_interval < 1:
+            raise ValueError(f'Invalid keyframe interval {profile.keyframe_interval} for "{stream_id}", expected 1 or more')
+        if profile.max_latency_ms < 0:
+            raise ValueError(f'Invalid max latency {profile.max_latency_ms} ms for "{stream_id}", expected 0 (unbounded) or more')
+        if not isinstance(profile.profile, str) or profile.profile not in ENCODER_PROFILES:
+            raise ValueError(f'Invalid encoder profile "{profile.profile}" for "{stream_id}", expected one of: {", ".join(ENCODER_PROFILES)}')
+
+    # Stereo depth needs both mono cameras to produce identical frames
+    mono_left, mono_right = profiles['mono_left'], profiles['mono_right']
+    if (mono_left.resolution, mono_left.fps) != (mono_right.resolution, mono_right.fps):
+        raise ValueError('Mono cameras must share the same resolution and FPS for stereo depth')
+
+    # Composite tiles are stacked on top of each other, into a single frame for the encoder
+    composite_height = MONO_RESOLUTION_SIZES[profiles['composite'].resolution][1] * len(composite_streams)
+    if composite_height > MAX_ENCODER_HEIGHT:
+        raise ValueError(
+            f'Composite stream of {len(composite_streams)} tiles at {profiles["composite"].resolution} is {composite_height} pixels tall, '
+            f'expected at most {MAX_ENCODER_HEIGHT} (use a lower resolution or fewer tiles)'
+        )
+
+
+def load_profiles(preset_name: str | None = None, profile_file: str | None = None) -> dict[str, StreamProfile]:
+    # Profiles start from a named preset (OAKD_PRESET), with optional per-stream overrides from a JSON
+    # file (OAKD_PROFILE_FILE), such as: {"preset": "low-bandwidth", "streams": {"rgb": {"fps": 5}}}
+    preset_name = preset_name or os.environ.get('OAKD_PRESET') or DEFAULT_PRESET
+    profile_file = profile_file or os.environ.get('OAKD_PROFILE_FILE')
+
+    overrides = {}
+    if profile_file:
+        with open(profile_file) as config_file:
+            config = json.load(config_file)
+        preset_name = config.get('preset', preset_name)
+        overrides = config.get('streams', {})
+
+    if not isinstance(preset_name, str) or preset_name not in PRESETS:
+        raise ValueError(f'Unknown preset "{preset_name}", expected one of: {", ".join(PRESETS)}')
+    profiles = dict(PRESETS[preset_name])
+
+    field_names = {field.name for field in fields(StreamProfile)}
+    for stream_id, stream_overrides in overrides.items():
+        if stream_id not in profiles:
+            raise ValueError(f'Unknown stream "{stream_id}" in "{profile_file}", expected one of: {", ".join(profiles)}')
+
+        unknown_fields = set(stream_overrides) - field_names
+        if unknown_fields:
+            raise ValueError(f'Unknown setting(s) {", ".join(sorted(unknown_fields))} for "{stream_id}" in "{profile_file}"')
+
+        profiles[stream_id] = replace(profiles[stream_id], **stream_overrides)
+
+    validate_profiles(profiles)
+    return profiles
@@ -0,0 +1,143 @@
+"""
+Stand-in for the parts of the `depthai` module that build pipelines, which records every node that is created, every
+setting made on it and every link between nodes, instead of talking to a device. Enum members are plain strings, e.g.
+`dai.ColorCameraProperties.SensorResolution.THE_1080_P` is 'SensorResolution.THE_1080_P'.
+"""
+
+
+class FakeEnum:
+    def __init__(self, name: str):
+        self.name = name
+
+
+    def __getattr__(self, member: str) -> str:
+        return f'{self.name}.{member}'
+
+
+
+class FakePort:
+    # An input or output of a node
+    def __init__(self, node: 'FakeNode', name: str):
+        self.node = node
+        self.name = name
+
+
+    def link(self, other: 'FakePort'):
+        self.node.pipeline.links.append((self, other))
+
+
+    def __getattr__(self, name: str):
+        # Input settings, e.g. `setBlocking(False)`
+        if name.startswith('set'):
+            return lambda *args: self.node.settings.__setitem__(f'{self.name}.{name}', args[0] if len(args) == 1 else args)
+        raise AttributeError(name)
+
+
+
+class FakePorts(dict):
+    # The `inputs` and `outputs` of a Script node, which are created on first use
+    def __init__(self, node: 'FakeNode'):
+        super().__init__()
+        self.node = node
+
+
+    def __missing__(self, name: str) -> FakePort:
+        port = self[name] = FakePort(self.node, name)
+        return port
+
+
+
+class FakeConfig:
+    # A node's `initialConfig`, whose settings are recorded on the node
+    def __init__(self, node: 'FakeNode'):
+        self.node = node
+
+
+    def getMaxDisparity(self) -> float:
+        return 95.0
+
+
+    def __getattr__(self, name: str):
+        if name.startswith('set'):
+            return lambda *args: self.node.settings.__setitem__(f'initialConfig.{name}', args[0] if len(args) == 1 else args)
+        raise AttributeError(name)
+
+
+
+class FakeNode:
+    # Every setter call is recorded in `settings` (by method name, with its argument or arguments), and every other
+    # attribute is one of the node's inputs or outputs
+    def __init__(self, pipeline: 'Pipeline'):
+        self.pipeline = pipeline
+        self.settings = {}
+        self.ports = {}
+        self.inputs = FakePorts(self)
+        self.outputs = FakePorts(self)
+        self.initialConfig = FakeConfig(self)
+
+
+    def getFps(self) -> float:
+        return self.settings['setFps']
+
+
+    def __getattr__(self, name: str):
+        if name.startswith('set') or name.startswith('enable'):
+            return lambda *args: self.settings.__setitem__(name, args[0] if len(args) == 1 else args)
+        if name.startswith('get'):
+            raise AttributeError(name)
+        if name not in self.ports:
+            self.ports[name] = FakePort(self, name)
+        return self.ports[name]
+
+
+
+class node:
+    class ColorCamera(FakeNode): pass
+    class MonoCamera(FakeNode): pass
+    class VideoEncoder(FakeNode): pass
+    class ImageManip(FakeNode): pass
+    class Script(FakeNode): pass
+    class SystemLogger(FakeNode): pass
+    class XLinkIn(FakeNode): pass
+    class XLinkOut(FakeNode): pass
+    class IMU(FakeNode): pass
+    class StereoDepth(FakeNode):
+        PresetMode = FakeEnum('PresetMode')
+
+
+
+class Pipeline:
+    def __init__(self):
+        self.nodes = []
+        self.links = []
+
+
+    def create(self, node_type):
+        created = node_type(self)
+        self.nodes.append(created)
+        return created
+
+
+    def nodes_of(self, node_type) -> list:
+        return [created for created in self.nodes if type(created) is node_type]
+
+
+    def linked_to(self, port: FakePort) -> list[FakePort]:
+        # Inputs fed by `port`
+        return [destination for source, destination in self.links if source is port]
+
+
+    def linked_from(self, port: FakePort) -> list[FakePort]:
+        # Outputs feeding `port`
+        return [source for source, destination in self.links if destination is port]
+
+
+
+CameraBoardSocket = FakeEnum('CameraBoardSocket')
+ColorCameraProperties = type('ColorCameraProperties', (), {'SensorResolution': FakeEnum('SensorResolution')})
+MonoCameraProperties = type('MonoCameraProperties', (), {'SensorResolution': FakeEnum('SensorResolution')})
+VideoEncoderProperties = type('VideoEncoderProperties', (), {'Profile': FakeEnum('Profile')})
+ImgFrame = type('ImgFrame', (), {'Type': FakeEnum('Type')})
+MedianFilter = FakeEnum('MedianFilter')
+Colormap = FakeEnum('Colormap')
+IMUSensor = FakeEnum('IMUSensor')
@@ -0,0 +1,102 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class McmStub:
+    # Local stand-in for Mavlink Camera Manager's REST API, covering the endpoints used by `StreamRegistrar`: listing
+    # streams (GET /streams), adding one (POST /streams) and removing one (DELETE /delete_stream?name=...). Every
+    # request and connection is counted, and the stub can be stopped and started again on the same port, like an MCM
+    # restart, which loses its stream list.
+    def __init__(self, streams: dict[str, list[str]] | None = None, port: int = 0):
+        self.lock = threading.Lock()
+        # Endpoints by stream name
+        self.streams = dict(streams or {})
+        self.requests = []
+        self.connections = 0
+        self.port = port
+        self.server = None
+        self.start()
+
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between requests, as MCM does
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                stub.handle(self, 'GET')
+
+            def do_POST(self):
+                stub.handle(self, 'POST')
+
+            def do_DELETE(self):
+                stub.handle(self, 'DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='mcm-stub', daemon=True).start()
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def restart(self):
+        # MCM comes back without the streams it had
+        self.stop()
+        with self.lock:
+            self.streams = {}
+        self.start()
+
+
+    def count(self, method: str, path: str | None = None) -> int:
+        with self.lock:
+            return sum(1 for request in self.requests if request[0] == method and path in (None, request[1]))
+
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str):
+        url = urlparse(handler.path)
+        body = handler.rfile.read(int(handler.headers.get('Content-Length') or 0))
+
+        with self.lock:
+            self.requests.append((method, url.path))
+            if (method, url.path) == ('GET', '/streams'):
+                response = [
+                    {'video_and_stream': {'name': name, 'stream_information': {'endpoints': endpoints}}}
+                    for name, endpoints in self.streams.items()
+                ]
+            elif (method, url.path) == ('POST', '/streams'):
+                new_stream = json.loads(body)
+                self.streams[new_stream['name']] = new_stream['stream_information']['endpoints']
+                response = {}
+            elif (method, url.path) == ('DELETE', '/delete_stream'):
+                self.streams.pop(parse_qs(url.query)['name'][0], None)
+                response = {}
+            else:
+                response = None
+
+        content = json.dumps(response).encode()
+        handler.send_response(404 if response is None else 200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
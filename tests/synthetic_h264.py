@@ -0,0 +1,34 @@
+"""
+Tiny, undecodable H.264 access units with the structure of the device encoder's output: every keyframe starts with an
+SPS and PPS, followed by an IDR slice, and every other frame is a single non-IDR slice. Each frame's slice carries its
+index, so that frames can be told apart after the fact.
+"""
+
+import numpy as np
+
+from h264 import ACCESS_UNIT_START_CODE
+
+
+SPS = ACCESS_UNIT_START_CODE + bytes([0x67, 0x42, 0x00, 0x1E, 0xAB])
+PPS = ACCESS_UNIT_START_CODE + bytes([0x68, 0xCE, 0x38, 0x80])
+
+
+def access_unit(index: int, keyframe: bool) -> bytes:
+    # The slice header's top bit marks the first slice of a picture, and a NAL unit never ends with a zero byte
+    slice_nal = bytes([0x65 if keyframe else 0x41, 0x88, index % 251 + 1, index // 251 % 251 + 1, 0x80])
+    return (SPS + PPS if keyframe else b'') + ACCESS_UNIT_START_CODE + slice_nal
+
+
+def gop_frames(frame_count: int, keyframe_interval: int) -> list[np.ndarray]:
+    # Frames as the NumPy arrays that `getData()` returns, starting with a keyframe
+    return [
+        np.frombuffer(access_unit(index, index % keyframe_interval == 0), dtype=np.uint8)
+        for index in range(frame_count)
+    ]
+
+
+def write_recording(path, frame_count: int = 60, keyframe_interval: int = 15) -> str:
+    # Writes an Annex-B recording for `SimulatedDevice`, and returns its path
+    with open(path, 'wb') as recording_file:
+        recording_file.write(b''.join(frame.tobytes() for frame in gop_frames(frame_count, keyframe_interval)))
+    return str(path)
@@ -0,0 +1,135 @@
+import pytest
+
+import bitrate_controller
+from bitrate_controller import DIVISOR_LEVELS, MAX_FRACTION_LOST, MAX_QUEUE_FILL, RECOVERY_SECONDS, AdaptiveBitrateController
+from camera_streams import AllCameraStreams
+
+
+ALL_STREAM_IDS = [cam_stream.id for cam_stream in AllCameraStreams.all_streams()]
+
+
+def test_attach_only_sets_the_divisors_of_gated_streams():
+    controller = AdaptiveBitrateController(ALL_STREAM_IDS)
+    controller.set_active('rgb_low', False)
+
+    sent = []
+    controller.attach(lambda stream_id, divisor: sent.append((stream_id, divisor)), ['rgb', 'rgb_low', 'depth'])
+    assert sent == [('rgb', 1), ('depth', 1), ('rgb_low', 0)]
+
+    # Streams without a gate on the device are never sent a divisor
+    sent.clear()
+    controller.set_active('mono_left', False)
+    controller.set_active('rgb_low', True)
+    assert sent == [('rgb_low', 1)]
+
+    controller.detach()
+    controller.set_active('rgb', False)
+    assert sent == [('rgb_low', 1)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(bitrate_controller, 'time', fake_clock)
+    return fake_clock
+
+
+def attached_controller(sent: list, enabled: bool = True) -> AdaptiveBitrateController:
+    controller = AdaptiveBitrateController(['rgb', 'depth'], enabled=enabled)
+    controller.attach(lambda stream_id, divisor: sent.append((stream_id, divisor)), ['rgb', 'depth'])
+    sent.clear()
+    return controller
+
+
+@pytest.mark.parametrize('report, healthy, congested', [
+    ('report_fraction_lost', MAX_FRACTION_LOST, MAX_FRACTION_LOST + 0.01),
+    ('report_queue_fill', MAX_QUEUE_FILL, MAX_QUEUE_FILL + 0.01),
+])
+def test_congestion_steps_down_through_every_level(clock, report, healthy, congested):
+    sent = []
+    controller = attached_controller(sent)
+
+    # Right at the limit is not congested
+    getattr(controller, report)('rgb', healthy)
+    controller.evaluate()
+    assert sent == []
+
+    # Every congested period steps down a level, down to the lowest one
+    for _ in range(len(DIVISOR_LEVELS) + 2):
+        getattr(controller, report)('rgb', congested)
+        controller.evaluate()
+        clock.now += 1
+    assert sent == [('rgb', divisor) for divisor in DIVISOR_LEVELS[1:]]
+
+
+def test_push_failures_and_late_drops_are_congestion(clock):
+    sent = []
+    controller = attached_controller(sent)
+
+    controller.report_push('rgb', True)
+    controller.evaluate()
+    controller.report_push('depth', False)
+    controller.evaluate()
+    controller.report_late_drop('rgb')
+    controller.evaluate()
+    assert sent == [('depth', 2), ('rgb', 2)]
+
+
+def test_recovery_steps_back_up_after_staying_healthy(clock):
+    sent = []
+    controller = attached_controller(sent)
+    for _ in range(2):
+        controller.report_fraction_lost('rgb', 0.2)
+        controller.evaluate()
+    assert sent == [('rgb', 2), ('rgb', 3)]
+    sent.clear()
+
+    # Once a second, as the RTSP server does: not before RECOVERY_SECONDS of health, then one level per period
+    for _ in range(RECOVERY_SECONDS - 1):
+        clock.now += 1
+        controller.evaluate()
+    assert sent == []
+    clock.now += 1
+    controller.evaluate()
+    assert sent == [('rgb', 2)]
+
+    # Congestion in between starts the healthy period over
+    clock.now += RECOVERY_SECONDS - 1
+    controller.report_queue_fill('rgb', 0.9)
+    controller.evaluate()
+    assert sent == [('rgb', 2), ('rgb', 3)]
+    clock.now += RECOVERY_SECONDS - 1
+    controller.evaluate()
+    assert sent == [('rgb', 2), ('rgb', 3)]
+    for _ in range(2 * RECOVERY_SECONDS):
+        clock.now += 1
+        controller.evaluate()
+    assert sent == [('rgb', 2), ('rgb', 3), ('rgb', 2), ('rgb', 1)]
+
+
+def test_paused_and_disabled_streams_are_left_alone(clock):
+    sent = []
+    controller = attached_controller(sent)
+    controller.set_active('rgb', False)
+    assert sent == [('rgb', 0)]
+
+    # A paused stream keeps its level, which applies once it resumes
+    controller.report_fraction_lost('rgb', 0.2)
+    controller.evaluate()
+    assert sent == [('rgb', 0)]
+    controller.set_active('rgb', True)
+    assert sent == [('rgb', 0), ('rgb', 2)]
+
+    sent = []
+    disabled_controller = attached_controller(sent, enabled=False)
+    disabled_controller.report_fraction_lost('rgb', 0.2)
+    disabled_controller.evaluate()
+    assert sent == []
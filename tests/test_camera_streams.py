@@ -0,0 +1,15 @@
+from camera_streams import AllCameraStreams
+
+
+DEVICE_ID = '14442C10D13EABCE00'
+
+
+def test_streams_keep_their_endpoints_and_names_unless_namespaced():
+    for plain, device_stream in zip(AllCameraStreams.all_streams(), AllCameraStreams.all_streams(DEVICE_ID, namespaced=False)):
+        assert (device_stream.id, device_stream.name, device_stream.endpoint) == (plain.id, plain.name, plain.endpoint)
+        # Sockets are per device either way, as every device's worker creates its own
+        assert device_stream.socket_path == f'{plain.socket_path}_{DEVICE_ID}'
+
+    rgb = AllCameraStreams.get('rgb', DEVICE_ID)
+    assert rgb.endpoint == f'{DEVICE_ID}/rgb'
+    assert rgb.name == f'Oak-D RGB ({DEVICE_ID})'
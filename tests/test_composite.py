@@ -0,0 +1,94 @@
+import pytest
+
+# `composite.py` imports DepthAI, but its script only runs against the stand-ins below
+pytest.importorskip('depthai')
+
+from composite import COMPOSITOR_SCRIPT
+
+
+WIDTH = 4
+HEIGHT = 2
+
+
+class EndOfFrames(Exception):
+    pass
+
+
+class FakeImgFrame:
+    # Stands in for the Script node's `ImgFrame`
+    class Type:
+        NV12 = 'NV12'
+
+    def __init__(self, size: int = 0, data: bytes = b'', sequence_num: int = 0):
+        self.data = data
+        self.sequence_num = sequence_num
+        self.settings = {}
+
+    def getData(self):
+        return self.data
+
+    def setData(self, data):
+        self.data = bytes(data)
+
+    def getTimestamp(self):
+        return self.sequence_num / 30
+
+    def getSequenceNum(self):
+        return self.sequence_num
+
+    def __getattr__(self, name):
+        if not name.startswith('set'):
+            raise AttributeError(name)
+        return lambda value: self.settings.__setitem__(name, value)
+
+
+class FakeInput:
+    def __init__(self, frames: list):
+        self.frames = frames
+
+    def get(self):
+        if not self.frames:
+            raise EndOfFrames()
+        return self.frames.pop(0)
+
+    def tryGet(self):
+        return self.frames.pop(0) if self.frames else None
+
+
+class FakeOutput:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, frame):
+        self.sent.append(frame)
+
+
+def nv12_tile(luma: int, chroma: int, sequence_num: int) -> FakeImgFrame:
+    return FakeImgFrame(data=bytes([luma]) * WIDTH * HEIGHT + bytes([chroma]) * (WIDTH * HEIGHT // 2), sequence_num=sequence_num)
+
+
+def run_compositor(inputs: dict[str, list]) -> list[FakeImgFrame]:
+    out = FakeOutput()
+    node = type('FakeNode', (), {'io': {**{source: FakeInput(frames) for source, frames in inputs.items()}, 'out': out}})
+    with pytest.raises(EndOfFrames):
+        exec(COMPOSITOR_SCRIPT.format(sources=list(inputs), width=WIDTH, height=HEIGHT), {'node': node, 'ImgFrame': FakeImgFrame})
+    return out.sent
+
+
+def test_tiles_are_stacked_luma_planes_first():
+    composites = run_compositor({
+        'mono_left': [nv12_tile(1, 2, 0), nv12_tile(3, 4, 1)],
+        'depth': [nv12_tile(5, 6, 0)],
+    })
+
+    # Each composite is paced by the first tile, while the others show their latest frame
+    assert len(composites) == 2
+    tile_size = WIDTH * HEIGHT
+    for composite, (left_luma, left_chroma) in zip(composites, ((1, 2), (3, 4))):
+        assert composite.data == (
+            bytes([left_luma]) * tile_size + bytes([5]) * tile_size
+            + bytes([left_chroma]) * (tile_size // 2) + bytes([6]) * (tile_size // 2)
+        )
+        assert composite.settings['setType'] == FakeImgFrame.Type.NV12
+        assert (composite.settings['setWidth'], composite.settings['setHeight']) == (WIDTH, 2 * HEIGHT)
+    assert [composite.settings['setSequenceNum'] for composite in composites] == [0, 1]
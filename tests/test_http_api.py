@@ -0,0 +1,46 @@
+import socket
+
+import pytest
+
+from http_api import HttpApi
+
+
+@pytest.fixture
+def api():
+    http_api = HttpApi(0, host='127.0.0.1')
+    http_api.add_route('GET', '/metrics', lambda path: (200, 'text/plain', b'metrics\n'))
+    http_api.add_route('POST', '/recording/trigger', lambda path: (200, 'text/plain', b'triggered\n'))
+    yield http_api
+    http_api.close()
+
+
+def read_response(connection_file) -> tuple[str, dict, bytes]:
+    status_line = connection_file.readline().decode().strip()
+    headers = {}
+    while (line := connection_file.readline().decode().strip()) != '':
+        name, _, value = line.partition(':')
+        headers[name.lower()] = value.strip()
+    return status_line, headers, connection_file.read(int(headers['content-length']))
+
+
+def test_requests_with_a_body_keep_the_connection_usable(api):
+    body = b'{"reason": "test"}'
+    requests = (
+        b'POST /recording/trigger HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+        + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+        + b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    )
+
+    # Both requests go out at once over the same connection, as a client reusing it would send them
+    with socket.create_connection(api.server.server_address[:2], timeout=5) as connection:
+        connection.sendall(requests)
+        connection_file = connection.makefile('rb')
+
+        status_line, headers, response_body = read_response(connection_file)
+        assert status_line == 'HTTP/1.1 200 OK'
+        assert response_body == b'triggered\n'
+        assert headers.get('connection') != 'close'
+
+        status_line, _, response_body = read_response(connection_file)
+        assert status_line == 'HTTP/1.1 200 OK'
+        assert response_body == b'metrics\n'
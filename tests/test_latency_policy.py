@@ -0,0 +1,83 @@
+import threading
+import time
+
+from frame_pump import FramePump
+from h264 import is_keyframe
+from latency_policy import LatencyPolicy
+from simulated_device import SimulatedOutputQueue
+from synthetic_h264 import gop_frames
+
+
+FPS = 25
+KEYFRAME_INTERVAL = 10
+MAX_LATENCY_SECONDS = 0.06
+# The consumer stalls once, mid-GOP, for long enough that the next frame goes stale, but not the ones after it
+STALL_AFTER_FRAME = 21
+STALL_SECONDS = 0.12
+FRAME_COUNT = 40
+
+
+def test_late_frames_are_dropped_up_to_the_next_keyframe():
+    output_queue = SimulatedOutputQueue('rgb', gop_frames(KEYFRAME_INTERVAL, KEYFRAME_INTERVAL), FPS, maxSize=64, blocking=True)
+    latency_policy = LatencyPolicy(MAX_LATENCY_SECONDS)
+    # (sequence number, keyframe, latency, forwarded) of every frame, in order
+    frames = []
+    done = threading.Event()
+
+    def forward(packet):
+        # As `forward_packet()` in `stream.py`, with the simulated device's clock
+        latency = time.monotonic() - packet.getTimestamp().total_seconds()
+        data = packet.getData()
+        frames.append((packet.getSequenceNum(), is_keyframe(data), latency, latency_policy.admit(latency, data)))
+
+        if packet.getSequenceNum() == STALL_AFTER_FRAME:
+            time.sleep(STALL_SECONDS)
+        if len(frames) == FRAME_COUNT:
+            done.set()
+
+    frame_pump = FramePump()
+    frame_pump.add_consumer('rgb', output_queue, forward)
+    frame_pump.start()
+    try:
+        assert done.wait(timeout=10)
+    finally:
+        frame_pump.stop()
+        output_queue.close()
+        output_queue.producer_thread.join(timeout=2)
+
+    frames = frames[:FRAME_COUNT]
+    assert [sequence_num for sequence_num, *_ in frames] == list(range(FRAME_COUNT)), 'A blocking queue loses no frames'
+
+    # Keyframes are always forwarded, and no other frame is forwarded late
+    dropped = [sequence_num for sequence_num, keyframe, _, forwarded in frames if not forwarded]
+    assert all(forwarded for _, keyframe, _, forwarded in frames if keyframe)
+    assert not any(latency > MAX_LATENCY_SECONDS for _, keyframe, latency, forwarded in frames if forwarded and not keyframe)
+
+    # The stall makes the very next frame late, which starts a drop that goes on through frames that are on time
+    # again, as they could not be decoded without the dropped one
+    stall_drop = range(STALL_AFTER_FRAME + 1, (STALL_AFTER_FRAME // KEYFRAME_INTERVAL + 1) * KEYFRAME_INTERVAL)
+    assert all(sequence_num in dropped for sequence_num in stall_drop)
+    assert any(frames[sequence_num][2] <= MAX_LATENCY_SECONDS for sequence_num in stall_drop)
+
+    # Every drop starts on a late frame and runs without a gap up to (and not including) the next keyframe
+    expected_drop_count = 0
+    index = 0
+    while index < len(frames):
+        sequence_num, keyframe, latency, forwarded = frames[index]
+        if forwarded:
+            index += 1
+            continue
+
+        assert latency > MAX_LATENCY_SECONDS
+        next_keyframe = index
+        while next_keyframe < len(frames) and not frames[next_keyframe][1]:
+            next_keyframe += 1
+        assert all(not forwarded for *_, forwarded in frames[index:next_keyframe])
+        if next_keyframe < len(frames):
+            assert frames[next_keyframe][3], 'Forwarding resumes on the keyframe'
+            assert next_keyframe % KEYFRAME_INTERVAL == 0
+
+        expected_drop_count += next_keyframe - index
+        index = next_keyframe
+
+    assert len(dropped) == expected_drop_count
@@ -0,0 +1,33 @@
+import time
+import types
+
+import metrics
+from metrics import RATE_WINDOW_SECONDS, Metrics
+
+
+def sample(rendered: str, name: str, stream_id: str) -> float:
+    (line,) = [line for line in rendered.splitlines() if line.startswith(f'{name}{{') and f'stream="{stream_id}"' in line]
+    return float(line.rsplit(' ', 1)[1])
+
+
+def test_rates_drop_to_zero_once_frames_stop(monkeypatch):
+    clock = types.SimpleNamespace(now=time.monotonic())
+    monkeypatch.setattr(metrics, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    stream_metrics = Metrics('test')
+
+    # 10 FPS of 1000 byte frames, over a couple of windows
+    for _ in range(2 * RATE_WINDOW_SECONDS * 10 + 1):
+        stream_metrics.observe_frame('rgb', 1000)
+        clock.now += 0.1
+    rendered = stream_metrics.render()
+    assert abs(sample(rendered, 'oakd_frames_per_second', 'rgb') - 10) < 0.5
+    assert abs(sample(rendered, 'oakd_bytes_per_second', 'rgb') - 10000) < 500
+
+    # The stream stops, e.g. as the device dropped: the rates hold for up to a window, then read 0
+    clock.now += RATE_WINDOW_SECONDS / 2
+    assert sample(stream_metrics.render(), 'oakd_frames_per_second', 'rgb') > 0
+    clock.now += RATE_WINDOW_SECONDS / 2
+    rendered = stream_metrics.render()
+    assert sample(rendered, 'oakd_frames_per_second', 'rgb') == 0
+    assert sample(rendered, 'oakd_bytes_per_second', 'rgb') == 0
+    assert sample(rendered, 'oakd_frames_total', 'rgb') == 2 * RATE_WINDOW_SECONDS * 10 + 1
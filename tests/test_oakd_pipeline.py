@@ -0,0 +1,131 @@
+import pytest
+
+# The pipeline modules import DepthAI, but are only ever handed the fake below
+pytest.importorskip('depthai')
+
+import fake_depthai as dai
+import composite
+import frame_gates
+import oakd_pipeline
+from camera_streams import AllCameraStreams, SupportedConfig
+from frame_gates import CONTROL_QUEUE_SIZE
+from oakd_pipeline import build_processing_pipeline
+from stream_profiles import PRESETS, COLOR_RESOLUTIONS, MONO_RESOLUTIONS, MONO_RESOLUTION_SIZES, LOW_RESOLUTIONS, ENCODER_PROFILES, load_profiles
+
+
+ALL_CAMERAS = SupportedConfig(rgb=True, mono_left=True, mono_right=True)
+
+
+@pytest.fixture(autouse=True)
+def fake_dai(monkeypatch):
+    for module in (oakd_pipeline, composite, frame_gates):
+        monkeypatch.setattr(module, 'dai', dai)
+    monkeypatch.delenv('OAKD_PROFILE_FILE', raising=False)
+
+
+def build(supported_config: SupportedConfig, profiles: dict, composite_streams: tuple[str, ...] = ()) -> dai.Pipeline:
+    return build_processing_pipeline(supported_config, profiles, raw_depth=False, snapshot_fps=0, composite_streams=composite_streams, imu_rate_hz=0)
+
+
+def output_node(pipeline: dai.Pipeline, stream_name: str) -> dai.FakeNode:
+    (xlink_out,) = [xlink_out for xlink_out in pipeline.nodes_of(dai.node.XLinkOut) if xlink_out.settings['setStreamName'] == stream_name]
+    return xlink_out
+
+
+def encoder_of(pipeline: dai.Pipeline, stream_name: str) -> dai.FakeNode:
+    (bitstream,) = pipeline.linked_from(output_node(pipeline, stream_name).input)
+    return bitstream.node
+
+
+def feeding(pipeline: dai.Pipeline, port: dai.FakePort) -> dai.FakeNode:
+    (source,) = pipeline.linked_from(port)
+    return source.node
+
+
+def camera_on(pipeline: dai.Pipeline, node_type, socket: str) -> dai.FakeNode:
+    (camera,) = [camera for camera in pipeline.nodes_of(node_type) if camera.settings['setBoardSocket'] == f'CameraBoardSocket.{socket}']
+    return camera
+
+
+def check_encoder(encoder: dai.FakeNode, profile, fps: float):
+    assert encoder.settings['setDefaultProfilePreset'] == (fps, f'Profile.{ENCODER_PROFILES[profile.profile]}')
+    assert encoder.settings['setKeyframeFrequency'] == profile.keyframe_interval
+    if profile.bitrate_kbps > 0:
+        assert encoder.settings['setBitrateKbps'] == profile.bitrate_kbps
+    else:
+        assert 'setBitrateKbps' not in encoder.settings
+
+
+@pytest.mark.parametrize('preset_name', PRESETS)
+def test_preset_configures_cameras_and_encoders(preset_name):
+    profiles = load_profiles(preset_name)
+    pipeline = build(ALL_CAMERAS, profiles)
+
+    rgb = camera_on(pipeline, dai.node.ColorCamera, 'CAM_A')
+    assert rgb.settings['setResolution'] == f'SensorResolution.{COLOR_RESOLUTIONS[profiles["rgb"].resolution]}'
+    assert rgb.settings['setFps'] == profiles['rgb'].fps
+
+    for stream_id, socket in (('mono_left', 'CAM_B'), ('mono_right', 'CAM_C')):
+        mono = camera_on(pipeline, dai.node.MonoCamera, socket)
+        assert mono.settings['setResolution'] == f'SensorResolution.{MONO_RESOLUTIONS[profiles[stream_id].resolution]}'
+        assert mono.settings['setFps'] == profiles[stream_id].fps
+
+    for stream_id in ('rgb', 'mono_left', 'mono_right', 'depth'):
+        encoder = encoder_of(pipeline, stream_id)
+        # Depth runs at the mono cameras' FPS, whatever its own profile says
+        fps = profiles['mono_left'].fps if stream_id == 'depth' else profiles[stream_id].fps
+        check_encoder(encoder, profiles[stream_id], fps)
+
+        # Every encoder is fed through its stream's frame gate, which starts out letting every frame through
+        gate = feeding(pipeline, encoder.input)
+        assert type(gate) is dai.node.Script
+        assert f"stream_id == '{stream_id}'" in gate.settings['setScript']
+        assert 'divisor = 1\n' in gate.settings['setScript']
+        # Every control message sent on attach fits, as the control queue drops its oldest message once full
+        assert gate.settings['control.setQueueSize'] == CONTROL_QUEUE_SIZE >= len(AllCameraStreams.all_streams())
+
+
+@pytest.mark.parametrize('preset_name', PRESETS)
+def test_preset_configures_composite_and_low_renditions(preset_name):
+    profiles = load_profiles(preset_name)
+    supported_config = SupportedConfig(rgb=True, mono_left=True, mono_right=True, composite=True, low_renditions=('rgb', 'depth'))
+    pipeline = build(supported_config, profiles, composite_streams=['mono_left', 'mono_right', 'depth'])
+
+    # The composite stream runs at its first tile's FPS, with each tile scaled to the composite's resolution
+    check_encoder(encoder_of(pipeline, 'composite'), profiles['composite'], profiles['mono_left'].fps)
+    tile_size = MONO_RESOLUTION_SIZES[profiles['composite'].resolution]
+    tile_sizes = [
+        manip.settings['initialConfig.setResizeThumbnail']
+        for manip in pipeline.nodes_of(dai.node.ImageManip)
+        if 'initialConfig.setResizeThumbnail' in manip.settings
+    ]
+    assert tile_sizes.count(tile_size) >= 3
+
+    # Every tile is gated ahead of its scaler, so that pausing the composite stream stops all of them
+    (compositor,) = [script for script in pipeline.nodes_of(dai.node.Script) if 'latest = {}' in script.settings['setScript']]
+    for source_id in ('mono_left', 'mono_right', 'depth'):
+        tile = feeding(pipeline, compositor.inputs[source_id])
+        assert type(tile) is dai.node.ImageManip
+        gate = feeding(pipeline, tile.inputImage)
+        assert "stream_id == 'composite'" in gate.settings['setScript']
+
+    for stream_id, camera_fps in (('rgb_low', profiles['rgb'].fps), ('depth_low', profiles['mono_left'].fps)):
+        encoder = encoder_of(pipeline, stream_id)
+        check_encoder(encoder, profiles[stream_id], camera_fps)
+
+        scaler = feeding(pipeline, encoder.input)
+        assert scaler.settings['initialConfig.setResizeThumbnail'] == LOW_RESOLUTIONS[profiles[stream_id].resolution]
+
+    # Streams without a low rendition get no encoder for one
+    stream_names = {xlink_out.settings['setStreamName'] for xlink_out in pipeline.nodes_of(dai.node.XLinkOut)}
+    assert 'mono_left_low' not in stream_names and 'mono_right_low' not in stream_names
+
+
+def test_missing_cameras_are_left_out():
+    pipeline = build(SupportedConfig(rgb=True, mono_left=False, mono_right=False), load_profiles('default'))
+
+    stream_names = {xlink_out.settings['setStreamName'] for xlink_out in pipeline.nodes_of(dai.node.XLinkOut)}
+    assert 'rgb' in stream_names
+    assert not {'mono_left', 'mono_right', 'depth'} & stream_names
+    assert pipeline.nodes_of(dai.node.MonoCamera) == []
+    assert pipeline.nodes_of(dai.node.StereoDepth) == []
@@ -0,0 +1,100 @@
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+gi = pytest.importorskip('gi')
+try:
+    gi.require_version('Gst', '1.0')
+    gi.require_version('GstRtspServer', '1.0')
+    from gi.repository import GstRtspServer # type: ignore # noqa: F401
+except (ImportError, ValueError):
+    pytest.skip('GStreamer and its RTSP server are not installed', allow_module_level=True)
+
+from camera_streams import SupportedConfig
+from simulated_device import SimulatedDevice
+from stream import DEVICE_RETRY_SECONDS, RTSPServer, stream_device
+from stream_profiles import load_profiles
+from synthetic_h264 import write_recording
+
+
+FPS = 30
+CYCLES = 20
+WARMUP_CYCLES = 3
+
+
+def run_session(device, supported_config: SupportedConfig, rtsp_server: RTSPServer, profiles: dict) -> threading.Thread:
+    # Streams from the device until it drops, as a device worker does
+    def run():
+        try:
+            stream_device(device, supported_config, rtsp_server, profiles=profiles)
+        except RuntimeError:
+            pass
+
+    session_thread = threading.Thread(target=run, daemon=True)
+    session_thread.start()
+    return session_thread
+
+
+def wait_for_frames(rtsp_server: RTSPServer, stream_id: str, frames: int, timeout: float) -> float:
+    # Returns how long it took for the stream's frame count to reach `frames`
+    start = time.monotonic()
+    while rtsp_server.metrics.stream(stream_id).frames < frames:
+        if time.monotonic() - start > timeout:
+            pytest.fail(f'No frames of "{stream_id}" within {timeout} s')
+        time.sleep(0.005)
+    return time.monotonic() - start
+
+
+def test_repeated_device_drops_recover_quickly_without_leaks(tmp_path):
+    recording = write_recording(tmp_path / 'recording.h264')
+    profiles = load_profiles('default')
+
+    # The server lives as long as the worker, and (un)mounts streams as the device's cameras come and go
+    rtsp_server = RTSPServer(
+        SupportedConfig(rgb=False, mono_left=False, mono_right=False),
+        mcm_registration=False,
+        media_path='direct',
+        on_demand=False,
+        service='0',
+    )
+    configs = (
+        SupportedConfig(rgb=True, mono_left=True, mono_right=True),
+        SupportedConfig(rgb=True, mono_left=False, mono_right=False),
+    )
+
+    recovery_times = []
+    for cycle in range(CYCLES):
+        if cycle == WARMUP_CYCLES:
+            threads_before = threading.active_count()
+            tracemalloc.start()
+            memory_before, _ = tracemalloc.get_traced_memory()
+
+        supported_config = configs[cycle % len(configs)]
+        stream_ids = [stream_id for stream_id in ('rgb', 'mono_left', 'mono_right', 'depth') if supported_config.check(stream_id)]
+        frames_before = rtsp_server.metrics.stream('rgb').frames
+
+        # The device reappears, is brought up again, and drops shortly after
+        device = SimulatedDevice(recording, stream_ids, fps=FPS)
+        rtsp_server.set_supported_config(supported_config)
+        session_thread = run_session(device, supported_config, rtsp_server, profiles)
+        recovery_times.append(wait_for_frames(rtsp_server, 'rgb', frames_before + 1, timeout=2))
+
+        time.sleep(0.05)
+        device.close()
+        session_thread.join(timeout=2)
+        assert not session_thread.is_alive(), 'stream_device() did not return after the device dropped'
+        for output_queue in device.output_queues.values():
+            output_queue.producer_thread.join(timeout=2)
+
+    memory_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Every session's threads (frame pump readers and simulated producers) are gone once it ends
+    assert threading.active_count() == threads_before
+    assert memory_after - memory_before < 1024 * 1024
+    assert rtsp_server.main_loop_thread.is_alive()
+
+    # Including the worker's wait before it looks for the device again
+    assert max(recovery_times) + DEVICE_RETRY_SECONDS < 1.0
@@ -0,0 +1,178 @@
+import types
+
+import pytest
+
+gi = pytest.importorskip('gi')
+try:
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst # type: ignore
+except (ImportError, ValueError):
+    pytest.skip('GStreamer is not installed', allow_module_level=True)
+
+import recorder
+from metrics import Metrics
+from recorder import END_OF_RECORDING, RecordedFrame, StreamRecorder, is_segment_boundary
+from synthetic_h264 import gop_frames
+
+
+# A power of two, so that simulated frame times are exact
+FPS = 32
+KEYFRAME_INTERVAL = 16
+PRE_TRIGGER_SECONDS = 1.0
+POST_TRIGGER_SECONDS = 2.0
+
+
+class FakeClock:
+    # Stands in for the `time` module in `recorder`, so that frames arrive at exact, simulated times
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def make_frame(timestamp: float, keyframe: bool) -> RecordedFrame:
+    return RecordedFrame(timestamp, keyframe, None, 1000)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(recorder, 'time', types.SimpleNamespace(monotonic=fake_clock.monotonic))
+    return fake_clock
+
+
+@pytest.fixture
+def event_recorder(monkeypatch, tmp_path):
+    # No writer thread, so that whatever gets queued for writing stays in `pending`
+    monkeypatch.setattr(StreamRecorder, '_thread_writer', lambda self: None)
+    Gst.init(None)
+    return StreamRecorder(
+        'rgb', str(tmp_path), Metrics('test'),
+        mode='event', pre_trigger_seconds=PRE_TRIGGER_SECONDS, post_trigger_seconds=POST_TRIGGER_SECONDS,
+    )
+
+
+def feed(stream_recorder: StreamRecorder, clock: FakeClock, frame_count: int) -> list:
+    # Records `frame_count` frames at `FPS`, and returns them
+    frames = gop_frames(frame_count, KEYFRAME_INTERVAL)
+    for frame in frames:
+        stream_recorder.record(frame)
+        clock.now += 1 / FPS
+    return frames
+
+
+def test_segments_only_start_on_keyframes():
+    # The first keyframe always starts a segment
+    assert is_segment_boundary(None, make_frame(5.0, keyframe=True), 60)
+    assert not is_segment_boundary(None, make_frame(5.0, keyframe=False), 60)
+
+    # Later ones only once the segment is long enough
+    assert not is_segment_boundary(5.0, make_frame(64.9, keyframe=True), 60)
+    assert is_segment_boundary(5.0, make_frame(65.0, keyframe=True), 60)
+    assert is_segment_boundary(5.0, make_frame(70.0, keyframe=True), 60)
+
+    # A segment overruns until the next keyframe rather than ending on a frame that depends on earlier ones
+    assert not is_segment_boundary(5.0, make_frame(66.0, keyframe=False), 60)
+
+
+def test_ring_keeps_whole_gops_covering_the_pre_trigger_period(event_recorder):
+    # Frames before the first keyframe cannot be decoded, so they are not kept
+    event_recorder._add_to_ring(make_frame(0.0, keyframe=False))
+    assert len(event_recorder.gops) == 0
+
+    frame_seconds = 1 / FPS
+    for index in range(10 * FPS):
+        timestamp = 1.0 + index * frame_seconds
+        event_recorder._add_to_ring(make_frame(timestamp, keyframe=index % KEYFRAME_INTERVAL == 0))
+
+        gops = list(event_recorder.gops)
+        assert all(gop[0].keyframe for gop in gops)
+        assert all(not frame.keyframe for gop in gops for frame in gop[1:])
+
+        # The oldest GOP reaches back at least the pre-trigger period (once there is that much), and dropping it
+        # would not
+        if timestamp - 1.0 >= PRE_TRIGGER_SECONDS:
+            assert gops[0][0].timestamp <= timestamp - PRE_TRIGGER_SECONDS
+        if len(gops) > 1:
+            assert gops[1][0].timestamp > timestamp - PRE_TRIGGER_SECONDS
+
+    # I.e. 1 s of pre-trigger with 0.5 s GOPs needs the current GOP and two before it
+    assert len(event_recorder.gops) == 3
+    assert event_recorder.pending_bytes == 0
+
+
+def test_trigger_writes_the_ring_and_then_the_post_trigger_period(event_recorder, clock):
+    feed(event_recorder, clock, 5 * FPS + 3)
+    assert len(event_recorder.pending) == 0
+
+    ring = [frame for gop in event_recorder.gops for frame in gop]
+    trigger_time = clock.now
+    event_recorder.trigger()
+
+    # The recording starts on a keyframe, at least the pre-trigger period back
+    pending = list(event_recorder.pending)
+    assert len(pending) == len(ring) and all(queued is frame for queued, frame in zip(pending, ring))
+    assert pending[0].keyframe
+    assert pending[0].timestamp <= trigger_time - PRE_TRIGGER_SECONDS
+
+    # Every frame up to the end of the post-trigger period follows, and then the recording ends
+    feed(event_recorder, clock, 3 * FPS)
+    pending = list(event_recorder.pending)
+    end = pending.index(END_OF_RECORDING)
+    recorded = pending[len(ring):end]
+    assert len(recorded) == round(POST_TRIGGER_SECONDS * FPS)
+    assert all(trigger_time <= frame.timestamp < trigger_time + POST_TRIGGER_SECONDS for frame in recorded)
+    assert pending[end + 1:] == []
+    assert not event_recorder.recording
+
+
+def test_trigger_during_a_recording_extends_it(event_recorder, clock):
+    feed(event_recorder, clock, 2 * FPS)
+    event_recorder.trigger()
+    ring_frames = len(event_recorder.pending)
+
+    feed(event_recorder, clock, FPS)
+    first_end = event_recorder.recording_until
+    event_recorder.trigger()
+    assert event_recorder.recording_until == clock.now + POST_TRIGGER_SECONDS
+
+    # The ring is not written again, and the recording runs until the second trigger's post-trigger period is over
+    assert len(event_recorder.pending) == ring_frames + FPS
+    feed(event_recorder, clock, 3 * FPS)
+    pending = list(event_recorder.pending)
+    assert pending.count(END_OF_RECORDING) == 1
+    assert pending[pending.index(END_OF_RECORDING) - 1].timestamp >= first_end
+
+
+class FakeSegment:
+    # Stands in for a `SegmentWriter`, keeping what gets written to it
+    def __init__(self, frame: RecordedFrame):
+        self.start_timestamp = frame.timestamp
+        self.frames = []
+        self.finished = False
+
+    def write(self, frame: RecordedFrame):
+        self.frames.append(frame)
+
+    def finish(self):
+        self.finished = True
+
+
+def test_close_writes_out_pending_frames_and_finishes_the_segment(monkeypatch, tmp_path, clock):
+    segments = []
+    def start_segment(self, frame):
+        segments.append(FakeSegment(frame))
+        return segments[-1]
+    monkeypatch.setattr(StreamRecorder, 'start_segment', start_segment)
+    Gst.init(None)
+
+    continuous_recorder = StreamRecorder('rgb', str(tmp_path), Metrics('test'), mode='continuous', segment_seconds=60)
+    frames = feed(continuous_recorder, clock, 2 * FPS)
+    continuous_recorder.close()
+
+    # As when the worker stops, with the segment still open
+    assert not continuous_recorder.writer_thread.is_alive()
+    assert len(segments) == 1 and segments[0].finished
+    written = segments[0].frames
+    assert len(written) == len(frames) and all(frame.data is data for frame, data in zip(written, frames))
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+import register_stream
+from camera_streams import AllCameraStreams
+from mcm_stub import McmStub
+from register_stream import StreamRegistrar
+
+
+RTSP_PORT = 8554
+
+
+@pytest.fixture(autouse=True)
+def fast_registrar(monkeypatch):
+    # Same behaviour, on a shorter timescale
+    monkeypatch.setattr(register_stream, 'POLL_SECONDS', 0.2)
+    monkeypatch.setattr(register_stream, 'CONFIRM_SECONDS', 0.1)
+    monkeypatch.setattr(register_stream, 'MIN_BACKOFF_SECONDS', 0.1)
+    monkeypatch.setattr(register_stream, 'MAX_BACKOFF_SECONDS', 0.4)
+
+
+@pytest.fixture
+def mcm():
+    stub = McmStub()
+    yield stub
+    stub.stop()
+
+
+def rtsp_url(stream_id: str) -> str:
+    return f'rtsp://127.0.0.1:{RTSP_PORT}/{AllCameraStreams.get(stream_id).endpoint}'
+
+
+def expected_streams(*stream_ids: str) -> dict[str, list[str]]:
+    return {AllCameraStreams.get(stream_id).name: [rtsp_url(stream_id)] for stream_id in stream_ids}
+
+
+def wait_until(condition, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail(f'Timed out after {timeout} s')
+        time.sleep(0.01)
+
+
+def test_registers_once_and_then_only_polls(mcm):
+    registrar = StreamRegistrar(RTSP_PORT, mcm.url)
+    registrar.set_streams([AllCameraStreams.rgb, AllCameraStreams.depth])
+    wait_until(lambda: mcm.streams == expected_streams('rgb', 'depth'))
+
+    # About 5 polls' worth, none of which should change anything
+    time.sleep(1.0)
+    assert mcm.count('POST') == 2
+    assert mcm.count('DELETE') == 0
+    assert mcm.count('GET', '/streams') <= 10
+
+    # Every request went over the same connection
+    assert mcm.connections == 1
+
+    # Setting the same streams again is not a change
+    registrar.set_streams([AllCameraStreams.rgb, AllCameraStreams.depth])
+    assert not registrar.streams_changed.is_set()
+
+
+def test_removes_stale_streams_and_keeps_others():
+    mcm = McmStub({
+        # From a camera that is gone
+        AllCameraStreams.depth.name: [rtsp_url('depth')],
+        # From an older version of this extension, with another endpoint
+        AllCameraStreams.rgb.name: [f'rtsp://127.0.0.1:{RTSP_PORT}/preview'],
+        # Not ours
+        'Other camera': ['rtsp://127.0.0.1:9000/video'],
+    })
+    try:
+        registrar = StreamRegistrar(RTSP_PORT, mcm.url)
+        registrar.set_streams([AllCameraStreams.rgb, AllCameraStreams.mono_left])
+        wait_until(lambda: mcm.streams == {**expected_streams('rgb', 'mono_left'), 'Other camera': ['rtsp://127.0.0.1:9000/video']})
+
+        # A camera disappearing takes its stream with it
+        registrar.set_streams([AllCameraStreams.rgb])
+        wait_until(lambda: mcm.streams == {**expected_streams('rgb'), 'Other camera': ['rtsp://127.0.0.1:9000/video']})
+        assert mcm.count('DELETE') == 3
+    finally:
+        mcm.stop()
+
+
+def test_recovers_after_mcm_restarts(mcm):
+    registrar = StreamRegistrar(RTSP_PORT, mcm.url)
+    registrar.set_streams([AllCameraStreams.rgb, AllCameraStreams.mono_left])
+    wait_until(lambda: mcm.streams == expected_streams('rgb', 'mono_left'))
+
+    # MCM restarts straight away, losing its streams
+    mcm.restart()
+    wait_until(lambda: mcm.streams == expected_streams('rgb', 'mono_left'), timeout=2)
+
+    # MCM is down for a while, during which the registrar backs off, and comes back without its streams
+    mcm.stop()
+    time.sleep(1.0)
+    mcm.streams = {}
+    requests_before = len(mcm.requests)
+    mcm.start()
+    wait_until(lambda: mcm.streams == expected_streams('rgb', 'mono_left'), timeout=2)
+    assert mcm.count('POST') == 6
+
+    # Back in sync, it only polls again
+    time.sleep(0.5)
+    assert mcm.count('POST') == 6
+    assert len(mcm.requests) - requests_before <= 10
@@ -0,0 +1,176 @@
+import collections
+import ipaddress
+
+import pytest
+
+gi = pytest.importorskip('gi')
+try:
+    gi.require_version('Gst', '1.0')
+    gi.require_version('GstRtspServer', '1.0')
+    from gi.repository import Gst, GstRtspServer # type: ignore
+except (ImportError, ValueError):
+    pytest.skip('GStreamer and its RTSP server are not installed', allow_module_level=True)
+
+import settings
+from camera_streams import SupportedConfig
+from h264 import is_keyframe
+import stream
+from stream import IDLE_GRACE_SECONDS, MULTICAST_PORTS_PER_DEVICE, RTSPServer
+from synthetic_h264 import gop_frames
+
+
+KEYFRAME_INTERVAL = 10
+
+# Stands in for a direct-mode media's element, with a sink to see what its viewer would receive
+SINK_PIPELINE = 'appsrc name=source is-live=true format=time ! queue name=upload_queue ! appsink name=sink sync=false'
+
+
+class FakeMedia:
+    # Stands in for a `GstRtspServer.RTSPMedia`, whose signals are emitted by hand
+    def __init__(self, element):
+        self.element = element
+        self.handlers = collections.defaultdict(list)
+
+    def get_element(self):
+        return self.element
+
+    def connect(self, signal: str, handler, *args):
+        self.handlers[signal].append((handler, args))
+
+    def emit(self, signal: str, *values):
+        for handler, args in self.handlers[signal]:
+            handler(self, *values, *args)
+
+
+@pytest.fixture
+def make_rtsp_server():
+    rtsp_servers = []
+
+    def make(**properties) -> RTSPServer:
+        properties = {'mcm_registration': False, 'keyframe_cache': False, 'on_demand': False, 'service': '0', **properties}
+        rtsp_servers.append(RTSPServer(SupportedConfig(rgb=True, mono_left=False, mono_right=False), **properties))
+        return rtsp_servers[-1]
+
+    yield make
+    for rtsp_server in rtsp_servers:
+        rtsp_server.main_loop.quit()
+
+
+def configure(rtsp_server: RTSPServer, stream_id: str, element=None) -> FakeMedia:
+    # As when a client's DESCRIBE creates a new media for the stream
+    rtsp_system = rtsp_server.rtsp_systems[stream_id]
+    media = FakeMedia(element if element is not None else rtsp_system.do_create_element(None))
+    rtsp_system.do_configure(media)
+    return media
+
+
+def attached_sources(rtsp_server: RTSPServer, stream_id: str) -> list:
+    return [media_source.appsrc for media_source in rtsp_server.media_sources.get(stream_id, [])]
+
+
+def received_frames(media: FakeMedia) -> list[bytes]:
+    sink = media.element.get_by_name('sink')
+    frames = []
+    while (sample := sink.emit('try-pull-sample', Gst.SECOND // 10)) is not None:
+        buffer = sample.get_buffer()
+        frames.append(buffer.extract_dup(0, buffer.get_size()))
+    return frames
+
+
+def test_unpreparing_an_older_media_leaves_the_newer_one_attached(make_rtsp_server):
+    rtsp_server = make_rtsp_server(media_path='direct')
+
+    # The last viewer of the old media leaves while a new one's media is already set up
+    old_media = configure(rtsp_server, 'rgb')
+    new_media = configure(rtsp_server, 'rgb')
+    old_media.emit('unprepared')
+
+    assert attached_sources(rtsp_server, 'rgb') == [new_media.element.get_by_name('source')]
+    assert rtsp_server.media_sources['rgb'][0].upload_queue is new_media.element.get_by_name('upload_queue')
+
+    new_media.emit('unprepared')
+    assert attached_sources(rtsp_server, 'rgb') == []
+
+
+def test_a_late_joiner_starts_from_the_cached_gop(make_rtsp_server):
+    rtsp_server = make_rtsp_server(media_path='direct', keyframe_cache=True)
+    # Every viewer gets a media of its own, rather than joining another viewer's
+    assert not rtsp_server.rtsp_systems['rgb'].is_shared()
+
+    Gst.init(None)
+    frames = [frame.tobytes() for frame in gop_frames(3 * KEYFRAME_INTERVAL, KEYFRAME_INTERVAL)]
+    first_media = configure(rtsp_server, 'rgb', Gst.parse_launch(SINK_PIPELINE))
+    first_media.element.set_state(Gst.State.PLAYING)
+    for frame in frames[:KEYFRAME_INTERVAL + 3]:
+        rtsp_server.send_data('rgb', frame)
+
+    # A second viewer joins mid-GOP, and its media is still being set up when the next frame comes in
+    late_media = configure(rtsp_server, 'rgb', Gst.parse_launch(SINK_PIPELINE))
+    rtsp_server.send_data('rgb', frames[KEYFRAME_INTERVAL + 3])
+    late_media.element.set_state(Gst.State.PLAYING)
+    for frame in frames[KEYFRAME_INTERVAL + 4:KEYFRAME_INTERVAL + 7]:
+        rtsp_server.send_data('rgb', frame)
+
+    try:
+        # The late joiner gets the current GOP from its keyframe, and then the live frames, while the first viewer
+        # gets nothing twice
+        late_frames = received_frames(late_media)
+        assert is_keyframe(late_frames[0])
+        assert late_frames == frames[KEYFRAME_INTERVAL:KEYFRAME_INTERVAL + 7]
+        assert received_frames(first_media) == frames[:KEYFRAME_INTERVAL + 7]
+    finally:
+        for media in (first_media, late_media):
+            media.element.set_state(Gst.State.NULL)
+
+
+@pytest.mark.parametrize('slot', [0, 1, 2])
+def test_each_device_hands_out_multicast_ports_of_its_own(make_rtsp_server, slot):
+    # As a device worker sets up its server, from the device's slot
+    first_port = settings.MULTICAST_BASE_PORT + MULTICAST_PORTS_PER_DEVICE * slot
+    rtsp_server = make_rtsp_server(multicast=True, multicast_port=first_port)
+    assert all(rtsp_system.get_address_pool() is rtsp_server.address_pool for rtsp_system in rtsp_server.rtsp_systems.values())
+
+    # Every stream takes a pair of ports (RTP and RTCP), and each device's ports end before the next device's begin
+    flags = GstRtspServer.RTSPAddressFlags.IPV4 | GstRtspServer.RTSPAddressFlags.MULTICAST | GstRtspServer.RTSPAddressFlags.EVEN_PORT
+    addresses = [rtsp_server.address_pool.acquire_address(flags, 2) for _ in range(MULTICAST_PORTS_PER_DEVICE // 2)]
+    for address in addresses:
+        assert address is not None
+        assert settings.MULTICAST_FIRST_ADDRESS <= ipaddress.IPv4Address(address.address) <= settings.MULTICAST_LAST_ADDRESS
+        assert first_port <= address.port and address.port + address.n_ports <= first_port + MULTICAST_PORTS_PER_DEVICE
+        assert address.ttl == settings.MULTICAST_TTL
+    assert len({(address.address, address.port) for address in addresses}) == len(addresses)
+
+
+def test_on_demand_streams_pause_once_idle_for_the_grace_period(make_rtsp_server, monkeypatch):
+    rtsp_server = make_rtsp_server(media_path='direct', on_demand=True)
+    # Grace periods are run by hand rather than by the main loop
+    timeouts = []
+    monkeypatch.setattr(stream.GLib, 'timeout_add_seconds', lambda seconds, callback, *args: timeouts.append((seconds, callback, args)))
+
+    def is_active() -> bool:
+        return rtsp_server.metrics.stream('rgb').active and rtsp_server.bitrate_controller.streams['rgb'].active
+
+    def run_timeouts():
+        while timeouts:
+            _, callback, args = timeouts.pop(0)
+            assert callback(*args) is False, 'A grace period runs once'
+
+    # Nobody watches yet, and a viewer resumes the stream as soon as its media is configured
+    assert not is_active()
+    media = configure(rtsp_server, 'rgb')
+    assert is_active()
+
+    # The stream keeps running for the grace period after its last viewer left
+    media.emit('unprepared')
+    assert is_active()
+    assert [seconds for seconds, *_ in timeouts] == [IDLE_GRACE_SECONDS]
+
+    # A viewer coming back within it keeps the stream running once it is over
+    media = configure(rtsp_server, 'rgb')
+    run_timeouts()
+    assert is_active()
+
+    # And once nobody came back, the stream is paused
+    media.emit('unprepared')
+    run_timeouts()
+    assert not is_active()
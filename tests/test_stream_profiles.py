@@ -0,0 +1,20 @@
+import json
+
+import pytest
+
+from stream_profiles import load_profiles
+
+
+@pytest.mark.parametrize('config', [
+    {'streams': {'rgb': {'resolution': ['1080p']}}},
+    {'streams': {'mono_left': {'profile': {'name': 'main'}}}},
+    {'streams': {'rgb': {'fps': [15]}}},
+    {'preset': ['default']},
+])
+def test_malformed_profile_file_is_reported_as_invalid(tmp_path, monkeypatch, config):
+    monkeypatch.delenv('OAKD_PRESET', raising=False)
+    profile_file = tmp_path / 'profiles.json'
+    profile_file.write_text(json.dumps(config))
+
+    with pytest.raises(ValueError):
+        load_profiles(profile_file=str(profile_file))